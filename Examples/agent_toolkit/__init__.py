@@ -0,0 +1,99 @@
+"""
+Shared helpers for the AutoGen examples and practices.
+
+The helpers are imported on first use: ``import agent_toolkit`` alone does not
+load autogen or the OpenAI stack, so entry points can start (and e.g. accept
+connections) before paying for those imports.
+"""
+
+import importlib
+
+# Public name -> module of this package that defines it
+_EXPORTS = {
+    "MockModelClient": "mock_client",
+    "mock_config_list": "mock_client",
+    "mock_groupchat_kwargs": "mock_client",
+    "register_mock_client": "mock_client",
+    "use_mock_backend": "mock_client",
+    "ResponseCache": "response_cache",
+    "get_response_cache": "response_cache",
+    "SpeakerSelector": "speaker_selection",
+    "pipeline_transitions": "speaker_selection",
+    "TranscriptCompactor": "compaction",
+    "add_transcript_compaction": "compaction",
+    "compaction_stats": "compaction",
+    "transcript_compaction_enabled": "compaction",
+    "RetrievalMemory": "retrieval",
+    "add_retrieval_memory": "retrieval",
+    "chunk_text": "retrieval",
+    "retrieval_groupchat_kwargs": "retrieval",
+    "retrieval_memory": "retrieval",
+    "retrieval_memory_enabled": "retrieval",
+    "retrieval_stats": "retrieval",
+    "FanOutGroupChatManager": "fan_out",
+    "fan_out_enabled": "fan_out",
+    "DeltaIOStream": "streaming",
+    "enable_streaming": "streaming",
+    "forward_stream_deltas": "streaming",
+    "RateLimiter": "rate_limit",
+    "RateLimitedClient": "rate_limit",
+    "add_rate_limiting": "rate_limit",
+    "get_rate_limiter": "rate_limit",
+    "rate_limit_stats": "rate_limit",
+    "rate_limiting_enabled": "rate_limit",
+    "DeploymentRouter": "routing",
+    "azure_deployments": "routing",
+    "routing_stats": "routing",
+    "MockDeploymentServer": "mock_server",
+    "AgentFactory": "agent_factory",
+    "adopt_llm": "agent_factory",
+    "clone_agent": "agent_factory",
+    "pooled_http_client": "agent_factory",
+    "share_http_client": "agent_factory",
+    "TraceExporter": "tracing",
+    "add_tracing": "tracing",
+    "current_span": "tracing",
+    "span": "tracing",
+    "tracing_enabled": "tracing",
+    "CachedLocalCodeExecutor": "code_workers",
+    "CodeWorkerPool": "code_workers",
+    "PooledCodeExecutor": "code_workers",
+    "code_execution_config": "code_workers",
+    "code_workers_enabled": "code_workers",
+    "get_code_worker_pool": "code_workers",
+    "ExecutionCache": "execution_cache",
+    "get_execution_cache": "execution_cache",
+    "TeamRunner": "batch",
+    "TeamSpec": "batch",
+    "run_batch": "batch",
+    "CheckpointStore": "checkpoints",
+    "GroupChatCheckpointer": "checkpoints",
+    "add_checkpointing": "checkpoints",
+    "checkpoint_messages": "checkpoints",
+    "checkpoints_enabled": "checkpoints",
+    "get_checkpoint_store": "checkpoints",
+    "NotebookAssembler": "notebook_assembly",
+    "register_notebook_tools": "notebook_assembly",
+    "LoopDetector": "loop_detection",
+    "add_loop_detection": "loop_detection",
+    "loop_detection_enabled": "loop_detection",
+    "loop_detection_stats": "loop_detection",
+    "WarmUp": "startup",
+    "warm_up_enabled": "startup",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    # Later lookups find it in the package namespace directly
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
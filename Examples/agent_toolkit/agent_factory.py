@@ -0,0 +1,199 @@
+"""
+Reuse of agents and LLM clients across conversations.
+
+Building an agent validates its llm_config and creates an OpenAI SDK client
+with its own HTTP connection pool, which costs tens of milliseconds per
+agent plus new TCP/TLS handshakes on the first calls. ``AgentFactory`` builds
+the agents once per process as templates; every conversation gets clones
+with empty chat state that share the templates' model clients (and their
+rate limiters and routers). All SDK clients send their requests over one
+pooled ``httpx`` client, using HTTP/2 when the ``h2`` package is installed.
+"""
+
+import copy
+import time
+import threading
+import logging
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+try:
+    import httpx
+    from openai import DefaultHttpxClient
+except ImportError:
+    httpx = None
+
+try:
+    import h2
+except ImportError:
+    h2 = None
+
+from .code_workers import PooledCodeExecutor
+from .rate_limit import RateLimitedClient
+from .routing import DeploymentRouter
+
+logger = logging.getLogger(__name__)
+
+# Connection pool of the shared HTTP client, for all agents and sessions
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE_CONNECTIONS = 20
+KEEPALIVE_SECONDS = 60.0
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+
+def pooled_http_client() -> Any:
+    """The process-wide ``httpx.Client`` the OpenAI SDK clients share"""
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = DefaultHttpxClient(
+                http2=h2 is not None,
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=KEEPALIVE_SECONDS,
+                ),
+            )
+        return _http_client
+
+
+def _model_clients(client: Any) -> Iterator[Any]:
+    """Innermost model clients of an ``OpenAIWrapper`` or of a wrapping client"""
+    for model_client in getattr(client, "_clients", None) or [client]:
+        if isinstance(model_client, DeploymentRouter):
+            for routed in model_client.clients:
+                yield from _model_clients(routed)
+        elif isinstance(model_client, RateLimitedClient):
+            yield from _model_clients(model_client.client)
+        else:
+            yield model_client
+
+
+def share_http_client(agents: Sequence[Any]):
+    """Send the OpenAI SDK requests of ``agents`` over ``pooled_http_client``"""
+    for agent in agents:
+        client = getattr(agent, "client", None)
+        if client is None:
+            continue
+        for model_client in _model_clients(client):
+            sdk_client = getattr(model_client, "_oai_client", None)
+            if sdk_client is None or sdk_client._client is pooled_http_client():
+                continue
+            model_client._oai_client = sdk_client.with_options(
+                http_client=pooled_http_client()
+            )
+
+
+def _copy_client(client: Any) -> Any:
+    # Own wrapper, shared model clients; the wrapper holds no chat state
+    if client is None:
+        return None
+    clone = copy.copy(client)
+    clone._clients = list(client._clients)
+    return clone
+
+
+def clone_agent(template: Any) -> Any:
+    """
+    Copy of ``template`` with empty chat history, counters, hooks and
+    context, sharing its configuration and model clients
+    """
+    agent = copy.copy(template)
+    agent._oai_messages = defaultdict(list)
+    agent._oai_system_message = [dict(m) for m in template._oai_system_message]
+    agent._consecutive_auto_reply_counter = defaultdict(int)
+    agent._max_consecutive_auto_reply_dict = defaultdict(agent.max_consecutive_auto_reply)
+    agent.reply_at_receive = defaultdict(bool)
+    agent._human_input = []
+    agent._reply_func_list = [dict(entry) for entry in template._reply_func_list]
+    agent.hook_lists = {name: list(hooks) for name, hooks in template.hook_lists.items()}
+    agent._function_map = dict(template._function_map)
+    agent._tools = list(template._tools)
+    agent.context_variables = copy.deepcopy(template.context_variables)
+    if isinstance(template._code_execution_config, dict):
+        agent._code_execution_config = dict(template._code_execution_config)
+    executor = getattr(template, "_code_executor", None)
+    if isinstance(executor, PooledCodeExecutor):
+        # Concurrent conversations must not share a scratch directory
+        agent._code_executor = executor.for_session()
+        agent._code_execution_config["executor"] = agent._code_executor
+    agent.client = _copy_client(template.client)
+    return agent
+
+
+def adopt_llm(agent: Any, template: Any):
+    """
+    Give ``agent``, built with ``llm_config=False``, the LLM config and
+    model clients of ``template`` instead of building its own
+    """
+    agent.llm_config = template.llm_config
+    agent.client = _copy_client(template.client)
+
+
+class AgentFactory:
+    """
+    Process-wide, thread-safe source of agents. ``build()`` runs once, on
+    first use, and returns the template agents; ``agents()`` returns fresh
+    clones of them for one conversation.
+    """
+
+    def __init__(self, build: Callable[[], List[Any]]):
+        self._build = build
+        self._templates: Optional[List[Any]] = None
+        self._lock = threading.Lock()
+        self._build_seconds = 0.0
+        self._setups = 0
+        self._setup_seconds = 0.0
+        self._max_setup_seconds = 0.0
+
+    def templates(self) -> List[Any]:
+        with self._lock:
+            if self._templates is None:
+                started = time.perf_counter()
+                templates = self._build()
+                share_http_client(templates)
+                self._build_seconds = time.perf_counter() - started
+                self._templates = templates
+                logger.info(
+                    f"Built {len(templates)} agent templates in "
+                    f"{self._build_seconds * 1000:.1f}ms"
+                )
+            return self._templates
+
+    def template(self, name: str) -> Any:
+        for agent in self.templates():
+            if agent.name == name:
+                return agent
+        raise KeyError(f"No agent template named {name}")
+
+    def agents(self, names: Optional[Sequence[str]] = None) -> List[Any]:
+        """Clones of the templates, or of those named in ``names``"""
+        templates = self.templates()
+        if names is not None:
+            templates = [self.template(name) for name in names]
+        return [clone_agent(template) for template in templates]
+
+    def record_setup(self, seconds: float):
+        """Record how long setting up one conversation took"""
+        with self._lock:
+            self._setups += 1
+            self._setup_seconds += seconds
+            self._max_setup_seconds = max(self._max_setup_seconds, seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        ``build_ms`` is what every conversation paid before templates were
+        reused; ``mean_setup_ms`` is what it pays now
+        """
+        with self._lock:
+            return {
+                "build_ms": round(self._build_seconds * 1000, 2),
+                "sessions": self._setups,
+                "mean_setup_ms": round(self._setup_seconds / self._setups * 1000, 2)
+                if self._setups
+                else None,
+                "max_setup_ms": round(self._max_setup_seconds * 1000, 2),
+                "http2": h2 is not None,
+            }
@@ -0,0 +1,328 @@
+"""
+Batch runs of a group chat team over many inputs.
+
+A team is described by a JSON ``TeamSpec``: the user proxy, the assistants
+with their system messages, the transition graph for ``SpeakerSelector``,
+the fan-out rounds (used with ``GROUPCHAT_FAN_OUT`` on) and a message
+template filled in from each input.
+With ``RETRIEVAL_MEMORY`` on, the input fields named in ``documents`` are
+held in a retrieval memory, so agents see the relevant excerpts of a long
+contract instead of all of it in every round.
+``run_batch`` reads inputs from a JSONL file and runs one conversation per
+line, ``concurrency`` at a time, on agents cloned from templates built
+once. Each result is appended to the output JSONL file as soon as its
+conversation finishes; running the batch again skips the inputs that
+already have a result there, so a crashed or interrupted batch resumes
+where it stopped.
+"""
+
+import os
+import json
+import time
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from autogen import AssistantAgent, GroupChat, GroupChatManager, UserProxyAgent
+
+from .agent_factory import AgentFactory, adopt_llm
+from .fan_out import FanOutGroupChatManager, fan_out_enabled
+from .loop_detection import add_loop_detection, loop_detection_enabled, loop_detection_stats
+from .mock_client import mock_groupchat_kwargs, register_mock_client
+from .rate_limit import add_rate_limiting
+from .response_cache import get_response_cache
+from .retrieval import (
+    add_retrieval_memory,
+    retrieval_groupchat_kwargs,
+    retrieval_memory,
+    retrieval_memory_enabled,
+)
+from .speaker_selection import SpeakerSelector
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TeamSpec:
+    """
+    Declarative description of a group chat team.
+
+    ``agents`` holds one ``{"name", "system_message", "temperature"}`` entry
+    per assistant. ``message`` is formatted with the fields of each input,
+    e.g. ``"Please analyze the following contract:\\n{contract}"``.
+    ``documents`` names the input fields that are reference documents.
+    Every ``fan_out`` branch must also be an allowed ``transitions`` target
+    of its speaker.
+    """
+
+    name: str
+    user_proxy: str
+    agents: List[Dict[str, Any]]
+    message: str
+    transitions: Optional[Dict[str, List[str]]] = None
+    keywords: Optional[Dict[str, List[str]]] = None
+    fan_out: Dict[str, List[str]] = field(default_factory=dict)
+    documents: List[str] = field(default_factory=list)
+    max_round: int = 10
+    max_tokens: int = 1024
+    seed: int = 123
+
+    def __post_init__(self):
+        if self.transitions is None:
+            return
+        for speaker, branches in self.fan_out.items():
+            outside = [b for b in branches if b not in self.transitions.get(speaker, [])]
+            if outside:
+                raise ValueError(
+                    f"{self.name}: fan-out of {speaker} to {outside} is not in its transitions"
+                )
+
+    @classmethod
+    def from_file(cls, path: str) -> "TeamSpec":
+        with open(path, encoding="utf-8") as f:
+            return cls(**json.load(f))
+
+
+def _build_templates(spec: TeamSpec, config_list: List[Dict[str, Any]]) -> List[Any]:
+    user = UserProxyAgent(
+        name=spec.user_proxy,
+        human_input_mode="NEVER",
+        max_consecutive_auto_reply=spec.max_round,
+        code_execution_config=False,
+    )
+    assistants = [
+        AssistantAgent(
+            name=agent["name"],
+            system_message=agent["system_message"],
+            llm_config={
+                "config_list": config_list,
+                "temperature": agent.get("temperature", 0.1),
+                "max_tokens": agent.get("max_tokens", spec.max_tokens),
+                "seed": spec.seed,
+            },
+        )
+        for agent in spec.agents
+    ]
+    # Never runs a chat; it only holds the LLM clients the managers reuse
+    manager = GroupChatManager(
+        groupchat=GroupChat(agents=[], messages=[]),
+        name="chat_manager",
+        llm_config={"config_list": config_list},
+    )
+    templates = [user] + assistants + [manager]
+    register_mock_client(templates)
+    add_rate_limiting(templates)
+    return templates
+
+
+class TeamRunner:
+    """Runs conversations of one ``TeamSpec`` on cloned agents; thread-safe"""
+
+    def __init__(self, spec: TeamSpec, config_list: List[Dict[str, Any]]):
+        self.spec = spec
+        self.config_list = config_list
+        self.factory = AgentFactory(lambda: _build_templates(spec, config_list))
+        self.names = [spec.user_proxy] + [agent["name"] for agent in spec.agents]
+
+    def create_session(self) -> Tuple[List[Any], GroupChatManager]:
+        # The first session builds the templates; that is reported as build_ms
+        self.factory.templates()
+        started = time.perf_counter()
+        agents = self.factory.agents(self.names)
+        if retrieval_memory_enabled():
+            add_retrieval_memory(agents)
+        selector = SpeakerSelector(
+            transitions=self.spec.transitions, keywords=self.spec.keywords
+        )
+        groupchat = GroupChat(
+            agents=agents,
+            messages=[],
+            max_round=self.spec.max_round,
+            **selector.groupchat_kwargs(agents),
+            **retrieval_groupchat_kwargs(agents),
+            **mock_groupchat_kwargs(self.config_list),
+        )
+        # Batches print a log line per conversation, not every message
+        if self.spec.fan_out and fan_out_enabled():
+            manager = FanOutGroupChatManager(
+                groupchat=groupchat,
+                fan_out=self.spec.fan_out,
+                llm_config=False,
+                silent=True,
+            )
+        else:
+            manager = GroupChatManager(groupchat=groupchat, llm_config=False, silent=True)
+        adopt_llm(manager, self.factory.template("chat_manager"))
+        if loop_detection_enabled():
+            add_loop_detection(manager)
+        # Also rate limits the speaker selection of this manager's group chat
+        add_rate_limiting([manager])
+        self.factory.record_setup(time.perf_counter() - started)
+        return agents, manager
+
+    def run(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Run one conversation for ``item`` and return its result record"""
+        started = time.perf_counter()
+        try:
+            message = self.spec.message.format(**item)
+            agents, manager = self.create_session()
+            memory = retrieval_memory(agents)
+            if memory is not None:
+                for name in self.spec.documents:
+                    memory.add_document(name, str(item[name]))
+            agents[0].initiate_chat(
+                manager, message=message, cache=get_response_cache(), silent=True
+            )
+        except Exception as e:
+            logger.warning(f"Item {item.get('id')} failed: {e}")
+            return {
+                "id": item.get("id"),
+                "status": "error",
+                "error": f"{type(e).__name__}: {e}",
+                "seconds": round(time.perf_counter() - started, 3),
+            }
+        messages = [
+            {"name": m.get("name"), "content": m.get("content")}
+            for m in manager.groupchat.messages
+        ]
+        replies = [m for m in messages if m["name"] != self.spec.user_proxy and m["content"]]
+        record = {
+            "id": item.get("id"),
+            "status": "ok",
+            "result": replies[-1]["content"] if replies else None,
+            # The transcript, including the task message
+            "messages_count": len(messages),
+            "messages": messages,
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+        loops = loop_detection_stats(manager)
+        if loops is not None:
+            record["loop_detection"] = loops
+        return record
+
+
+def read_inputs(path: str) -> Iterator[Dict[str, Any]]:
+    """Inputs of a JSONL file; lines without an ``id`` get their line number"""
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            item["id"] = str(item.get("id", number))
+            yield item
+
+
+def completed_ids(path: str, retry_failed: bool = False) -> Set[str]:
+    """Ids with a result in the output file, skipping a line cut off by a crash"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("status") == "ok" or not retry_failed:
+                done.add(str(record.get("id")))
+    return done
+
+
+class ResultWriter:
+    """Appends result records to a JSONL file, one flushed line per result"""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Start on a new line if the last run died in the middle of one
+        cut_off = False
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                cut_off = f.read(1) != b"\n"
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        if cut_off:
+            self._file.write("\n")
+
+    def write(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def run_batch(
+    spec: TeamSpec,
+    config_list: List[Dict[str, Any]],
+    inputs_path: str,
+    output_path: str,
+    concurrency: int = 4,
+    retry_failed: bool = False,
+    limit: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Run ``spec`` over the inputs not yet in ``output_path``, at most
+    ``concurrency`` conversations at once, and return a throughput report.
+    With ``retry_failed`` inputs whose earlier run failed are run again.
+    """
+    done = completed_ids(output_path, retry_failed)
+    items = list(read_inputs(inputs_path))
+    # The output file may hold results of inputs that are not in this file
+    skipped = sum(item["id"] in done for item in items)
+    items = [item for item in items if item["id"] not in done]
+    if limit is not None:
+        items = items[:limit]
+    logger.info(
+        f"{spec.name}: {len(items)} inputs to run, {skipped} already done, "
+        f"concurrency {concurrency}"
+    )
+
+    runner = TeamRunner(spec, config_list)
+    writer = ResultWriter(output_path)
+    counts = {"ok": 0, "error": 0}
+    saved = {"rounds": 0, "tokens": 0}
+    started = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch")
+    try:
+        futures = [executor.submit(runner.run, item) for item in items]
+        for future in as_completed(futures):
+            record = future.result()
+            writer.write(record)
+            counts[record["status"]] += 1
+            loops = record.get("loop_detection")
+            if loops:
+                saved["rounds"] += loops["rounds_saved"]
+                saved["tokens"] += loops["tokens_saved_estimate"]
+            finished = counts["ok"] + counts["error"]
+            if finished % max(1, concurrency) == 0 or finished == len(items):
+                elapsed = time.perf_counter() - started
+                logger.info(
+                    f"{spec.name}: {finished}/{len(items)} done, "
+                    f"{finished / elapsed * 60:.1f} items/min"
+                )
+    finally:
+        # On Ctrl-C, drop the queued inputs; a later run picks them up
+        executor.shutdown(wait=True, cancel_futures=True)
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    finished = counts["ok"] + counts["error"]
+    return {
+        "team": spec.name,
+        "completed": counts["ok"],
+        "failed": counts["error"],
+        "skipped": skipped,
+        "concurrency": concurrency,
+        "wall_seconds": round(elapsed, 3),
+        "items_per_minute": round(finished / elapsed * 60, 2) if elapsed and finished else 0.0,
+        "session_setup": runner.factory.stats(),
+        "loop_detection_saved": saved if loop_detection_enabled() else None,
+    }
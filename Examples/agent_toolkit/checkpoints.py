@@ -0,0 +1,321 @@
+"""
+Checkpoints of group chat conversations, for resuming the ones that fail.
+
+``add_checkpointing(manager, session_id)`` stores every message appended to
+the manager's group chat, with its round and speaker, so a checkpoint only
+costs the new message. When a conversation dies, e.g. on a model timeout in
+round 12 of 15, ``restore()`` loads the messages into a freshly built team,
+rebuilds every agent's chat history from them and returns the speaker and
+message to continue from:
+
+    checkpointer = add_checkpointing(manager, "tutorial")
+    resumed = checkpointer.restore()
+    if resumed:
+        speaker, message = resumed
+        speaker.initiate_chat(manager, message=message, clear_history=False)
+    else:
+        user.initiate_chat(manager, message=task)
+
+The resumed chat only runs the rounds that were left, so a failure costs
+the remaining rounds instead of the whole conversation. Checkpoints are
+kept in a SQLite file (``CHECKPOINT_PATH``) and deleted by ``finish()``
+once the conversation ends normally. Checkpoints are opt-in: set
+``CHECKPOINTS=on`` to enable them.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from autogen import GroupChat, GroupChatManager
+
+from .fan_out import manager_groupchats
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT_PATH = os.path.join(".cache", "checkpoints.sqlite")
+
+
+def checkpoints_enabled() -> bool:
+    """True when ``CHECKPOINTS`` is on"""
+    value = os.getenv("CHECKPOINTS", "off").lower()
+    return value in ("1", "on", "true", "yes")
+
+
+class CheckpointStore:
+    """
+    Append-only log of each session's group chat messages in a SQLite file,
+    one row per round. Sessions not updated for ``ttl_seconds`` are dropped
+    when the store is opened. One instance is safe to share between threads
+    and conversations.
+    """
+
+    def __init__(
+        self, path: str = DEFAULT_CHECKPOINT_PATH, ttl_seconds: float = 7 * 24 * 3600
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # A checkpoint lost in a power cut only costs one more round
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS checkpoint_sessions (
+                session_id TEXT PRIMARY KEY,
+                max_round INTEGER NOT NULL,
+                updated REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS checkpoint_rounds (
+                session_id TEXT NOT NULL,
+                round INTEGER NOT NULL,
+                message TEXT NOT NULL,
+                speaker TEXT NOT NULL,
+                PRIMARY KEY (session_id, round)
+            )"""
+        )
+        if ttl_seconds:
+            expired = "SELECT session_id FROM checkpoint_sessions WHERE updated < ?"
+            cutoff = (time.time() - ttl_seconds,)
+            self._conn.execute(
+                f"DELETE FROM checkpoint_rounds WHERE session_id IN ({expired})", cutoff
+            )
+            self._conn.execute("DELETE FROM checkpoint_sessions WHERE updated < ?", cutoff)
+        self._conn.commit()
+
+    def append(
+        self,
+        session_id: str,
+        round_number: int,
+        message: Dict[str, Any],
+        speaker: str,
+        max_round: int,
+    ):
+        """Store the message of a round; a new conversation starts at round 0"""
+        text = json.dumps(message, ensure_ascii=False, default=str)
+        with self._lock:
+            if round_number == 0:
+                # Rounds of an earlier conversation under the same id
+                self._conn.execute(
+                    "DELETE FROM checkpoint_rounds WHERE session_id = ?", (session_id,)
+                )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoint_rounds (session_id, round, message, speaker) "
+                "VALUES (?, ?, ?, ?)",
+                (session_id, round_number, text, speaker),
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoint_sessions (session_id, max_round, updated) "
+                "VALUES (?, ?, ?)",
+                (session_id, max_round, time.time()),
+            )
+            self._conn.commit()
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        The last checkpoint of ``session_id``: its ``round``, ``max_round``,
+        the ``messages`` before that round, and the ``speaker`` and
+        ``message`` of the round to resume with
+        """
+        with self._lock:
+            session = self._conn.execute(
+                "SELECT max_round FROM checkpoint_sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            rows = self._conn.execute(
+                "SELECT message, speaker FROM checkpoint_rounds WHERE session_id = ? "
+                "ORDER BY round",
+                (session_id,),
+            ).fetchall()
+        if session is None or not rows:
+            return None
+        messages = [json.loads(message) for message, _ in rows]
+        return {
+            "round": len(rows) - 1,
+            "max_round": session[0],
+            "speaker": rows[-1][1],
+            "message": messages[-1],
+            "messages": messages[:-1],
+            "speakers": [speaker for _, speaker in rows[:-1]],
+        }
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM checkpoint_rounds WHERE session_id = ?", (session_id,))
+            self._conn.execute(
+                "DELETE FROM checkpoint_sessions WHERE session_id = ?", (session_id,)
+            )
+            self._conn.commit()
+
+    def sessions(self) -> List[Dict[str, Any]]:
+        """Session id, round and update time of every stored checkpoint"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT s.session_id, MAX(r.round), s.updated FROM checkpoint_sessions s "
+                "JOIN checkpoint_rounds r ON r.session_id = s.session_id "
+                "GROUP BY s.session_id ORDER BY s.updated DESC"
+            ).fetchall()
+        return [{"session_id": s, "round": r, "updated": u} for s, r, u in rows]
+
+
+_shared_stores: Dict[str, CheckpointStore] = {}
+_shared_lock = threading.Lock()
+
+
+def get_checkpoint_store(path: Optional[str] = None) -> Optional[CheckpointStore]:
+    """
+    Return the process-wide checkpoint store configured from the
+    environment: ``CHECKPOINT_PATH`` sets the SQLite file and
+    ``CHECKPOINT_TTL_HOURS`` how long checkpoints are kept. Returns ``None``
+    when ``CHECKPOINTS`` is off.
+    """
+    if not checkpoints_enabled():
+        return None
+
+    path = path or os.getenv("CHECKPOINT_PATH", DEFAULT_CHECKPOINT_PATH)
+    with _shared_lock:
+        if path not in _shared_stores:
+            _shared_stores[path] = CheckpointStore(
+                path,
+                ttl_seconds=float(os.getenv("CHECKPOINT_TTL_HOURS", "168")) * 3600,
+            )
+            logger.info(f"Saving conversation checkpoints to {path}")
+        return _shared_stores[path]
+
+
+def checkpoint_messages(state: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Messages of a checkpoint, including the one the resumed chat starts with"""
+    return state["messages"] + [state["message"]]
+
+
+class GroupChatCheckpointer:
+    """
+    Stores every message appended to ``manager``'s group chat and restores
+    the conversation into a new team with the same agent names. Use
+    ``add_checkpointing`` to create one.
+    """
+
+    def __init__(self, manager: GroupChatManager, session_id: str, store: CheckpointStore):
+        self.manager = manager
+        self.session_id = session_id
+        self.store = store
+        self.max_round = manager.groupchat.max_round
+        self.saves = 0
+        self.save_seconds = 0.0
+        # The message a resumed chat starts with is appended a second time
+        self._replaying = False
+        for groupchat in manager_groupchats(manager):
+            self._wrap(groupchat)
+
+    def _participants(self) -> List[Any]:
+        return list(self.manager.groupchat.agents) + [self.manager]
+
+    def _wrap(self, groupchat: GroupChat):
+        if getattr(groupchat, "_checkpointed", False):
+            return
+        groupchat._checkpointed = True
+        append = groupchat.append
+
+        def checkpointed_append(message: Dict[str, Any], speaker: Any):
+            if self._replaying:
+                self._replaying = False
+                # Observers saw this message before the conversation failed
+                GroupChat.append(groupchat, message, speaker)
+                return
+            round_number = len(groupchat.messages)
+            append(message, speaker)
+            started = time.perf_counter()
+            self.store.append(
+                self.session_id, round_number, message, speaker.name, self.max_round
+            )
+            self.saves += 1
+            self.save_seconds += time.perf_counter() - started
+
+        groupchat.append = checkpointed_append
+
+    def restore(self) -> Optional[Tuple[Any, Dict[str, Any]]]:
+        """
+        Load the last checkpoint into the group chat and its agents and
+        return ``(speaker, message)`` to resume with, or ``None`` if there
+        is no checkpoint. Only the rounds that were left will run.
+        """
+        state = self.store.load(self.session_id)
+        if state is None:
+            return None
+        agents = {agent.name: agent for agent in self._participants()}
+        speaker = agents.get(state["speaker"])
+        if speaker is None:
+            raise ValueError(
+                f"Checkpoint of {self.session_id} needs agent {state['speaker']}"
+            )
+
+        for agent in agents.values():
+            agent.clear_history()
+        self._rebuild_histories(state["messages"], state["speakers"], agents)
+
+        remaining = max(1, state["max_round"] - state["round"])
+        restored_lists = set()
+        for groupchat in manager_groupchats(self.manager):
+            groupchat.max_round = remaining
+            # The manager's copies of the group chat share one message list
+            if id(groupchat.messages) not in restored_lists:
+                restored_lists.add(id(groupchat.messages))
+                groupchat.messages[:] = state["messages"]
+        self._replaying = True
+        logger.info(
+            f"Resuming {self.session_id} at round {state['round'] + 1} of "
+            f"{state['max_round']} with {speaker.name}'s message"
+        )
+        return speaker, state["message"]
+
+    def _rebuild_histories(
+        self, messages: List[Dict[str, Any]], speakers: List[str], agents: Dict[str, Any]
+    ):
+        # Replays each round the way GroupChatManager.run_chat does: the
+        # speaker sends its message to the manager, which broadcasts it to
+        # the other agents. The last message is sent again by the resumed chat
+        manager = self.manager
+        for message, name in zip(messages, speakers):
+            speaker = agents.get(name)
+            if speaker is None:
+                raise ValueError(f"Checkpoint of {self.session_id} needs agent {name}")
+            speaker._append_oai_message(message, "assistant", manager, is_sending=True)
+            manager._append_oai_message(message, "user", speaker, is_sending=False)
+            for agent in manager.groupchat.agents:
+                if agent is not speaker:
+                    manager._append_oai_message(message, "assistant", agent, is_sending=True)
+                    agent._append_oai_message(message, "user", manager, is_sending=False)
+
+    def finish(self):
+        """Drop the checkpoint of a conversation that ended normally"""
+        self.store.delete(self.session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "saves": self.saves,
+            "mean_save_ms": round(self.save_seconds / self.saves * 1000, 2)
+            if self.saves
+            else None,
+        }
+
+
+def add_checkpointing(
+    manager: GroupChatManager, session_id: str, store: Optional[CheckpointStore] = None
+) -> Optional[GroupChatCheckpointer]:
+    """
+    Checkpoint every round of ``manager``'s group chat under ``session_id``.
+    Returns ``None`` when checkpoints are disabled.
+    """
+    store = store or get_checkpoint_store()
+    if store is None:
+        return None
+    return GroupChatCheckpointer(manager, session_id, store)
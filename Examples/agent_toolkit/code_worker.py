@@ -0,0 +1,102 @@
+"""
+Single-use code execution worker started by ``CodeWorkerPool``.
+
+The worker imports the modules listed in ``CODE_WORKER_PRELOAD`` while it
+waits in the pool, then reads one job as a JSON line from stdin:
+``{"language", "path", "cwd", "cpu_seconds", "memory_mb"}``. It moves to the
+job's scratch directory, applies the resource limits and runs the file,
+printing its output. The process exits afterwards, so no state leaks from
+one code block to the next. It exits with ``os._exit`` once the block's
+exit handlers ran: a regular interpreter shutdown would also tear down every
+preloaded module, which takes longer than most code blocks.
+
+Run by path, not imported: ``python code_worker.py``.
+"""
+
+import os
+import sys
+import json
+import atexit
+import runpy
+import pkgutil  # noqa: F401 imported by runpy.run_path, load it while waiting
+import traceback
+import importlib
+
+try:
+    import resource
+except ImportError:  # Windows: no resource limits
+    resource = None
+
+
+def preload(modules):
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            # Missing or broken packages only cost the warm-up
+            pass
+
+
+def _virtual_memory_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def apply_limits(cpu_seconds, memory_mb):
+    if resource is None:
+        return
+    if cpu_seconds:
+        resource.setrlimit(resource.RLIMIT_CPU, (int(cpu_seconds), int(cpu_seconds) + 1))
+    if memory_mb:
+        # On top of what the preloaded modules already mapped
+        limit = _virtual_memory_bytes() + int(memory_mb) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def main():
+    # Generated code must not import the toolkit modules next to this file
+    if sys.path and sys.path[0] == os.path.dirname(os.path.abspath(__file__)):
+        del sys.path[0]
+    preload(m for m in os.getenv("CODE_WORKER_PRELOAD", "").split(",") if m)
+    line = sys.stdin.readline()
+    if not line:
+        # Pool shut down before handing out this worker
+        return
+    job = json.loads(line)
+    os.chdir(job["cwd"])
+    apply_limits(job.get("cpu_seconds"), job.get("memory_mb"))
+
+    if job["language"] != "python":
+        sys.stdout.flush()
+        os.execvp(job["language"], [job["language"], job["path"]])
+
+    sys.argv = [job["path"]]
+    sys.path.insert(0, job["cwd"])
+    exit_code = 0
+    try:
+        # Drop the globals right away so unclosed files get flushed
+        runpy.run_path(job["path"], run_name="__main__")
+    except SystemExit as e:
+        if isinstance(e.code, int) or e.code is None:
+            exit_code = e.code or 0
+        else:
+            print(e.code, file=sys.stderr)
+            exit_code = 1
+    except BaseException:
+        traceback.print_exc()
+        exit_code = 1
+    finish(exit_code)
+
+
+def finish(exit_code):
+    atexit._run_exitfuncs()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
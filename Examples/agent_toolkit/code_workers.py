@@ -0,0 +1,446 @@
+"""
+Pooled, resource-limited code execution for ``UserProxyAgent``.
+
+The local command line executor starts a fresh interpreter for every code
+block, which then imports pandas and matplotlib again, and every session
+writes to the same ``work_dir``. ``CodeWorkerPool`` keeps a few worker
+processes (``code_worker.py``) started ahead of time with those imports
+done. Each code block takes a warm worker, which runs it under CPU time and
+memory limits and then exits; a new worker then warms up in its place
+while the agents talk. ``PooledCodeExecutor`` plugs the pool into ``code_execution_config``
+and gives every session its own scratch directory below ``work_dir``:
+
+    code_execution_config=code_execution_config("coding")
+
+The pool is opt-in: set ``CODE_WORKERS=on`` to use it. Otherwise agents
+keep the local executor, which writes directly to ``work_dir``. The workers
+start when the first code block runs, not when an agent is built.
+"""
+
+import os
+import sys
+import json
+import uuid
+import time
+import queue
+import atexit
+import hashlib
+import threading
+import subprocess
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from autogen.code_utils import PYTHON_VARIANTS, TIMEOUT_MSG
+from autogen.coding import CodeBlock, MarkdownCodeExtractor
+from autogen.coding.base import CommandLineCodeResult
+from autogen.coding.local_commandline_code_executor import LocalCommandLineCodeExecutor
+from autogen.coding.utils import _get_file_name_from_content, silence_pip
+
+from .execution_cache import ExecutionCache, get_execution_cache, snapshot
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "code_worker.py")
+SHELL_LANGUAGES = ("bash", "shell", "sh")
+DEFAULT_PRELOAD = "numpy,pandas,matplotlib,matplotlib.pyplot"
+# Variables the workers inherit; API keys and other secrets stay behind
+WORKER_ENV_ALLOW = (
+    "PATH",
+    "HOME",
+    "LANG",
+    "LANGUAGE",
+    "TZ",
+    "TMPDIR",
+    "TEMP",
+    "TMP",
+    "VIRTUAL_ENV",
+    "PYTHONPATH",
+    "SYSTEMROOT",  # Windows needs it to start Python at all
+)
+
+
+def worker_env(extra: str = "") -> Dict[str, str]:
+    """
+    The allowed variables of ``os.environ``, the locale (``LC_*``) and the
+    comma-separated names in ``extra``
+    """
+    names = set(WORKER_ENV_ALLOW)
+    names.update(name.strip() for name in extra.split(",") if name.strip())
+    return {
+        name: value
+        for name, value in os.environ.items()
+        if name in names or name.startswith("LC_")
+    }
+
+
+def code_workers_enabled() -> bool:
+    """True when ``CODE_WORKERS`` is on"""
+    value = os.getenv("CODE_WORKERS", "off").lower()
+    return value in ("1", "on", "true", "yes")
+
+
+class CodeWorkerPool:
+    """
+    ``size`` warm worker processes; at most ``size`` code blocks run at once
+    and the others wait for a free slot. Every block runs in a new process
+    limited to ``cpu_seconds`` of CPU time, ``memory_mb`` of memory on top
+    of the preloaded modules and ``timeout`` seconds of wall time.
+    Workers see a minimal environment (``worker_env``), not the API keys of
+    the agents; name other variables they need in ``env``.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        preload: str = DEFAULT_PRELOAD,
+        cpu_seconds: float = 60,
+        memory_mb: float = 2048,
+        timeout: float = 60,
+        env: str = "",
+    ):
+        self.size = size
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.timeout = timeout
+        self._env = {
+            **worker_env(env),
+            "CODE_WORKER_PRELOAD": preload,
+            # Charts are saved to files, there is no display
+            "MPLBACKEND": "Agg",
+            "PYTHONUNBUFFERED": "1",
+        }
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle: "queue.Queue[subprocess.Popen]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._runs = 0
+        self._cold_starts = 0
+        self._timeouts = 0
+        self._wait_seconds = 0.0
+        self._run_seconds = 0.0
+        for _ in range(size):
+            self._idle.put(self._spawn())
+        atexit.register(self.close)
+
+    def _spawn(self) -> subprocess.Popen:
+        return subprocess.Popen(
+            [sys.executable, WORKER_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            env=self._env,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+        )
+
+    def _take(self) -> subprocess.Popen:
+        worker = self._idle.get()
+        if worker.poll() is not None:
+            # Died while waiting, e.g. killed from outside
+            with self._lock:
+                self._cold_starts += 1
+            worker = self._spawn()
+        return worker
+
+    def run(self, language: str, path: str, cwd: str, timeout: Optional[float] = None):
+        """Run the file ``path`` in ``cwd``; returns ``(exit_code, output)``"""
+        if self._closed:
+            raise RuntimeError("Code worker pool is closed")
+        timeout = timeout or self.timeout
+        started = time.perf_counter()
+        with self._slots:
+            waited = time.perf_counter() - started
+            worker = self._take()
+            job = {
+                "language": language,
+                "path": os.path.abspath(path),
+                "cwd": os.path.abspath(cwd),
+                "cpu_seconds": self.cpu_seconds,
+                "memory_mb": self.memory_mb,
+            }
+            timed_out = False
+            try:
+                output, _ = worker.communicate(json.dumps(job) + "\n", timeout=timeout)
+                exit_code = worker.returncode
+            except subprocess.TimeoutExpired:
+                worker.kill()
+                output, _ = worker.communicate()
+                output += "\n" + TIMEOUT_MSG
+                # Same exit code as the timeout command on linux
+                exit_code = 124
+                timed_out = True
+            finally:
+                # Started after the block, so its imports don't compete for CPU
+                if not self._closed:
+                    self._idle.put(self._spawn())
+        with self._lock:
+            self._runs += 1
+            self._timeouts += timed_out
+            self._wait_seconds += waited
+            self._run_seconds += time.perf_counter() - started - waited
+        return exit_code, output
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.kill()
+            worker.wait()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.size,
+                "runs": self._runs,
+                "cold_starts": self._cold_starts,
+                "timeouts": self._timeouts,
+                "mean_wait_ms": round(self._wait_seconds / self._runs * 1000, 2)
+                if self._runs
+                else None,
+                "mean_run_ms": round(self._run_seconds / self._runs * 1000, 2)
+                if self._runs
+                else None,
+            }
+
+
+_pool: Optional[CodeWorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_code_worker_pool() -> CodeWorkerPool:
+    """Process-wide pool configured by the ``CODE_WORKER_*`` variables"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = CodeWorkerPool(
+                size=int(os.getenv("CODE_WORKER_POOL_SIZE", "2")),
+                preload=os.getenv("CODE_WORKER_PRELOAD", DEFAULT_PRELOAD),
+                cpu_seconds=float(os.getenv("CODE_WORKER_CPU_SECONDS", "60")),
+                memory_mb=float(os.getenv("CODE_WORKER_MEMORY_MB", "2048")),
+                timeout=float(os.getenv("CODE_WORKER_TIMEOUT", "60")),
+                env=os.getenv("CODE_WORKER_ENV", ""),
+            )
+        return _pool
+
+
+def _write_code_file(code: str, language: str, directory: str) -> str:
+    """
+    Save ``code`` where its filename comment says, or under a name derived
+    from its hash, like the local executor; raises ``ValueError`` for a
+    file name outside ``directory``
+    """
+    filename = _get_file_name_from_content(code, Path(directory))
+    if filename is None:
+        code_hash = hashlib.md5(code.encode()).hexdigest()
+        filename = f"tmp_code_{code_hash}.{'py' if language == 'python' else 'sh'}"
+    path = os.path.join(directory, filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(code)
+    return os.path.abspath(path)
+
+
+class PooledCodeExecutor:
+    """
+    ``CodeExecutor`` that runs Python and shell blocks on a
+    ``CodeWorkerPool``, in a scratch directory of its own below
+    ``work_dir``. With a ``cache``, Python blocks that ran before return
+    their stored result and files instead of running again.
+    ``for_session()`` returns an executor with a new scratch directory on
+    the same pool, for agents cloned per conversation.
+    """
+
+    def __init__(
+        self,
+        work_dir: str = "coding",
+        pool: Optional[CodeWorkerPool] = None,
+        timeout: Optional[float] = None,
+        cache: Optional[ExecutionCache] = None,
+    ):
+        self.work_dir = work_dir
+        self.scratch_dir = os.path.join(work_dir, f"session-{uuid.uuid4().hex[:8]}")
+        self.timeout = timeout
+        self.cache = cache
+        self._pool = pool
+        self._code_extractor = MarkdownCodeExtractor()
+
+    @property
+    def pool(self) -> CodeWorkerPool:
+        if self._pool is None:
+            self._pool = get_code_worker_pool()
+        return self._pool
+
+    @property
+    def code_extractor(self) -> MarkdownCodeExtractor:
+        return self._code_extractor
+
+    def for_session(self) -> "PooledCodeExecutor":
+        return PooledCodeExecutor(self.work_dir, self._pool, self.timeout, self.cache)
+
+    def execute_code_blocks(self, code_blocks: List[CodeBlock]) -> CommandLineCodeResult:
+        with span(
+            "code.execute",
+            work_dir=self.scratch_dir,
+            blocks=len(code_blocks),
+            languages=sorted({block.language for block in code_blocks}),
+        ) as s:
+            result, cached = self._execute(code_blocks)
+            s.set(exit_code=result.exit_code, cached_blocks=cached)
+            return result
+
+    def _execute(self, code_blocks: List[CodeBlock]):
+        if not os.path.isdir(self.scratch_dir):
+            os.makedirs(self.scratch_dir)
+            logger.info(f"Running code blocks in {self.scratch_dir}")
+        output = ""
+        exit_code = 0
+        code_files = []
+        cached = 0
+        for block in code_blocks:
+            language, code = block.language.lower(), block.code
+            LocalCommandLineCodeExecutor.sanitize_command(language, code)
+            code = silence_pip(code, language)
+            if language in PYTHON_VARIANTS:
+                language = "python"
+            elif language in SHELL_LANGUAGES:
+                language = "bash" if language == "bash" else "sh"
+            else:
+                exit_code = 1
+                output += "\n" + f"unknown language {language}"
+                break
+
+            try:
+                path = _write_code_file(code, language, self.scratch_dir)
+            except ValueError:
+                result = CommandLineCodeResult(exit_code=1, output="Filename is not in the workspace")
+                return result, cached
+            code_files.append(path)
+
+            if self.cache is not None and language == "python":
+                result = self.cache.lookup(language, code, self.scratch_dir)
+                if result is not None:
+                    cached += 1
+                    exit_code, block_output = result
+                else:
+                    inputs = self.cache.inputs(code, self.scratch_dir)
+                    before = snapshot(self.scratch_dir)
+                    exit_code, block_output = self.pool.run(
+                        language, path, self.scratch_dir, self.timeout
+                    )
+                    if exit_code == 0:
+                        self.cache.store(
+                            language,
+                            code,
+                            self.scratch_dir,
+                            inputs,
+                            before,
+                            exit_code,
+                            block_output,
+                            code_file=path,
+                        )
+            else:
+                exit_code, block_output = self.pool.run(
+                    language, path, self.scratch_dir, self.timeout
+                )
+            output += block_output
+            if exit_code != 0:
+                break
+
+        result = CommandLineCodeResult(
+            exit_code=exit_code,
+            output=output,
+            code_file=code_files[0] if code_files else None,
+        )
+        return result, cached
+
+    def restart(self):
+        # Workers are single use, so there is no state to reset
+        pass
+
+
+class CachedLocalCodeExecutor(LocalCommandLineCodeExecutor):
+    """
+    The local executor, running blocks directly in ``work_dir``, except that
+    Python blocks that ran before return their stored result and files from
+    ``cache`` instead of running again
+    """
+
+    def __init__(self, cache: ExecutionCache, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+
+    def _execute_code_dont_check_setup(self, code_blocks: List[CodeBlock]) -> CommandLineCodeResult:
+        output = ""
+        exit_code = 0
+        code_files = []
+        for block in code_blocks:
+            if block.language.lower() in PYTHON_VARIANTS:
+                result = self._execute_python(block.code)
+            else:
+                result = super()._execute_code_dont_check_setup([block])
+            output += result.output
+            exit_code = result.exit_code
+            if result.code_file:
+                code_files.append(result.code_file)
+            if exit_code != 0:
+                break
+        return CommandLineCodeResult(
+            exit_code=exit_code,
+            output=output,
+            code_file=code_files[0] if code_files else None,
+        )
+
+    def _execute_python(self, code: str) -> CommandLineCodeResult:
+        work_dir = str(self.work_dir)
+        code = silence_pip(code, "python")
+        try:
+            path = _write_code_file(code, "python", work_dir)
+        except ValueError:
+            return CommandLineCodeResult(exit_code=1, output="Filename is not in the workspace")
+        result = self.cache.lookup("python", code, work_dir)
+        if result is not None:
+            return CommandLineCodeResult(exit_code=result[0], output=result[1], code_file=path)
+
+        inputs = self.cache.inputs(code, work_dir)
+        before = snapshot(work_dir)
+        result = super()._execute_code_dont_check_setup([CodeBlock(code=code, language="python")])
+        if result.exit_code == 0:
+            self.cache.store(
+                "python",
+                code,
+                work_dir,
+                inputs,
+                before,
+                result.exit_code,
+                result.output,
+                code_file=result.code_file,
+            )
+        return result
+
+
+def code_execution_config(work_dir: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    ``code_execution_config`` for a ``UserProxyAgent``: a
+    ``PooledCodeExecutor`` below ``work_dir`` when ``CODE_WORKERS`` is on,
+    otherwise the local executor in ``work_dir`` itself. Either uses the
+    execution cache when ``CODE_CACHE`` is on.
+    """
+    if not code_workers_enabled():
+        cache = get_execution_cache()
+        if cache is not None:
+            executor = CachedLocalCodeExecutor(cache, work_dir=work_dir, timeout=int(timeout or 60))
+            return {"executor": executor}
+        config: Dict[str, Any] = {"work_dir": work_dir, "use_docker": False}
+        if timeout:
+            config["timeout"] = timeout
+        return config
+    # The pool starts with the first code block, so building a team (at
+    # warm-up or in a benchmark) doesn't spawn workers that may never run
+    executor = PooledCodeExecutor(work_dir, None, timeout, get_execution_cache())
+    return {"executor": executor}
@@ -0,0 +1,272 @@
+"""
+Transcript compaction for long group chats.
+
+Every GroupChat turn resends the whole history to the next speaker, so prompt
+tokens grow quadratically over a session. ``TranscriptCompactor`` is an
+autogen ``MessageTransform`` that rewrites the history an agent sees before
+it replies:
+
+- the first message (the task) and the last ``keep_last`` turns stay verbatim
+- older turns are rolled into one running summary per agent
+- large code blocks in older turns become short references
+- the result is trimmed to ``max_tokens``
+
+The summaries are extractive (leading sentences and headings), so no extra
+model calls are made. Enable it on agents with ``add_transcript_compaction``.
+"""
+
+import os
+import re
+import hashlib
+import logging
+import threading
+import weakref
+from typing import Any, Dict, List, Sequence, Tuple
+
+from autogen.agentchat.contrib.capabilities.transform_messages import (
+    TransformMessages,
+)
+
+from .tokens import (
+    CHARS_PER_TOKEN,
+    estimate_message_tokens,
+    estimate_tokens,
+    message_text,
+)
+
+logger = logging.getLogger(__name__)
+
+_CODE_BLOCK_PATTERN = re.compile(r"```([\w+-]*)\n(.*?)```", re.S)
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+SUMMARY_HEADER = "Summary of the earlier conversation (older turns compacted):"
+
+
+class TranscriptCompactor:
+    """
+    ``MessageTransform`` that keeps the task and the last ``keep_last``
+    messages verbatim and compacts everything in between.
+
+    - ``keep_last``: number of recent messages passed through unchanged
+    - ``max_tokens``: token budget for the whole history (0 = no limit)
+    - ``summary_tokens``: size of each agent's running summary
+    - ``max_code_lines``: code blocks longer than this in compacted turns are
+      replaced by a reference (0 = keep code)
+    """
+
+    def __init__(
+        self,
+        keep_last: int = 4,
+        max_tokens: int = 4000,
+        summary_tokens: int = 150,
+        max_code_lines: int = 12,
+        name: str = "",
+    ):
+        self.keep_last = max(1, keep_last)
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+        self.max_code_lines = max_code_lines
+        self.name = name
+        self.code_blocks: Dict[str, str] = {}
+        self.rounds: List[Dict[str, int]] = []
+        self._points: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def apply_transform(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        tokens_before = estimate_message_tokens(messages)
+        if len(messages) <= self.keep_last + 1 and (
+            not self.max_tokens or tokens_before <= self.max_tokens
+        ):
+            return messages
+
+        split = max(1, len(messages) - self.keep_last)
+        # Never separate a tool result from the call that produced it
+        while split > 1 and messages[split].get("role") == "tool":
+            split -= 1
+        head, older, recent = messages[:1], messages[1:split], messages[split:]
+        compacted = [self._compact_code(m) for m in head]
+        if older:
+            compacted.append({"role": "user", "content": self._summarize(older)})
+        compacted.extend(recent)
+        compacted = self._fit_budget(compacted)
+
+        tokens_after = estimate_message_tokens(compacted)
+        self._record(len(messages), tokens_before, tokens_after)
+        return compacted
+
+    def get_logs(
+        self,
+        pre_transform_messages: List[Dict[str, Any]],
+        post_transform_messages: List[Dict[str, Any]],
+    ) -> Tuple[str, bool]:
+        before = estimate_message_tokens(pre_transform_messages)
+        after = estimate_message_tokens(post_transform_messages)
+        if after >= before:
+            return "No messages were compacted.", False
+        return (
+            f"Compacted {len(pre_transform_messages)} messages from {before} to "
+            f"{after} tokens ({before - after} saved).",
+            True,
+        )
+
+    def _summarize(self, messages: List[Dict[str, Any]]) -> str:
+        by_agent: Dict[str, List[str]] = {}
+        for message in messages:
+            speaker = message.get("name") or message.get("role", "unknown")
+            by_agent.setdefault(speaker, []).extend(self._message_points(message))
+
+        lines = [SUMMARY_HEADER]
+        for speaker, points in by_agent.items():
+            lines.append(f"- {speaker}: {self._trim_points(points)}")
+        return "\n".join(lines)
+
+    def _message_points(self, message: Dict[str, Any]) -> List[str]:
+        """Key sentences of one message, cached so each turn is summarized once"""
+        text = message_text(self._compact_code(message))
+        key = hashlib.sha1(text.encode()).hexdigest()
+        with self._lock:
+            points = self._points.get(key)
+            if points is None:
+                points = _extract_points(text)
+                self._points[key] = points
+        return points
+
+    def _trim_points(self, points: List[str]) -> str:
+        # Keep the most recent points within the per-agent summary budget
+        kept: List[str] = []
+        used = 0
+        for point in reversed(points):
+            used += estimate_tokens(point)
+            if kept and used > self.summary_tokens:
+                break
+            kept.append(point)
+        return " ".join(reversed(kept))
+
+    def _compact_code(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        text = message_text(message)
+        if not self.max_code_lines or "```" not in text:
+            return message
+
+        def replace(match: re.Match) -> str:
+            language, code = match.group(1), match.group(2)
+            lines = code.count("\n")
+            if lines <= self.max_code_lines:
+                return match.group(0)
+            ref = hashlib.sha1(code.encode()).hexdigest()[:10]
+            with self._lock:
+                self.code_blocks[ref] = code
+            return f"[{language or 'code'} block {ref}: {lines} lines omitted]"
+
+        return {**message, "content": _CODE_BLOCK_PATTERN.sub(replace, text)}
+
+    def _fit_budget(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not self.max_tokens:
+            return messages
+        # Compact code in recent turns too, except the message being answered
+        if estimate_message_tokens(messages) > self.max_tokens:
+            messages = [self._compact_code(m) for m in messages[:-1]] + messages[-1:]
+        # Then cut messages down, oldest first and the task last, until it fits
+        for index in list(range(1, len(messages) - 1)) + [0]:
+            excess = estimate_message_tokens(messages) - self.max_tokens
+            if excess <= 0:
+                break
+            text = message_text(messages[index])
+            keep_chars = max(0, len(text) - excess * CHARS_PER_TOKEN)
+            messages[index] = {
+                **messages[index],
+                "content": _truncate(text, keep_chars),
+            }
+        return messages
+
+    def _record(self, count: int, before: int, after: int):
+        with self._lock:
+            self.rounds.append(
+                {
+                    "messages": count,
+                    "tokens_before": before,
+                    "tokens_after": after,
+                    "tokens_saved": before - after,
+                }
+            )
+        logger.info(
+            f"{self.name or 'Agent'} context compacted: {before} -> {after} tokens "
+            f"({before - after} saved)"
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rounds = list(self.rounds)
+        return {
+            "rounds": len(rounds),
+            "tokens_before": sum(r["tokens_before"] for r in rounds),
+            "tokens_after": sum(r["tokens_after"] for r in rounds),
+            "tokens_saved": sum(r["tokens_saved"] for r in rounds),
+            "tokens_saved_by_round": [r["tokens_saved"] for r in rounds],
+        }
+
+
+def _extract_points(text: str, max_points: int = 3) -> List[str]:
+    """Headings and first sentences of paragraphs, in order"""
+    points = []
+    for paragraph in re.split(r"\n\s*\n|\n(?=#|\s*[-*\d])", text):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        sentence = _SENTENCE_END.split(paragraph, 1)[0]
+        points.append(_truncate(sentence, 200))
+        if len(points) >= max_points:
+            break
+    return points
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    return text[: max(0, max_chars - 3)].rstrip() + "..."
+
+
+def transcript_compaction_enabled() -> bool:
+    """True when ``TRANSCRIPT_COMPACTION`` is on"""
+    value = os.getenv("TRANSCRIPT_COMPACTION", "off").lower()
+    return value in ("1", "on", "true", "yes")
+
+
+def compaction_settings() -> Dict[str, int]:
+    """``TranscriptCompactor`` arguments from the ``TRANSCRIPT_*`` environment variables"""
+    return {
+        "keep_last": int(os.getenv("TRANSCRIPT_KEEP_TURNS", "4")),
+        "max_tokens": int(os.getenv("TRANSCRIPT_TOKEN_BUDGET", "4000")),
+        "summary_tokens": int(os.getenv("TRANSCRIPT_SUMMARY_TOKENS", "150")),
+        "max_code_lines": int(os.getenv("TRANSCRIPT_MAX_CODE_LINES", "12")),
+    }
+
+
+_compactors = weakref.WeakKeyDictionary()
+
+
+def add_transcript_compaction(
+    agents: Sequence[Any], **kwargs
+) -> List[TranscriptCompactor]:
+    """
+    Compact the history each of ``agents`` sees before replying. Agents
+    without an LLM are skipped. Defaults come from ``compaction_settings``.
+    """
+    settings = {**compaction_settings(), **kwargs}
+    added = []
+    for agent in agents:
+        if not getattr(agent, "llm_config", None) or agent in _compactors:
+            continue
+        compactor = TranscriptCompactor(name=agent.name, **settings)
+        TransformMessages(transforms=[compactor], verbose=False).add_to_agent(agent)
+        _compactors[agent] = compactor
+        added.append(compactor)
+    return added
+
+
+def compaction_stats(agents: Sequence[Any]) -> Dict[str, Dict[str, Any]]:
+    """Per-agent ``TranscriptCompactor.stats()`` for agents with compaction"""
+    return {
+        agent.name: _compactors[agent].stats()
+        for agent in agents
+        if agent in _compactors
+    }
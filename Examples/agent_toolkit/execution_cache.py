@@ -0,0 +1,313 @@
+"""
+Cache of executed code blocks and the files they produced.
+
+Agents often send the same plotting or fetching code again after a retry,
+and the user proxy runs all of it again. ``ExecutionCache`` stores the exit
+code, the output and the files a successful Python block created or changed
+in its working directory, keyed by the block's normalized code (comments,
+blank lines and trailing whitespace don't count). A later run of the same
+code returns the stored result and writes the files back instead of running.
+
+A stored result is only used while it is still valid:
+
+- every file the code names that existed when it ran (its inputs) still has
+  the same content
+- no file the code names has appeared since, unless the block produced it
+- it is younger than ``CODE_CACHE_TTL_HOURS``, since code may fetch live data
+
+Failed and timed out runs, and shell blocks (package installs change the
+environment, not files), are never stored. ``CODE_CACHE_MAX_MB`` caps the
+SQLite file; the least recently used results go first.
+"""
+
+import os
+import re
+import time
+import pickle
+import sqlite3
+import hashlib
+import threading
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "code_results.sqlite")
+
+# Anything that looks like a file name: data.csv, out/chart.png, ./x.json
+_FILE_NAME = re.compile(r"[\w\-./]+\.\w+")
+_COMMENT = re.compile(r"^\s*#")
+_FILENAME_COMMENT = re.compile(r"^\s*#\s*filename\s*:", re.IGNORECASE)
+
+
+def normalize_code(code: str) -> str:
+    """Code without comments, blank lines and trailing whitespace"""
+    lines = []
+    for line in code.replace("\r\n", "\n").split("\n"):
+        line = line.rstrip()
+        # The filename comment decides where the code is saved, so it counts
+        if not line or (_COMMENT.match(line) and not _FILENAME_COMMENT.match(line)):
+            continue
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def code_key(language: str, code: str) -> str:
+    text = f"{language}\n{normalize_code(code)}"
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def file_digest(path: str) -> Optional[str]:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def snapshot(directory: str) -> Dict[str, Tuple[int, int]]:
+    """``relative path -> (size, mtime_ns)`` of the files below ``directory``"""
+    files = {}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files[os.path.relpath(path, directory)] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+def referenced_files(code: str, directory: str) -> List[str]:
+    """Paths relative to ``directory`` of the file names in ``code``"""
+    # The filename comment names the file the code itself is saved to,
+    # which the executor writes before running it
+    code = "\n".join(line for line in code.split("\n") if not _FILENAME_COMMENT.match(line))
+    paths = set()
+    for name in _FILE_NAME.findall(code):
+        path = os.path.normpath(os.path.join(directory, name))
+        paths.add(os.path.relpath(path, directory))
+    return sorted(paths)
+
+
+class ExecutionCache:
+    """
+    Results of code blocks in a SQLite file with size-based LRU eviction.
+    One instance is safe to share between threads and conversations.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        max_bytes: int = 256 * 2**20,
+        ttl_seconds: float = 24 * 3600,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)"
+        )
+        self._conn.commit()
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM results"
+        ).fetchone()[0]
+
+    def lookup(self, language: str, code: str, directory: str) -> Optional[Tuple[int, str]]:
+        """
+        ``(exit_code, output)`` of an earlier run of ``code`` that is still
+        valid in ``directory``, after restoring the files it produced there
+        """
+        key = code_key(language, code)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM results WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        entry = pickle.loads(row[0])
+        reason = self._invalid_reason(entry, row[1], code, directory)
+        if reason is not None:
+            logger.debug(f"Cached code result {key[:12]} is stale: {reason}")
+            with self._lock:
+                self.misses += 1
+                self.invalidations += 1
+                self._delete_locked(key)
+                self._conn.commit()
+            return None
+
+        for name, data in entry["outputs"].items():
+            path = os.path.join(directory, name)
+            if file_digest(path) != hashlib.sha256(data).hexdigest():
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(data)
+        with self._lock:
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+        return entry["exit_code"], entry["output"]
+
+    def _invalid_reason(
+        self, entry: Dict[str, Any], created: float, code: str, directory: str
+    ) -> Optional[str]:
+        if self.ttl_seconds and time.time() - created > self.ttl_seconds:
+            return "expired"
+        for name, digest in entry["inputs"].items():
+            if file_digest(os.path.join(directory, name)) != digest:
+                return f"{name} changed"
+        for name in referenced_files(code, directory):
+            if name in entry["inputs"] or name in entry["outputs"]:
+                continue
+            if os.path.exists(os.path.join(directory, name)):
+                return f"{name} appeared"
+        return None
+
+    def inputs(self, code: str, directory: str) -> Dict[str, str]:
+        """Digests of the existing files ``code`` names, taken before it runs"""
+        digests = {}
+        for name in referenced_files(code, directory):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                digests[name] = file_digest(path)
+        return digests
+
+    def store(
+        self,
+        language: str,
+        code: str,
+        directory: str,
+        inputs: Dict[str, str],
+        before: Dict[str, Tuple[int, int]],
+        exit_code: int,
+        output: str,
+        code_file: Optional[str] = None,
+    ):
+        """Store a run, given its ``inputs`` and the ``snapshot`` taken before"""
+        outputs = {}
+        size = len(output)
+        skip = os.path.relpath(code_file, directory) if code_file else None
+        for name, stat in snapshot(directory).items():
+            if name == skip or before.get(name) == stat:
+                continue
+            try:
+                with open(os.path.join(directory, name), "rb") as f:
+                    outputs[name] = f.read()
+            except OSError:
+                continue
+            size += len(outputs[name])
+            if size > self.max_bytes:
+                logger.debug(f"Not caching a code result of more than {self.max_bytes} bytes")
+                return
+        # A file that is read and rewritten is an output, not an input
+        inputs = {name: digest for name, digest in inputs.items() if name not in outputs}
+
+        key = code_key(language, code)
+        blob = pickle.dumps(
+            {"exit_code": exit_code, "output": output, "inputs": inputs, "outputs": outputs}
+        )
+        now = time.time()
+        with self._lock:
+            self._delete_locked(key)
+            self._conn.execute(
+                "INSERT INTO results (key, value, size, created, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now, now),
+            )
+            self._total_bytes += len(blob)
+            self._evict_locked()
+            self._conn.commit()
+
+    def _delete_locked(self, key: str):
+        row = self._conn.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            self._total_bytes -= row[0]
+
+    def _evict_locked(self):
+        if self._total_bytes <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT key, size FROM results ORDER BY last_access"
+        ).fetchall()
+        for key, size in rows:
+            if self._total_bytes <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            self._total_bytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM results")
+            self._conn.commit()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "entries": entries,
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_shared_caches: Dict[str, ExecutionCache] = {}
+_shared_lock = threading.Lock()
+
+
+def get_execution_cache(path: Optional[str] = None) -> Optional[ExecutionCache]:
+    """
+    Return the process-wide execution cache configured from the environment.
+
+    ``CODE_CACHE_PATH`` sets the SQLite file, ``CODE_CACHE_MAX_MB`` its size
+    and ``CODE_CACHE_TTL_HOURS`` how long results stay valid. The cache is
+    opt-in: code that fetches live data, like the data analyst's, would
+    replay stale output, so ``None`` is returned unless ``CODE_CACHE=on``.
+    """
+    if os.getenv("CODE_CACHE", "off").lower() not in ("1", "on", "true", "yes"):
+        return None
+
+    path = path or os.getenv("CODE_CACHE_PATH", DEFAULT_CACHE_PATH)
+    with _shared_lock:
+        if path not in _shared_caches:
+            _shared_caches[path] = ExecutionCache(
+                path,
+                max_bytes=int(float(os.getenv("CODE_CACHE_MAX_MB", "256")) * 2**20),
+                ttl_seconds=float(os.getenv("CODE_CACHE_TTL_HOURS", "24")) * 3600,
+            )
+            logger.info(f"Using code execution cache at {path}")
+        return _shared_caches[path]
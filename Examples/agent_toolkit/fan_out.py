@@ -0,0 +1,216 @@
+"""
+Fan-out/fan-in rounds for GroupChat.
+
+``FanOutGroupChatManager`` runs a group chat with ``GroupChatManager``'s own
+loop, except that after a speaker listed in ``fan_out`` all of that
+speaker's branch agents reply to the same transcript concurrently. The
+first branch is selected as the next speaker as usual; the replies of the
+others start at the same time and are picked up when the loop selects them
+in turn. Replies are appended and broadcast in the declared order, so the
+transcript is the same however they finish, and the speaker after a
+fan-out round is selected from its last declared branch. Every other round,
+termination, introductions and interrupts are left to ``GroupChatManager``.
+
+``a_initiate_chat`` runs the branches as asyncio tasks through the agents'
+async reply path; ``initiate_chat`` runs them on a thread pool.
+"""
+
+import os
+import asyncio
+import contextlib
+import contextvars
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from autogen import Agent, GroupChat, GroupChatManager
+
+logger = logging.getLogger(__name__)
+
+
+def manager_groupchats(manager: GroupChatManager) -> List[GroupChat]:
+    """
+    The GroupChat of ``manager`` and the copies of it that the manager
+    actually runs, made when its reply functions were registered
+    """
+    return [manager.groupchat] + [
+        entry[key]
+        for entry in manager._reply_func_list
+        for key in ("config", "init_config")
+        if isinstance(entry.get(key), GroupChat)
+    ]
+
+
+def fan_out_enabled() -> bool:
+    """True when ``GROUPCHAT_FAN_OUT`` is on"""
+    value = os.getenv("GROUPCHAT_FAN_OUT", "off").lower()
+    return value in ("1", "on", "true", "yes")
+
+
+class FanOutGroupChatManager(GroupChatManager):
+    """
+    ``GroupChatManager`` with concurrent fan-out rounds.
+
+    ``fan_out`` maps a speaker name to the names of the agents that answer
+    it in parallel, e.g. ``{"SolutionArchitect": ["TechnicalArchitect",
+    "ImplementationPlanner"]}``. Each branch reply counts as one round
+    towards ``max_round``.
+    """
+
+    def __init__(
+        self,
+        groupchat: GroupChat,
+        fan_out: Optional[Dict[str, Sequence[str]]] = None,
+        **kwargs,
+    ):
+        super().__init__(groupchat=groupchat, **kwargs)
+        self.fan_out = {k: list(v) for k, v in (fan_out or {}).items()}
+        # Replies of the branches started ahead of their turn, by agent name
+        self._branch_replies: Dict[str, Any] = {}
+        self._branch_reply_funcs = (self._started_reply, self._a_started_reply)
+        branch_names = {name for names in self.fan_out.values() for name in names}
+        for agent in groupchat.agents:
+            if agent.name in branch_names:
+                agent.register_reply(self, self._started_reply, position=0)
+                agent.register_reply(
+                    self, self._a_started_reply, position=0, ignore_async_in_sync_chat=True
+                )
+        self.replace_reply_func(
+            GroupChatManager.run_chat, FanOutGroupChatManager.run_fan_out_chat
+        )
+        self.replace_reply_func(
+            GroupChatManager.a_run_chat, FanOutGroupChatManager.a_run_fan_out_chat
+        )
+
+    def _branches(
+        self, last_speaker: Agent, groupchat: GroupChat, remaining: int
+    ) -> List[Agent]:
+        names = self.fan_out.get(last_speaker.name, [])
+        branches = [
+            groupchat.agent_by_name(name)
+            for name in names
+            if name in groupchat.agent_names and name != last_speaker.name
+        ]
+        # Do not generate replies that max_round would drop
+        return branches[:remaining]
+
+    def _started_reply(
+        self,
+        recipient: Agent,
+        messages: Optional[List[Dict[str, Any]]] = None,
+        sender: Optional[Agent] = None,
+        config: Any = None,
+    ) -> Tuple[bool, Any]:
+        started = self._branch_replies.pop(recipient.name, None)
+        if started is None:
+            return False, None
+        return True, started.result()
+
+    async def _a_started_reply(
+        self,
+        recipient: Agent,
+        messages: Optional[List[Dict[str, Any]]] = None,
+        sender: Optional[Agent] = None,
+        config: Any = None,
+    ) -> Tuple[bool, Any]:
+        started = self._branch_replies.pop(recipient.name, None)
+        if started is None:
+            return False, None
+        return True, await started
+
+    @contextlib.contextmanager
+    def _fan_out_rounds(
+        self, groupchat: GroupChat, start: Callable[[Agent], Any]
+    ) -> Iterator[None]:
+        """
+        Let ``groupchat``'s speaker selection answer fan-out speakers with
+        their branches, one per round, after ``start``-ing the replies of
+        all but the first
+        """
+        queued: List[Agent] = []
+        first_round = len(groupchat.messages)
+        select_speaker = groupchat.select_speaker
+        a_select_speaker = groupchat.a_select_speaker
+
+        def next_branch(last_speaker: Agent) -> Optional[Agent]:
+            if queued:
+                return queued.pop(0)
+            # The message of this round is already in the transcript
+            remaining = groupchat.max_round - (len(groupchat.messages) - first_round)
+            branches = self._branches(last_speaker, groupchat, remaining)
+            if not branches:
+                return None
+            logger.info(
+                f"Fan-out after {last_speaker.name}: "
+                f"{', '.join(a.name for a in branches)}"
+            )
+            for agent in branches[1:]:
+                self._branch_replies[agent.name] = start(agent)
+            queued.extend(branches[1:])
+            return branches[0]
+
+        def fan_out_select_speaker(last_speaker: Agent, selector: Any) -> Agent:
+            return next_branch(last_speaker) or select_speaker(last_speaker, selector)
+
+        async def fan_out_a_select_speaker(last_speaker: Agent, selector: Any) -> Agent:
+            return next_branch(last_speaker) or await a_select_speaker(last_speaker, selector)
+
+        groupchat.select_speaker = fan_out_select_speaker
+        groupchat.a_select_speaker = fan_out_a_select_speaker
+        try:
+            yield
+        finally:
+            groupchat.select_speaker = select_speaker
+            groupchat.a_select_speaker = a_select_speaker
+            # Branches the chat ended before
+            for name in list(self._branch_replies):
+                started = self._branch_replies.pop(name)
+                started.cancel()
+
+    def _branch_messages(self, agent: Agent) -> List[Dict[str, Any]]:
+        # The transcript as it stands; the first branch's reply is added to
+        # the agent's history while this one is still being generated
+        return list(agent.chat_messages[self])
+
+    def run_fan_out_chat(
+        self,
+        messages: Optional[List[Dict[str, Any]]] = None,
+        sender: Optional[Agent] = None,
+        config: Optional[GroupChat] = None,
+    ) -> Tuple[bool, Optional[str]]:
+        """``GroupChatManager.run_chat``, with fan-out branches on a thread pool"""
+        workers = max([len(v) - 1 for v in self.fan_out.values()] + [1])
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+
+            def start(agent: Agent) -> Future:
+                # Each thread gets a copy of the context, which carries autogen's IOStream
+                return pool.submit(
+                    contextvars.copy_context().run,
+                    agent.generate_reply,
+                    messages=self._branch_messages(agent),
+                    sender=self,
+                    exclude=self._branch_reply_funcs,
+                )
+
+            with self._fan_out_rounds(config, start):
+                return GroupChatManager.run_chat(self, messages, sender, config)
+
+    async def a_run_fan_out_chat(
+        self,
+        messages: Optional[List[Dict[str, Any]]] = None,
+        sender: Optional[Agent] = None,
+        config: Optional[GroupChat] = None,
+    ) -> Tuple[bool, Optional[str]]:
+        """``GroupChatManager.a_run_chat``, with fan-out branches as concurrent tasks"""
+
+        def start(agent: Agent) -> asyncio.Task:
+            return asyncio.ensure_future(
+                agent.a_generate_reply(
+                    messages=self._branch_messages(agent),
+                    sender=self,
+                    exclude=self._branch_reply_funcs,
+                )
+            )
+
+        with self._fan_out_rounds(config, start):
+            return await GroupChatManager.a_run_chat(self, messages, sender, config)
@@ -0,0 +1,305 @@
+"""
+Loop detection for group chats.
+
+A group chat only ends on a termination message or after ``max_round``.
+Agents that ping-pong near-identical messages, such as the tutorial lab's
+Evaluator asking for the same changes and saying CONTINUE every time, burn
+all the rounds that are left. ``add_loop_detection(manager)`` fingerprints
+every message of the manager's group chat as it is appended:
+
+- a SimHash of its word shingles, compared with the last ``window``
+  messages, finds near-duplicates (``repetition``)
+- the share of shingles never seen before in the chat finds messages that
+  only rephrase earlier ones (``no progress``)
+
+Each update costs the same however long the chat is. After ``patience``
+stale messages in a row, the policy decides: ``stop`` ends the chat,
+``redirect`` gives the next turn to an agent outside the loop (and stops
+after ``max_redirects``), and ``log`` only reports it. ``stats()`` gives
+the rounds saved and an estimate of the tokens they would have cost.
+"""
+
+import os
+import re
+import hashlib
+import logging
+import threading
+import weakref
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from autogen import Agent, GroupChat, GroupChatManager
+
+from .fan_out import manager_groupchats
+from .tokens import estimate_tokens, message_text
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ("stop", "redirect", "log")
+
+_WORD_PATTERN = re.compile(r"[a-z]+|\d+")
+
+
+def loop_detection_enabled() -> bool:
+    """True when ``LOOP_DETECTION`` is on"""
+    value = os.getenv("LOOP_DETECTION", "off").lower()
+    return value in ("1", "on", "true", "yes")
+
+
+def loop_detection_settings() -> Dict[str, Any]:
+    """``LoopDetector`` arguments from the ``LOOP_*`` environment variables"""
+    return {
+        "policy": os.getenv("LOOP_POLICY", "stop").lower(),
+        "window": int(os.getenv("LOOP_WINDOW", "6")),
+        "max_distance": int(os.getenv("LOOP_MAX_DISTANCE", "8")),
+        "min_novelty": float(os.getenv("LOOP_MIN_NOVELTY", "0.2")),
+        "patience": int(os.getenv("LOOP_PATIENCE", "2")),
+    }
+
+
+def shingles(text: str, size: int = 3) -> Set[int]:
+    """64-bit hashes of the word ``size``-grams of ``text``"""
+    # "Revision 3" and "revision 4" of the same text are the same message
+    words = [w if not w.isdigit() else "#" for w in _WORD_PATTERN.findall(text.lower())]
+    size = max(1, min(size, len(words)))
+    return {
+        int.from_bytes(
+            hashlib.blake2b(" ".join(words[i : i + size]).encode(), digest_size=8).digest(),
+            "big",
+        )
+        for i in range(len(words) - size + 1)
+    }
+
+
+def simhash(hashes: Iterable[int]) -> int:
+    """64-bit SimHash: similar shingle sets give fingerprints a few bits apart"""
+    weights = [0] * 64
+    for value in hashes:
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class LoopDetector:
+    """
+    Streaming near-duplicate and no-progress detector for one conversation.
+    Use ``add_loop_detection`` to attach one to a group chat manager.
+
+    - ``window``: number of recent messages a new one is compared with
+    - ``max_distance``: SimHash bits two near-duplicates may differ in
+    - ``min_novelty``: share of new shingles below which a message is stale
+    - ``patience``: stale messages in a row that make a loop
+    """
+
+    def __init__(
+        self,
+        policy: str = "stop",
+        window: int = 6,
+        max_distance: int = 8,
+        min_novelty: float = 0.2,
+        patience: int = 2,
+        max_redirects: int = 2,
+        shingle_size: int = 3,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown loop policy {policy!r}, expected one of {POLICIES}")
+        self.policy = policy
+        self.max_distance = max_distance
+        self.min_novelty = min_novelty
+        self.patience = max(1, patience)
+        self.max_redirects = max_redirects
+        self.shingle_size = shingle_size
+        self.messages = 0
+        self.tokens = 0
+        self.redirects = 0
+        self.detections: List[Dict[str, Any]] = []
+        self.stopped: Optional[Dict[str, Any]] = None
+        self._recent: deque = deque(maxlen=max(1, window))
+        self._seen: Set[int] = set()
+        self._stale: List[Dict[str, Any]] = []
+        self._blocked: Set[str] = set()
+        self._last_message: Optional[Dict[str, Any]] = None
+        self._last_verdict: Optional[str] = None
+        self._groupchat: Optional[GroupChat] = None
+        self._max_round: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def observe(self, message: Dict[str, Any]) -> Optional[str]:
+        """
+        Fingerprint ``message`` and return the reason when the chat should
+        stop because of it. Observing the same message object again returns
+        the same answer without counting it twice.
+        """
+        with self._lock:
+            if message is self._last_message:
+                return self._last_verdict
+            self._last_message = message
+            self._last_verdict = self._update(message)
+            return self._last_verdict
+
+    def _update(self, message: Dict[str, Any]) -> Optional[str]:
+        text = message_text(message).strip()
+        # Tool calls and empty auto-replies neither make nor break a loop
+        if not text or self.stopped:
+            return None
+        self.messages += 1
+        self.tokens += estimate_tokens(text)
+        speaker = message.get("name") or message.get("role", "unknown")
+
+        hashes = shingles(text, self.shingle_size)
+        fingerprint = simhash(hashes)
+        repeated = any(
+            hamming(fingerprint, previous) <= self.max_distance for previous in self._recent
+        )
+        novelty = len(hashes - self._seen) / len(hashes) if hashes else 0.0
+        self._recent.append(fingerprint)
+        self._seen |= hashes
+
+        if not repeated and (self.messages == 1 or novelty >= self.min_novelty):
+            self._stale = []
+            return None
+        self._stale.append({"speaker": speaker, "repeated": repeated})
+        if len(self._stale) < self.patience:
+            return None
+
+        detection = {
+            "message": self.messages,
+            "reason": "repetition" if any(s["repeated"] for s in self._stale) else "no progress",
+            "speakers": sorted({s["speaker"] for s in self._stale}),
+        }
+        self.detections.append(detection)
+        self._stale = []
+        if self.policy == "log":
+            logger.warning(f"Loop detected ({detection['reason']}) among {detection['speakers']}")
+            return None
+        if self.policy == "redirect" and self.redirects < self.max_redirects:
+            self.redirects += 1
+            self._blocked = set(detection["speakers"])
+            logger.warning(
+                f"Loop detected ({detection['reason']}) among {detection['speakers']}; "
+                f"the next turn goes to another agent"
+            )
+            return None
+
+        self.stopped = detection
+        # The message is observed before it is appended
+        left = (
+            f", {self._max_round - len(self._groupchat.messages) - 1} of "
+            f"{self._max_round} rounds left"
+            if self._groupchat is not None
+            else ""
+        )
+        logger.warning(
+            f"Loop detected ({detection['reason']}) among {detection['speakers']}; "
+            f"stopping the chat{left}"
+        )
+        return detection["reason"]
+
+    def attach(self, manager: GroupChatManager) -> "LoopDetector":
+        """
+        Observe every message of ``manager``'s group chat and let the policy
+        end it or pick the next speaker. Attach before a checkpoint is
+        restored, so the rounds saved are counted against the full chat.
+        """
+        self._groupchat = manager.groupchat
+        self._max_round = manager.groupchat.max_round
+
+        # Both GroupChatManager and FanOutGroupChatManager check every
+        # message for termination once, before or after appending it
+        is_termination_msg = manager._is_termination_msg
+
+        def guarded_is_termination_msg(message: Dict[str, Any]) -> bool:
+            if is_termination_msg(message):
+                return True
+            return self.observe(message) is not None
+
+        manager._is_termination_msg = guarded_is_termination_msg
+        for groupchat in manager_groupchats(manager):
+            self._wrap(groupchat)
+        return self
+
+    def _wrap(self, groupchat: GroupChat):
+        if getattr(groupchat, "_loop_guarded", False):
+            return
+        groupchat._loop_guarded = True
+        append = groupchat.append
+        select_speaker = groupchat.select_speaker
+        a_select_speaker = groupchat.a_select_speaker
+
+        def guarded_append(message: Dict[str, Any], speaker: Agent):
+            self.observe(message)
+            append(message, speaker)
+
+        def guarded_select_speaker(last_speaker: Agent, selector: Any) -> Agent:
+            return self._redirect(select_speaker(last_speaker, selector), groupchat)
+
+        async def guarded_a_select_speaker(last_speaker: Agent, selector: Any) -> Agent:
+            return self._redirect(await a_select_speaker(last_speaker, selector), groupchat)
+
+        groupchat.append = guarded_append
+        groupchat.select_speaker = guarded_select_speaker
+        groupchat.a_select_speaker = guarded_a_select_speaker
+
+    def _redirect(self, speaker: Agent, groupchat: GroupChat) -> Agent:
+        with self._lock:
+            blocked, self._blocked = self._blocked, set()
+        if speaker.name not in blocked:
+            return speaker
+        candidates = [a for a in groupchat.agents if a.name not in blocked]
+        if not candidates:
+            return speaker
+        # Agents with a model before the user proxy, then whoever spoke least recently
+        last_turn = {m.get("name"): i for i, m in enumerate(groupchat.messages)}
+        chosen = min(
+            candidates,
+            key=lambda a: (not getattr(a, "llm_config", None), last_turn.get(a.name, -1)),
+        )
+        logger.info(f"Loop detection: {chosen.name} speaks instead of {speaker.name}")
+        return chosen
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rounds = len(self._groupchat.messages) if self._groupchat else self.messages
+            saved = (
+                max(0, self._max_round - rounds)
+                if self.stopped and self._max_round is not None
+                else 0
+            )
+            per_message = self.tokens / self.messages if self.messages else 0
+            # Each skipped round would have resent the transcript and added a reply
+            tokens_saved = saved * self.tokens + per_message * saved * (saved + 1) / 2
+            return {
+                "policy": self.policy,
+                "messages": self.messages,
+                "detections": list(self.detections),
+                "redirects": self.redirects,
+                "stopped": self.stopped is not None,
+                "rounds": rounds,
+                "rounds_saved": saved,
+                "tokens_saved_estimate": round(tokens_saved),
+            }
+
+
+_detectors = weakref.WeakKeyDictionary()
+
+
+def add_loop_detection(manager: GroupChatManager, **kwargs) -> LoopDetector:
+    """
+    Detect loops in ``manager``'s group chat. Defaults come from
+    ``loop_detection_settings``.
+    """
+    if manager in _detectors:
+        return _detectors[manager]
+    detector = LoopDetector(**{**loop_detection_settings(), **kwargs}).attach(manager)
+    _detectors[manager] = detector
+    return detector
+
+
+def loop_detection_stats(manager: GroupChatManager) -> Optional[Dict[str, Any]]:
+    """``LoopDetector.stats()`` of ``manager``'s group chat, if it has a detector"""
+    detector = _detectors.get(manager)
+    return detector.stats() if detector else None
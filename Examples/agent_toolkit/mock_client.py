@@ -0,0 +1,337 @@
+"""
+Offline stand-in for the Azure OpenAI deployment.
+
+Select it with a config_list entry using ``"model_client_cls": "MockModelClient"``
+(see ``mock_config_list``) and register it on the agents with
+``register_mock_client``. Responses are scripted or rule based, and latency,
+throughput and error rate are simulated, so the examples and benchmarks run
+without network access.
+"""
+
+import os
+import re
+import time
+import random
+import hashlib
+import threading
+import weakref
+import logging
+from collections import deque
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from autogen.oai.oai_models import (
+    ChatCompletion,
+    ChatCompletionMessage,
+    Choice,
+    CompletionUsage,
+)
+
+from autogen.events.client_events import StreamEvent
+from autogen.io import IOStream
+
+from .tokens import estimate_tokens, estimate_message_tokens, message_text
+
+logger = logging.getLogger(__name__)
+
+MOCK_MODEL_CLIENT = "MockModelClient"
+
+_FILLER_WORDS = (
+    "architecture service data secure scalable pipeline storage compliance "
+    "analytics cluster gateway identity monitoring deployment cost latency "
+    "region backup encryption workflow api model plan risk milestone"
+).split()
+
+_SELECT_SPEAKER_PATTERN = re.compile(r"select the next role from (\[.*?\])", re.S)
+
+
+class MockModelError(RuntimeError):
+    """Simulated transient model failure"""
+
+
+class MockRateLimitError(MockModelError):
+    """Simulated ``429``, raised when the mock deployment's ``rpm`` is exceeded"""
+
+    status_code = 429
+
+
+class MockModelClient:
+    """
+    autogen ``ModelClient`` that fakes chat completions locally.
+
+    Settings are passed as keyword arguments to ``register_model_client`` and
+    default to the ``MOCK_LLM_*`` environment variables:
+
+    - ``responses``: scripted replies, returned in order and then cycled
+    - ``rules``: ``(regex, reply)`` pairs matched against the last message
+    - ``ttft``: simulated time to first token in seconds
+    - ``tokens_per_second``: simulated generation speed (0 = instant)
+    - ``error_rate``: probability that a call raises ``MockModelError``
+    - ``rpm``: requests per minute the simulated deployment accepts from all
+      mock clients together before raising ``MockRateLimitError`` (0 = no limit)
+    - ``reply_tokens``: length of generated filler replies
+    - ``terminate_after``: append ``TERMINATE`` after this many replies
+    - ``seed``: seed for errors and filler text, so runs are reproducible
+
+    With ``"stream": True`` in the llm_config, replies are sent word by word
+    to autogen's ``IOStream`` after ``ttft``, like the OpenAI client does.
+
+    Group chat speaker-selection prompts are answered with the agent that
+    follows the last speaker in the offered list (round robin).
+    """
+
+    _stats_lock = threading.Lock()
+    _stats = {
+        "calls": 0,
+        "errors": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "simulated_seconds": 0.0,
+        "rate_limited": 0,
+    }
+    # Start times of the calls in the last minute, shared like a real deployment
+    _recent_calls = deque()
+
+    def __init__(
+        self,
+        config: Dict[str, Any],
+        responses: Optional[Sequence[str]] = None,
+        rules: Optional[Sequence[Tuple[str, str]]] = None,
+        ttft: Optional[float] = None,
+        tokens_per_second: Optional[float] = None,
+        error_rate: Optional[float] = None,
+        rpm: Optional[float] = None,
+        reply_tokens: Optional[int] = None,
+        terminate_after: Optional[int] = None,
+        seed: Optional[int] = None,
+        **kwargs,
+    ):
+        self.model = config.get("model", "mock")
+        self.responses = list(responses or [])
+        self.rules = [(re.compile(p, re.I), reply) for p, reply in rules or []]
+        self.ttft = _setting(ttft, "MOCK_LLM_TTFT", 0.0, float)
+        self.tokens_per_second = _setting(
+            tokens_per_second, "MOCK_LLM_TOKENS_PER_SECOND", 0.0, float
+        )
+        self.error_rate = _setting(error_rate, "MOCK_LLM_ERROR_RATE", 0.0, float)
+        self.rpm = _setting(rpm, "MOCK_LLM_RPM", 0.0, float)
+        self.reply_tokens = _setting(reply_tokens, "MOCK_LLM_REPLY_TOKENS", 64, int)
+        self.terminate_after = _setting(
+            terminate_after, "MOCK_LLM_TERMINATE_AFTER", 0, int
+        )
+        self.seed = _setting(seed, "MOCK_LLM_SEED", 0, int)
+        self._rng = random.Random(self.seed)
+        self._replies = 0
+        self._lock = threading.Lock()
+
+    def create(self, params: Dict[str, Any]) -> ChatCompletion:
+        if self.rpm and not self._admit(self.rpm):
+            raise MockRateLimitError("Simulated rate limit exceeded")
+        messages = params.get("messages", [])
+        prompt_tokens = estimate_message_tokens(messages)
+
+        with self._lock:
+            failed = self.error_rate and self._rng.random() < self.error_rate
+            content = self._respond(messages)
+
+        completion_tokens = estimate_tokens(content)
+        delay = self.ttft
+        if self.tokens_per_second > 0:
+            delay += completion_tokens / self.tokens_per_second
+
+        self._record(prompt_tokens, completion_tokens, delay, failed)
+        if failed:
+            time.sleep(delay)
+            raise MockModelError("Simulated model error")
+        if params.get("stream"):
+            self._stream(content, delay)
+        elif delay:
+            time.sleep(delay)
+
+        message = ChatCompletionMessage(
+            role="assistant", content=content, function_call=None, tool_calls=None
+        )
+        return ChatCompletion(
+            id=f"mock-{hashlib.sha1(content.encode()).hexdigest()[:12]}",
+            model=self.model,
+            created=int(time.time()),
+            object="chat.completion",
+            choices=[Choice(finish_reason="stop", index=0, message=message)],
+            usage=CompletionUsage(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens,
+            ),
+            cost=0,
+        )
+
+    def _stream(self, content: str, delay: float):
+        """Send ``content`` word by word as autogen ``StreamEvent``s, like a streaming API"""
+        iostream = IOStream.get_default()
+        chunks = re.findall(r"\S+\s*", content) or [content]
+        time.sleep(self.ttft)
+        per_chunk = (delay - self.ttft) / len(chunks)
+        for chunk in chunks:
+            iostream.send(StreamEvent(content=chunk))
+            if per_chunk > 0:
+                time.sleep(per_chunk)
+
+    def _respond(self, messages: List[Dict[str, Any]]) -> str:
+        last = message_text(messages[-1]) if messages else ""
+
+        selection = self._select_speaker(messages)
+        if selection is not None:
+            return selection
+
+        for pattern, reply in self.rules:
+            if pattern.search(last):
+                return self._finish_reply(reply)
+
+        if self.responses:
+            reply = self.responses[self._replies % len(self.responses)]
+            return self._finish_reply(reply)
+
+        # Filler text derived from the prompt, so equal prompts give equal replies
+        digest = hashlib.sha256(f"{self.seed}:{last}".encode()).digest()
+        words = [
+            _FILLER_WORDS[digest[i % len(digest)] % len(_FILLER_WORDS)]
+            for i in range(self.reply_tokens)
+        ]
+        return self._finish_reply(f"Mock reply {self._replies + 1}: {' '.join(words)}")
+
+    def _finish_reply(self, reply: str) -> str:
+        self._replies += 1
+        if self.terminate_after and self._replies >= self.terminate_after:
+            reply = f"{reply}\nTERMINATE"
+        return reply
+
+    def _select_speaker(self, messages: List[Dict[str, Any]]) -> Optional[str]:
+        names = None
+        for message in reversed(messages):
+            match = _SELECT_SPEAKER_PATTERN.search(message_text(message))
+            if match:
+                names = re.findall(r"'([^']+)'", match.group(1))
+                break
+        if not names:
+            return None
+
+        # GroupChat builds a fresh selector every round, so rotate based on
+        # the last speaker in the transcript rather than on client state
+        for message in reversed(messages):
+            if message.get("name") in names:
+                return names[(names.index(message["name"]) + 1) % len(names)]
+        return names[0]
+
+    @classmethod
+    def _admit(cls, rpm: float) -> bool:
+        now = time.monotonic()
+        with cls._stats_lock:
+            while cls._recent_calls and now - cls._recent_calls[0] > 60:
+                cls._recent_calls.popleft()
+            if len(cls._recent_calls) >= rpm:
+                cls._stats["rate_limited"] += 1
+                return False
+            cls._recent_calls.append(now)
+            return True
+
+    @classmethod
+    def _record(cls, prompt_tokens, completion_tokens, delay, failed):
+        with cls._stats_lock:
+            cls._stats["calls"] += 1
+            cls._stats["errors"] += int(bool(failed))
+            cls._stats["prompt_tokens"] += prompt_tokens
+            cls._stats["completion_tokens"] += completion_tokens
+            cls._stats["simulated_seconds"] += delay
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        """Token counts and simulated latency over all mock clients in this process"""
+        with cls._stats_lock:
+            return dict(cls._stats)
+
+    @classmethod
+    def reset_stats(cls):
+        with cls._stats_lock:
+            for key in cls._stats:
+                cls._stats[key] = 0
+            cls._recent_calls.clear()
+
+    def message_retrieval(self, response: ChatCompletion) -> List[Any]:
+        return [choice.message for choice in response.choices]
+
+    def cost(self, response: ChatCompletion) -> float:
+        return response.cost
+
+    @staticmethod
+    def get_usage(response: ChatCompletion) -> Dict[str, Any]:
+        return {
+            "prompt_tokens": response.usage.prompt_tokens,
+            "completion_tokens": response.usage.completion_tokens,
+            "total_tokens": response.usage.total_tokens,
+            "cost": response.cost,
+            "model": response.model,
+        }
+
+
+def _setting(value, env_var, default, cast):
+    if value is not None:
+        return cast(value)
+    return cast(os.getenv(env_var, default))
+
+
+def use_mock_backend() -> bool:
+    """True when ``LLM_BACKEND=mock`` selects the offline backend"""
+    return os.getenv("LLM_BACKEND", "azure").lower() == "mock"
+
+
+def mock_config_list(model: str = "mock-gpt-4o") -> List[Dict[str, Any]]:
+    """config_list that routes every request to ``MockModelClient``"""
+    return [{"model": model, "model_client_cls": MOCK_MODEL_CLIENT}]
+
+
+def uses_mock_client(llm_config: Any) -> bool:
+    if not llm_config:
+        return False
+    config_list = llm_config.get("config_list", [llm_config])
+    return any(
+        config.get("model_client_cls") == MOCK_MODEL_CLIENT for config in config_list
+    )
+
+
+_registered_agents = weakref.WeakSet()
+
+
+def register_mock_client(agents: Sequence[Any], **kwargs):
+    """
+    Activate ``MockModelClient`` on every agent whose config_list selects it.
+
+    Agents configured for a real model, or already registered, are left
+    untouched, so this is safe to call unconditionally. Include the
+    ``GroupChatManager`` in ``agents``.
+    """
+    for agent in agents:
+        if agent in _registered_agents:
+            continue
+        if uses_mock_client(getattr(agent, "llm_config", None)):
+            agent.register_model_client(MockModelClient, **kwargs)
+            _registered_agents.add(agent)
+
+
+def mock_groupchat_kwargs(config_list: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Extra ``GroupChat`` arguments so that "auto" speaker selection also uses
+    the mock. Returns an empty dict for real deployments.
+
+    GroupChatManager keeps its own copy of the GroupChat, so these must be
+    passed to the constructor rather than set afterwards.
+    """
+    mock_configs = [
+        mock_config_list(config.get("model"))[0]
+        for config in config_list
+        if config.get("model_client_cls") == MOCK_MODEL_CLIENT
+    ]
+    if not mock_configs:
+        return {}
+    return {
+        "select_speaker_auto_llm_config": {"config_list": mock_configs},
+        "select_speaker_auto_model_client_cls": MockModelClient,
+    }
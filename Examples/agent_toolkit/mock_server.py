@@ -0,0 +1,226 @@
+"""
+Local stand-in for Azure OpenAI deployments, served over HTTP.
+
+``MockModelClient`` replaces the OpenAI client inside the process; this
+server replaces the deployment instead, so the real client, retries and
+``DeploymentRouter`` failover run unchanged. Each server acts as one
+deployment with its own latency, error rate and quota:
+
+    python -m agent_toolkit.mock_server --port 8001 --ttft 0.2
+    python -m agent_toolkit.mock_server --port 8002 --ttft 1.0 --error-rate 0.2
+
+and point ``AZURE_OPENAI_DEPLOYMENTS`` at ``http://127.0.0.1:8001/`` and
+``http://127.0.0.1:8002/``. Both Azure (``/openai/deployments/<model>/...``)
+and OpenAI (``/v1/chat/completions``) paths are answered, streamed or not.
+"""
+
+import re
+import json
+import time
+import argparse
+import threading
+import logging
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+from autogen.events.client_events import StreamEvent
+from autogen.io import IOStream
+
+from .mock_client import MockModelClient, MockModelError
+
+logger = logging.getLogger(__name__)
+
+_COMPLETIONS_PATH = re.compile(
+    r"^/(?:openai/deployments/(?P<deployment>[^/]+)|v1)/chat/completions$"
+)
+
+
+class _ChunkWriter:
+    """``IOStream`` that writes the mock client's ``StreamEvent``s as SSE chunks"""
+
+    def __init__(self, handler: "_CompletionsHandler", model: str):
+        self.handler = handler
+        self.model = model
+
+    def print(self, *objects: Any, sep: str = " ", end: str = "\n", flush: bool = False):
+        pass
+
+    def send(self, message: Any):
+        if isinstance(message, StreamEvent):
+            self.handler.send_chunk(self.model, {"content": message.content.content})
+
+    def input(self, prompt: str = "", *, password: bool = False) -> str:
+        return ""
+
+
+class _CompletionsHandler(BaseHTTPRequestHandler):
+    server: "_DeploymentHTTPServer"
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        match = _COMPLETIONS_PATH.match(self.path.split("?", 1)[0])
+        if match is None:
+            self.send_json(404, {"error": {"message": f"No route for {self.path}"}})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        params = json.loads(self.rfile.read(length) or b"{}")
+        model = match.group("deployment") or params.get("model", "mock")
+
+        if not self.server.admit():
+            self.send_json(
+                429,
+                {"error": {"code": "429", "message": "Simulated rate limit exceeded"}},
+                headers={"retry-after": "1"},
+            )
+            return
+
+        if not params.get("stream"):
+            try:
+                response = self.server.client.create(params)
+            except MockModelError as e:
+                self.send_json(500, {"error": {"message": str(e)}})
+                return
+            self.send_json(200, {**response.model_dump(exclude={"cost"}), "model": model})
+            return
+
+        # Headers go out with the first chunk, so errors can still be a 500
+        self.stream_started = False
+        try:
+            with IOStream.set_default(_ChunkWriter(self, model)):
+                response = self.server.client.create(params)
+        except MockModelError as e:
+            if not self.stream_started:
+                self.send_json(500, {"error": {"message": str(e)}})
+                return
+            raise
+        if not self.stream_started:
+            self.send_chunk(model, {"content": response.choices[0].message.content})
+        self.send_chunk(model, {}, finish_reason="stop")
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+    def send_chunk(self, model: str, delta: Dict[str, Any], finish_reason=None):
+        if not self.stream_started:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.stream_started = True
+            delta = {"role": "assistant", **delta}
+        chunk = {
+            "id": "mock-stream",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        self.wfile.flush()
+
+    def send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+class _DeploymentHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, client: MockModelClient, rpm: float):
+        super().__init__(address, _CompletionsHandler)
+        self.client = client
+        self.rpm = rpm
+        self._recent_calls = deque()
+        self._lock = threading.Lock()
+
+    def admit(self) -> bool:
+        # Quota of this deployment only, unlike MockModelClient's shared one
+        if not self.rpm:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            while self._recent_calls and now - self._recent_calls[0] > 60:
+                self._recent_calls.popleft()
+            if len(self._recent_calls) >= self.rpm:
+                return False
+            self._recent_calls.append(now)
+            return True
+
+
+class MockDeploymentServer:
+    """
+    One simulated deployment on ``http://host:port/`` (``port=0`` picks a
+    free port). ``rpm`` is this deployment's quota; the other keyword
+    arguments are ``MockModelClient`` settings such as ``ttft``,
+    ``tokens_per_second``, ``error_rate`` and ``responses``.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, rpm: float = 0, **settings):
+        client = MockModelClient({"model": "mock-deployment"}, rpm=0, **settings)
+        self.httpd = _DeploymentHTTPServer((host, port), client, rpm)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self) -> "MockDeploymentServer":
+        self._thread = threading.Thread(
+            target=self.httpd.serve_forever, name=f"mock-deployment-{self.url}", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "MockDeploymentServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a simulated Azure OpenAI deployment")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--ttft", type=float, default=None, help="seconds to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=None)
+    parser.add_argument("--error-rate", type=float, default=None, help="share of 500 responses")
+    parser.add_argument("--rpm", type=float, default=0, help="requests per minute before 429")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = MockDeploymentServer(
+        args.host,
+        args.port,
+        rpm=args.rpm,
+        ttft=args.ttft,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+    )
+    logger.info(f"Mock deployment listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+"""
+Incremental notebook assembly for group chats that write tutorials.
+
+Without it a builder agent re-reads every markdown and code message and
+writes nbformat code that rebuilds the whole notebook on each revision.
+``NotebookAssembler`` keeps the notebook as chapters of cells instead and
+updates it as the messages arrive:
+
+- the planner's ``Chapter <n>: <title>`` lines create the chapters
+- each ``## Chapter <n>: <title>`` section of a markdown writer's message
+  replaces that chapter's markdown cells
+- code after a ``# Chapter <n>`` comment in a code writer's message
+  replaces that chapter's code cells; ``# %%`` lines split it into cells
+
+After every change the notebook is written to disk atomically, so readers
+never see a half-written file. Content without a chapter marker is kept as
+a pending message. ``register_notebook_tools`` gives the builder agent
+small structural operations (outline, rename, move, remove, place a pending
+message) in place of generating the notebook itself.
+"""
+
+import os
+import re
+import time
+import tempfile
+import logging
+from dataclasses import dataclass, field
+from typing import Annotated, Any, Dict, List, Optional, Sequence, Tuple
+
+import nbformat
+from autogen import GroupChat, register_function
+
+from .fan_out import manager_groupchats
+
+logger = logging.getLogger(__name__)
+
+_PLAN_LINE = re.compile(
+    r"^[\s>*#-]*(?:\d+[.)]\s*)?\**Chapter\s+(\d+)\**\s*[:.)\-–—]\s*\**(.+?)\**\s*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+_CHAPTER_HEADING = re.compile(
+    r"^#{1,4}\s*\**Chapter\s+(\d+)\**\s*(?:[:.)\-–—]\s*\**(.*?)\**)?\s*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+_CHAPTER_COMMENT = re.compile(
+    r"^#\s*Chapter\s+(\d+)\b\s*(?:[:.)\-–—]\s*(.*?))?\s*$", re.IGNORECASE | re.MULTILINE
+)
+_CELL_MARKER = re.compile(r"^#\s*%%.*$", re.MULTILINE)
+_CODE_BLOCK = re.compile(r"```[ \t]*(\w*)[^\n]*\n(.*?)```", re.DOTALL)
+
+
+@dataclass
+class Chapter:
+    chapter_id: str
+    title: str = ""
+    markdown: List[str] = field(default_factory=list)
+    code: List[str] = field(default_factory=list)
+
+
+def _split_sections(pattern: re.Pattern, text: str) -> Tuple[str, List[Tuple[str, str, str]]]:
+    """Text before the first match and ``(chapter_id, title, body)`` per match"""
+    matches = list(pattern.finditer(text))
+    if not matches:
+        return text, []
+    sections = []
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        sections.append(
+            (match.group(1), (match.group(2) or "").strip(), text[match.end() : end].strip())
+        )
+    return text[: matches[0].start()], sections
+
+
+def _code_cells(code: str) -> List[str]:
+    cells = [cell.strip("\n") for cell in _CELL_MARKER.split(code)]
+    return [cell for cell in cells if cell.strip()]
+
+
+class NotebookAssembler:
+    """
+    Notebook at ``path`` assembled chapter by chapter from the messages of
+    ``outline_from`` (chapter list), ``markdown_from`` (explanations) and
+    ``code_from`` (code) agents. Starts empty; ``load()`` continues with a
+    notebook this class wrote before, e.g. when resuming a conversation.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        title: Optional[str] = None,
+        outline_from: Sequence[str] = ("TaskPlanner",),
+        markdown_from: Sequence[str] = ("ContentExpert",),
+        code_from: Sequence[str] = ("CodeDeveloper",),
+    ):
+        self.path = path
+        self.title = title
+        self.outline_from = set(outline_from)
+        self.markdown_from = set(markdown_from)
+        self.code_from = set(code_from)
+        self.chapters: List[Chapter] = []
+        # Content without a chapter marker, until the builder places it
+        self.pending: List[Dict[str, Any]] = []
+        self._next_pending_id = 1
+        self.writes = 0
+        self.write_seconds = 0.0
+
+    def chapter(self, chapter_id: str, create: bool = False) -> Optional[Chapter]:
+        chapter_id = str(chapter_id).strip()
+        for chapter in self.chapters:
+            if chapter.chapter_id == chapter_id:
+                return chapter
+        if not create:
+            return None
+        chapter = Chapter(chapter_id)
+        # Numbered chapters keep their order, whatever order they arrive in
+        position = len(self.chapters)
+        if chapter_id.isdigit():
+            for i, other in enumerate(self.chapters):
+                if other.chapter_id.isdigit() and int(other.chapter_id) > int(chapter_id):
+                    position = i
+                    break
+        self.chapters.insert(position, chapter)
+        return chapter
+
+    def add_message(self, sender: str, content: Any) -> List[str]:
+        """
+        Apply an agent's message to the notebook and save it if anything
+        changed. Returns the ids of the chapters it changed.
+        """
+        if not isinstance(content, str) or not content.strip():
+            return []
+        changed: List[str] = []
+        if sender in self.outline_from:
+            changed += self._apply_outline(content)
+        if sender in self.markdown_from:
+            changed += self._apply_markdown(sender, content)
+        if sender in self.code_from:
+            changed += self._apply_code(sender, content)
+        if changed:
+            self.save()
+            logger.info(f"Notebook {self.path}: updated chapters {', '.join(changed)}")
+        return changed
+
+    def _apply_outline(self, content: str) -> List[str]:
+        changed = []
+        for chapter_id, title in _PLAN_LINE.findall(content):
+            chapter = self.chapter(chapter_id, create=True)
+            if not chapter.title:
+                chapter.title = title.replace("**", "").strip()
+                changed.append(chapter.chapter_id)
+        return changed
+
+    def _apply_markdown(self, sender: str, content: str) -> List[str]:
+        preamble, sections = _split_sections(_CHAPTER_HEADING, content)
+        if not sections:
+            self._add_pending(sender, "markdown", [content.strip()])
+            return ["pending"]
+        changed = []
+        for chapter_id, title, body in sections:
+            chapter = self.chapter(chapter_id, create=True)
+            if title:
+                chapter.title = title
+            chapter.markdown = [body] if body else []
+            changed.append(chapter.chapter_id)
+        if preamble.strip():
+            logger.debug(f"Dropped {len(preamble)} chars before the first chapter of {sender}")
+        return changed
+
+    def _apply_code(self, sender: str, content: str) -> List[str]:
+        blocks = [
+            code
+            for language, code in _CODE_BLOCK.findall(content)
+            if language.lower() in ("", "python", "py")
+        ]
+        if not blocks and "```" not in content:
+            # Told to return plain Python without markdown
+            blocks = [content]
+        cells: Dict[str, List[str]] = {}
+        titles: Dict[str, str] = {}
+        unplaced: List[str] = []
+        current = None
+        for block in blocks:
+            preamble, sections = _split_sections(_CHAPTER_COMMENT, block)
+            # Code before the first marker of a block continues the last chapter
+            if current is not None:
+                cells[current] += _code_cells(preamble)
+            else:
+                unplaced += _code_cells(preamble)
+            for chapter_id, title, body in sections:
+                current = chapter_id
+                cells.setdefault(chapter_id, []).extend(_code_cells(body))
+                if title:
+                    titles[chapter_id] = title
+        if unplaced:
+            self._add_pending(sender, "code", unplaced)
+        changed = ["pending"] if unplaced else []
+        for chapter_id, code in cells.items():
+            chapter = self.chapter(chapter_id, create=True)
+            chapter.code = code
+            if not chapter.title and chapter_id in titles:
+                chapter.title = titles[chapter_id]
+            changed.append(chapter.chapter_id)
+        return changed
+
+    def _add_pending(self, sender: str, kind: str, cells: List[str]):
+        self.pending.append(
+            {"id": self._next_pending_id, "sender": sender, "kind": kind, "cells": cells}
+        )
+        self._next_pending_id += 1
+
+    def place_pending(self, pending_id: int, chapter_id: str) -> Chapter:
+        """Make pending message ``pending_id`` the markdown or code of a chapter"""
+        for i, message in enumerate(self.pending):
+            if message["id"] == int(pending_id):
+                break
+        else:
+            raise KeyError(f"No pending message {pending_id}")
+        message = self.pending.pop(i)
+        chapter = self.chapter(chapter_id, create=True)
+        setattr(chapter, message["kind"], list(message["cells"]))
+        return chapter
+
+    def move_chapter(self, chapter_id: str, position: int) -> Chapter:
+        """Move a chapter to ``position``, counted from 1"""
+        chapter = self.chapter(chapter_id)
+        if chapter is None:
+            raise KeyError(f"No chapter {chapter_id}")
+        self.chapters.remove(chapter)
+        self.chapters.insert(max(0, min(int(position) - 1, len(self.chapters))), chapter)
+        return chapter
+
+    def remove_chapter(self, chapter_id: str) -> Chapter:
+        chapter = self.chapter(chapter_id)
+        if chapter is None:
+            raise KeyError(f"No chapter {chapter_id}")
+        self.chapters.remove(chapter)
+        return chapter
+
+    def outline(self) -> str:
+        """Chapters and pending messages, in a few lines for the builder"""
+        lines = [f"{self.path}: {len(self.chapters)} chapters"]
+        for position, chapter in enumerate(self.chapters, 1):
+            lines.append(
+                f"{position}. chapter {chapter.chapter_id} \"{chapter.title or 'untitled'}\": "
+                f"{len(chapter.markdown)} markdown, {len(chapter.code)} code cells"
+            )
+        for message in self.pending:
+            first_line = message["cells"][0].strip().splitlines()[0][:60] if message["cells"] else ""
+            lines.append(
+                f"pending {message['id']} ({message['kind']} from {message['sender']}): {first_line}"
+            )
+        return "\n".join(lines)
+
+    def notebook(self) -> Any:
+        nb = nbformat.v4.new_notebook()
+        if self.title:
+            nb.cells.append(nbformat.v4.new_markdown_cell(f"# {self.title}"))
+        for chapter in self.chapters:
+            meta = {"chapter": chapter.chapter_id}
+            heading = f"## Chapter {chapter.chapter_id}" + (
+                f": {chapter.title}" if chapter.title else ""
+            )
+            nb.cells.append(
+                nbformat.v4.new_markdown_cell(heading, metadata={**meta, "part": "title"})
+            )
+            for source in chapter.markdown:
+                nb.cells.append(
+                    nbformat.v4.new_markdown_cell(source, metadata={**meta, "part": "markdown"})
+                )
+            for source in chapter.code:
+                nb.cells.append(
+                    nbformat.v4.new_code_cell(source, metadata={**meta, "part": "code"})
+                )
+        nb.metadata["assembly"] = {"title": self.title, "pending": self.pending}
+        nb.metadata["kernelspec"] = {
+            "name": "python3",
+            "display_name": "Python 3",
+            "language": "python",
+        }
+        return nb
+
+    def save(self):
+        """Write the notebook to a temporary file and move it over ``path``"""
+        started = time.perf_counter()
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".notebook-", suffix=".ipynb")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                nbformat.write(self.notebook(), f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.writes += 1
+        self.write_seconds += time.perf_counter() - started
+
+    def load(self) -> bool:
+        """Continue with the notebook at ``path``; False if there is none"""
+        if not os.path.exists(self.path):
+            return False
+        nb = nbformat.read(self.path, as_version=4)
+        assembly = nb.metadata.get("assembly", {})
+        self.title = assembly.get("title", self.title)
+        self.pending = [dict(message) for message in assembly.get("pending", [])]
+        self._next_pending_id = max([m["id"] for m in self.pending] + [0]) + 1
+        self.chapters = []
+        for cell in nb.cells:
+            chapter_id = cell.metadata.get("chapter")
+            if chapter_id is None:
+                continue
+            chapter = self.chapter(chapter_id, create=True)
+            part = cell.metadata.get("part")
+            if part == "title":
+                chapter.title = cell.source.split(":", 1)[1].strip() if ":" in cell.source else ""
+            elif part in ("markdown", "code"):
+                getattr(chapter, part).append(cell.source)
+        logger.info(f"Continuing notebook {self.path} with {len(self.chapters)} chapters")
+        return True
+
+    def attach(self, manager: Any):
+        """Apply every message appended to ``manager``'s group chat"""
+        for groupchat in manager_groupchats(manager):
+            if getattr(groupchat, "_notebook_assembler", None) is self:
+                continue
+            groupchat._notebook_assembler = self
+            self._wrap(groupchat)
+
+    def _wrap(self, groupchat: GroupChat):
+        append = groupchat.append
+
+        def assembling_append(message: Dict[str, Any], speaker: Any):
+            append(message, speaker)
+            try:
+                self.add_message(speaker.name, message.get("content"))
+            except Exception as e:
+                # A bad message must not end the conversation
+                logger.warning(f"Could not add {speaker.name}'s message to {self.path}: {e}")
+
+        groupchat.append = assembling_append
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "chapters": len(self.chapters),
+            "pending": len(self.pending),
+            "writes": self.writes,
+            "mean_write_ms": round(self.write_seconds / self.writes * 1000, 2)
+            if self.writes
+            else None,
+        }
+
+
+def register_notebook_tools(assembler: NotebookAssembler, caller: Any, executor: Any):
+    """
+    Let ``caller`` edit the structure of ``assembler``'s notebook through
+    tool calls that ``executor`` runs. Each tool saves the notebook and
+    returns the new outline. Call it before ``register_mock_client`` and
+    ``add_rate_limiting``: adding tools rebuilds the caller's LLM client.
+    """
+
+    def edit(operation) -> str:
+        try:
+            operation()
+        except (KeyError, ValueError) as e:
+            return f"Error: {e.args[0] if e.args else e}\n{assembler.outline()}"
+        assembler.save()
+        return assembler.outline()
+
+    def notebook_outline() -> str:
+        return assembler.outline()
+
+    def set_chapter_title(
+        chapter_id: Annotated[str, "Chapter number, e.g. '3'"],
+        title: Annotated[str, "New chapter title"],
+    ) -> str:
+        def rename():
+            assembler.chapter(chapter_id, create=True).title = title
+
+        return edit(rename)
+
+    def move_chapter(
+        chapter_id: Annotated[str, "Chapter number"],
+        position: Annotated[int, "New position in the notebook, from 1"],
+    ) -> str:
+        return edit(lambda: assembler.move_chapter(chapter_id, position))
+
+    def remove_chapter(chapter_id: Annotated[str, "Chapter number"]) -> str:
+        return edit(lambda: assembler.remove_chapter(chapter_id))
+
+    def place_pending(
+        pending_id: Annotated[int, "Id of a pending message from the outline"],
+        chapter_id: Annotated[str, "Chapter whose markdown or code it becomes"],
+    ) -> str:
+        return edit(lambda: assembler.place_pending(pending_id, chapter_id))
+
+    tools = [
+        (notebook_outline, "Show the notebook's chapters and pending messages"),
+        (set_chapter_title, "Rename a chapter of the notebook"),
+        (move_chapter, "Move a chapter to another position"),
+        (remove_chapter, "Remove a chapter and its cells"),
+        (place_pending, "Put a pending message into a chapter"),
+    ]
+    for function, description in tools:
+        register_function(function, caller=caller, executor=executor, description=description)
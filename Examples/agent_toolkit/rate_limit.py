@@ -0,0 +1,481 @@
+"""
+Client-side rate limiting for agents that share one deployment.
+
+All agents built from the same config entry call the same Azure OpenAI
+deployment, so they also share its requests-per-minute and tokens-per-minute
+quota. ``add_rate_limiting`` wraps each agent's model clients in a
+``RateLimitedClient`` that goes through one ``RateLimiter`` per deployment:
+
+- requests wait in a single priority queue until both token buckets allow
+  them; the group chat manager's speaker-selection calls go first
+- a ``429`` pauses every caller of the deployment for a jittered exponential
+  backoff (or the server's ``Retry-After``) and is then retried; other
+  transient errors only back off the request that failed
+- identical prompts that are already in flight are coalesced into one call,
+  as long as they are deterministic: ``temperature`` 0 or unset, or a fixed
+  ``seed``; sampled replies are meant to differ
+- time spent queued and time spent in the model are tracked separately
+
+It is opt-in: with ``LLM_RATE_LIMIT`` off (the default) ``add_rate_limiting``
+only spreads the calls over several deployments. Limits come from
+``LLM_RATE_LIMIT_RPM`` and ``LLM_RATE_LIMIT_TPM``; ``0`` (the default) means
+no limit, while backoff and coalescing still apply.
+"""
+
+import os
+import time
+import heapq
+import random
+import itertools
+import functools
+import threading
+import logging
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from autogen import GroupChat, GroupChatManager
+from autogen.oai.client import PlaceHolderClient
+
+from .fan_out import manager_groupchats
+from .response_cache import cache_key
+from .tracing import span
+from .routing import (
+    DeploymentRouter,
+    deployment_name,
+    is_rate_limit_error,
+    is_transient_error,
+    route_deployments,
+)
+from .tokens import estimate_message_tokens
+
+logger = logging.getLogger(__name__)
+
+# Priority of the manager's speaker-selection calls; agents use 0
+SELECTION_PRIORITY = 10
+
+# Azure enforces per-minute quotas over short windows, so allow bursts of
+# at most this many seconds worth of quota
+BURST_SECONDS = 10
+
+# Completion size assumed for requests without max_tokens
+DEFAULT_COMPLETION_TOKENS = 512
+
+
+def rate_limiting_enabled() -> bool:
+    """True when ``LLM_RATE_LIMIT`` is on"""
+    value = os.getenv("LLM_RATE_LIMIT", "off").lower()
+    return value in ("1", "on", "true", "yes")
+
+
+def coalescable(params: Dict[str, Any]) -> bool:
+    """
+    True when concurrent calls with ``params`` may share one response: not
+    streamed, and either not sampled (``temperature`` 0 or unset) or seeded
+    """
+    if params.get("stream"):
+        # A streamed reply goes to the IOStream of the caller, so only the
+        # caller itself can make it
+        return False
+    return not params.get("temperature") or params.get("seed") is not None
+
+
+class _TokenBucket:
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * BURST_SECONDS)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_seconds(self, amount: float) -> float:
+        if not self.rate:
+            return 0.0
+        self._refill()
+        # A request larger than the burst goes through once the bucket is full
+        needed = min(amount, self.capacity) - self.level
+        return max(0.0, needed / self.rate)
+
+    def headroom(self) -> float:
+        if not self.rate:
+            return 1.0
+        self._refill()
+        return max(0.0, self.level / self.capacity)
+
+    def take(self, amount: float):
+        if self.rate:
+            self.level -= amount
+
+
+class RateLimiter:
+    """
+    Shared quota of one deployment.
+
+    - ``requests_per_minute`` / ``tokens_per_minute``: quota (0 = no limit)
+    - ``max_retries``: retries of a request after a ``429`` or another
+      transient error
+    - ``backoff_seconds`` / ``max_backoff_seconds``: base and cap of the
+      exponential backoff, which is fully jittered
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        max_retries: int = 5,
+        backoff_seconds: float = 1.0,
+        max_backoff_seconds: float = 60.0,
+        name: str = "default",
+    ):
+        self.name = name
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self._requests = _TokenBucket(requests_per_minute)
+        self._tokens = _TokenBucket(tokens_per_minute)
+        self._paused_until = 0.0
+        self._lock = threading.Condition()
+        self._waiting: List[Tuple[int, int]] = []
+        self._order = itertools.count()
+        self._in_flight: Dict[str, Future] = {}
+        self._rng = random.Random()
+        self._stats = _empty_stats()
+
+    def acquire(self, tokens: int, priority: int = 0) -> float:
+        """
+        Block until the request may be sent and return the seconds waited.
+        Higher ``priority`` goes first, then first come first served.
+        """
+        started = time.monotonic()
+        ticket = (-priority, next(self._order))
+        with self._lock:
+            heapq.heappush(self._waiting, ticket)
+            self._lock.notify_all()
+            try:
+                while True:
+                    timeout = None
+                    if self._waiting[0] == ticket:
+                        timeout = self._wait_seconds_locked(tokens)
+                        if timeout <= 0:
+                            break
+                    self._lock.wait(timeout)
+                self._requests.take(1)
+                self._tokens.take(tokens)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._lock.notify_all()
+        return time.monotonic() - started
+
+    def _wait_seconds_locked(self, tokens: int) -> float:
+        return max(
+            self._paused_until - time.monotonic(),
+            self._requests.wait_seconds(1),
+            self._tokens.wait_seconds(tokens),
+        )
+
+    def headroom(self) -> float:
+        """Share of the quota left right now, 0 while paused after a ``429``"""
+        with self._lock:
+            if time.monotonic() < self._paused_until:
+                return 0.0
+            return min(self._requests.headroom(), self._tokens.headroom())
+
+    def settle(self, estimated: int, actual: Optional[int]):
+        """Correct the token bucket once the real usage of a request is known"""
+        if actual is None:
+            return
+        with self._lock:
+            self._tokens.take(actual - estimated)
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Pause the whole deployment after a ``429`` and return the delay.
+        Every waiting request sees the pause, not only the one that failed.
+        """
+        with self._lock:
+            delay = self._delay_locked(attempt, retry_after)
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self._stats["rate_limited"] += 1
+            self._lock.notify_all()
+        logger.warning(
+            f"Deployment {self.name} rate limited, backing off {delay:.2f}s "
+            f"(attempt {attempt + 1})"
+        )
+        return delay
+
+    def retry_delay(self, attempt: int) -> float:
+        """Jittered delay before retrying a request that failed transiently"""
+        with self._lock:
+            return self._delay_locked(attempt, None)
+
+    def _delay_locked(self, attempt: int, retry_after: Optional[float]) -> float:
+        if retry_after is not None:
+            return retry_after + self._rng.uniform(0, self.backoff_seconds)
+        cap = min(self.max_backoff_seconds, self.backoff_seconds * 2**attempt)
+        return self._rng.uniform(0, cap)
+
+    def coalesce(self, key: Optional[str], call: Callable[[], Any]) -> Any:
+        """
+        Run ``call`` unless a request with the same ``key`` is in flight, in
+        which case wait for that one and return its result
+        """
+        if key is None:
+            return call()
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+            else:
+                self._stats["coalesced"] += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = call()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def record(self, queued: float, model: float, retried: bool = False):
+        """Count one call to the model, ``retried`` if it follows a failed one"""
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["retries"] += int(retried)
+            self._stats["queued_seconds"] += queued
+            self._stats["model_seconds"] += model
+
+    def stats(self) -> Dict[str, Any]:
+        """Request counts and the time spent queued versus in the model"""
+        with self._lock:
+            stats = dict(self._stats)
+        calls = stats["requests"]
+        total = stats["queued_seconds"] + stats["model_seconds"]
+        stats["queued_seconds"] = round(stats["queued_seconds"], 6)
+        stats["model_seconds"] = round(stats["model_seconds"], 6)
+        stats["queued_share"] = (
+            round(stats["queued_seconds"] / total, 4) if total else None
+        )
+        stats["mean_queued_seconds"] = (
+            round(stats["queued_seconds"] / calls, 6) if calls else None
+        )
+        return stats
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = _empty_stats()
+
+
+def _empty_stats() -> Dict[str, Any]:
+    return {
+        "requests": 0,
+        "coalesced": 0,
+        "rate_limited": 0,
+        "retries": 0,
+        "queued_seconds": 0.0,
+        "model_seconds": 0.0,
+    }
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Server-requested delay of a ``429``, from the Azure/OpenAI headers"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+class RateLimitedClient:
+    """
+    autogen ``ModelClient`` that sends ``client``'s requests through
+    ``limiter``. Everything except ``create`` is passed through.
+    """
+
+    def __init__(self, client: Any, limiter: RateLimiter, priority: int = 0):
+        self.client = client
+        self.limiter = limiter
+        self.priority = priority
+        # The OpenAI SDK would otherwise retry a 429 on its own, uncoordinated
+        sdk_client = getattr(client, "_oai_client", None)
+        if sdk_client is not None and hasattr(sdk_client, "with_options"):
+            client._oai_client = sdk_client.with_options(max_retries=0)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
+
+    def create(self, params: Dict[str, Any], max_retries: Optional[int] = None) -> Any:
+        """
+        ``ModelClient.create`` through the limiter. ``max_retries`` overrides
+        the limiter's setting, e.g. ``0`` when another deployment can take
+        the request instead.
+        """
+        key = cache_key(params) if coalescable(params) else None
+        return self.limiter.coalesce(
+            key, functools.partial(self._create, params, max_retries)
+        )
+
+    def _create(self, params: Dict[str, Any], max_retries: Optional[int]) -> Any:
+        if max_retries is None:
+            max_retries = self.limiter.max_retries
+        estimated = estimate_message_tokens(params.get("messages", [])) + (
+            params.get("max_tokens") or DEFAULT_COMPLETION_TOKENS
+        )
+        for attempt in range(max_retries + 1):
+            request_span = span(
+                "llm.request",
+                deployment=self.limiter.name,
+                priority=self.priority,
+                attempt=attempt,
+            ).activate()
+            queued = self.limiter.acquire(estimated, self.priority)
+            started = time.monotonic()
+            try:
+                response = self.client.create(params)
+            except Exception as e:
+                request_span.set(queued_ms=round(queued * 1000, 3), error=type(e).__name__)
+                request_span.end()
+                self.limiter.record(queued, time.monotonic() - started, attempt > 0)
+                rate_limited = is_rate_limit_error(e)
+                if rate_limited:
+                    # Pause the deployment even when giving up on this request,
+                    # so other callers and the router hold off as well
+                    self.limiter.backoff(attempt, _retry_after(e))
+                if attempt >= max_retries or not (rate_limited or is_transient_error(e)):
+                    raise
+                if not rate_limited:
+                    time.sleep(self.limiter.retry_delay(attempt))
+                continue
+
+            self.limiter.record(queued, time.monotonic() - started, attempt > 0)
+            usage = self.client.get_usage(response) or {}
+            self.limiter.settle(estimated, usage.get("total_tokens"))
+            request_span.set(queued_ms=round(queued * 1000, 3), model=usage.get("model"))
+            # Token counts add up on the reply, round and conversation spans
+            request_span.add(
+                prompt_tokens=usage.get("prompt_tokens") or 0,
+                completion_tokens=usage.get("completion_tokens") or 0,
+                llm_requests=1,
+            )
+            request_span.end()
+            return response
+
+    def message_retrieval(self, response: Any) -> List[Any]:
+        return self.client.message_retrieval(response)
+
+    def cost(self, response: Any) -> float:
+        return self.client.cost(response)
+
+    def get_usage(self, response: Any) -> Dict[str, Any]:
+        return self.client.get_usage(response)
+
+
+def rate_limit_settings() -> Dict[str, float]:
+    """``RateLimiter`` arguments from the ``LLM_RATE_LIMIT_*`` environment variables"""
+    return {
+        "requests_per_minute": float(os.getenv("LLM_RATE_LIMIT_RPM", "0")),
+        "tokens_per_minute": float(os.getenv("LLM_RATE_LIMIT_TPM", "0")),
+        "max_retries": int(os.getenv("LLM_RATE_LIMIT_MAX_RETRIES", "5")),
+    }
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(config: Dict[str, Any], model_client: Any = None) -> RateLimiter:
+    """The process-wide ``RateLimiter`` of the deployment ``config`` points at"""
+    name = deployment_name(config, model_client)
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            limiter = _limiters[name] = RateLimiter(
+                name=name, **rate_limit_settings()
+            )
+        return limiter
+
+
+def add_rate_limiting(agents: Sequence[Any], priority: int = 0):
+    """
+    Send the model calls of ``agents`` through their deployment's
+    ``RateLimiter``. A ``GroupChatManager`` in ``agents`` gets
+    ``SELECTION_PRIORITY``, and so do the speaker-selection agents its
+    group chat creates for ``"auto"`` selection.
+
+    When an agent's config_list has several deployments, its calls are
+    also spread over them by a ``DeploymentRouter``. Unless
+    ``LLM_RATE_LIMIT`` is on, that routing is all this does.
+
+    Call this after ``register_mock_client``; agents that are already
+    rate limited are left untouched.
+    """
+    limit = rate_limiting_enabled()
+    for agent in agents:
+        client = getattr(agent, "client", None)
+        if client is None:
+            continue
+        agent_priority = priority
+        if isinstance(agent, GroupChatManager):
+            agent_priority = max(priority, SELECTION_PRIORITY)
+            _limit_speaker_selection(agent)
+        if limit:
+            _limit_clients(client, agent_priority)
+        route_deployments(client)
+
+
+def _limit_clients(client: Any, priority: int):
+    for index, model_client in enumerate(client._clients):
+        # Placeholders are replaced when their custom client is registered
+        if isinstance(
+            model_client, (RateLimitedClient, DeploymentRouter, PlaceHolderClient)
+        ):
+            continue
+        client._clients[index] = RateLimitedClient(
+            model_client,
+            get_rate_limiter(client._config_list[index], model_client),
+            priority,
+        )
+
+
+def _limit_speaker_selection(manager: GroupChatManager):
+    for groupchat in manager_groupchats(manager):
+        _limit_groupchat_selection(groupchat)
+
+
+def _limit_groupchat_selection(groupchat: GroupChat):
+    # GroupChat creates a new speaker-selection agent for every "auto" round
+    create_internal_agents = groupchat._create_internal_agents
+    if getattr(create_internal_agents, "rate_limited", False):
+        return
+
+    @functools.wraps(create_internal_agents)
+    def create_rate_limited_agents(*args, **kwargs):
+        checking_agent, selection_agent = create_internal_agents(*args, **kwargs)
+        add_rate_limiting([selection_agent], priority=SELECTION_PRIORITY)
+        return checking_agent, selection_agent
+
+    create_rate_limited_agents.rate_limited = True
+    groupchat._create_internal_agents = create_rate_limited_agents
+
+
+def rate_limit_stats() -> Dict[str, Dict[str, Any]]:
+    """``RateLimiter.stats()`` per deployment"""
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {name: limiter.stats() for name, limiter in limiters.items()}
@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import pickle
+import sqlite3
+import hashlib
+import threading
+import logging
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "llm_responses.sqlite")
+
+
+def cache_key(params: Any) -> str:
+    """
+    Content address of a completion request.
+
+    autogen passes the full create params (model, messages, temperature,
+    max_tokens, seed, tools, ...), so identical requests from any agent or
+    script map to the same key.
+    """
+    if not isinstance(params, str):
+        params = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(params.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent LLM response cache backed by SQLite with size-based LRU eviction.
+
+    Implements autogen's ``AbstractCache`` protocol, so it can be passed as
+    ``cache=`` to ``initiate_chat``. The GroupChatManager hands it to every
+    agent in the group chat. One instance is safe to share between threads
+    and conversations.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = 512 * 2**20):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+        )
+        self._conn.commit()
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+    def get(self, key: Any, default: Optional[Any] = None) -> Optional[Any]:
+        digest = cache_key(key)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM responses WHERE key = ?", (digest,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?",
+                (time.time(), digest),
+            )
+            self._conn.commit()
+        return pickle.loads(row[0])
+
+    def set(self, key: Any, value: Any) -> None:
+        digest = cache_key(key)
+        blob = pickle.dumps(value)
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT size FROM responses WHERE key = ?", (digest,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (digest, blob, len(blob), time.time()),
+            )
+            self._total_bytes += len(blob) - (old[0] if old else 0)
+            self._evict_locked()
+            self._conn.commit()
+
+    def _evict_locked(self):
+        if self._total_bytes <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY last_access"
+        ).fetchall()
+        for key, size in rows:
+            if self._total_bytes <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._total_bytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": entries,
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def close(self) -> None:
+        # autogen enters and exits the cache around every request, so the
+        # shared connection stays open until the process exits
+        pass
+
+    def __enter__(self) -> "ResponseCache":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+_shared_caches: Dict[str, ResponseCache] = {}
+_shared_lock = threading.Lock()
+
+
+def get_response_cache(path: Optional[str] = None) -> Optional[ResponseCache]:
+    """
+    Return the process-wide response cache configured from the environment.
+
+    Caching is opt-in: set ``LLM_CACHE=on`` to enable it. Otherwise ``None``
+    is returned and autogen calls the model as usual. ``LLM_CACHE_PATH`` sets
+    the SQLite file and ``LLM_CACHE_MAX_MB`` its size.
+
+    Entries are unpickled (``pickle.loads``) when read, so only point
+    ``LLM_CACHE_PATH`` at a file you trust.
+    """
+    if os.getenv("LLM_CACHE", "off").lower() not in ("1", "on", "true", "yes"):
+        return None
+
+    path = path or os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH)
+    with _shared_lock:
+        if path not in _shared_caches:
+            max_bytes = int(float(os.getenv("LLM_CACHE_MAX_MB", "512")) * 2**20)
+            _shared_caches[path] = ResponseCache(path, max_bytes=max_bytes)
+            logger.info(f"Using LLM response cache at {path}")
+        return _shared_caches[path]
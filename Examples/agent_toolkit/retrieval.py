@@ -0,0 +1,414 @@
+"""
+Retrieval memory for large reference documents in group chats.
+
+A contract or requirements document in the opening message is resent to
+every agent in every round, so prompts grow with the document. With
+``add_retrieval_memory`` the document is chunked and indexed once, and each
+agent sees a short reference to it in the history plus the ``top_k``
+chunks most relevant to its own turn:
+
+    memory = add_retrieval_memory(agents)
+    memory.add_document("contract", contract_text)
+    user.initiate_chat(manager, message=f"Please analyze:\\n{contract_text}")
+
+Documents added with ``add_document`` are replaced wherever their text
+appears in a message. Other messages longer than ``min_tokens`` are added
+automatically and replaced by their first lines. Chunks are embedded with
+the hashing vectorizer of ``text_vectors`` and searched through an inverted
+index with TF-IDF weights, so retrieval needs no model, no extra packages
+and no network, and the prompt stays about the same size whether the
+document has two pages or two hundred.
+"""
+
+import os
+import re
+import math
+import hashlib
+import logging
+import threading
+import weakref
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from autogen.agentchat.contrib.capabilities.transform_messages import (
+    TransformMessages,
+)
+
+from .text_vectors import SparseVector, hashing_vector, tokenize
+from .tokens import CHARS_PER_TOKEN, estimate_message_tokens, estimate_tokens, message_text
+
+logger = logging.getLogger(__name__)
+
+_PARAGRAPH_SPLIT = re.compile(r"\n\s*\n|\n(?=\s*(?:#|[-*•]|\d+[.)]|\(?[a-z]\)))")
+# Not after "4." or "(b)." so numbered clauses stay with their number
+_SENTENCE_END = re.compile(r"(?<=[^\d\s)][.!?;])\s+")
+
+EXCERPTS_HEADER = "Relevant excerpts from the documents in retrieval memory:"
+
+
+def retrieval_memory_enabled() -> bool:
+    """True when ``RETRIEVAL_MEMORY`` is on"""
+    value = os.getenv("RETRIEVAL_MEMORY", "off").lower()
+    return value in ("1", "on", "true", "yes")
+
+
+def retrieval_settings() -> Dict[str, int]:
+    """``RetrievalMemory`` and ``RetrievalTransform`` arguments from ``RETRIEVAL_*``"""
+    return {
+        "chunk_tokens": int(os.getenv("RETRIEVAL_CHUNK_TOKENS", "200")),
+        "min_tokens": int(os.getenv("RETRIEVAL_MIN_TOKENS", "1000")),
+        "top_k": int(os.getenv("RETRIEVAL_TOP_K", "4")),
+    }
+
+
+def chunk_text(text: str, chunk_tokens: int = 200, overlap_tokens: int = 40) -> List[str]:
+    """
+    Split ``text`` into chunks of about ``chunk_tokens`` tokens along
+    paragraphs and sentences. A chunk starts with the last sentence of the
+    previous one when that is at most ``overlap_tokens`` long, so a clause
+    split across chunks is still found with its context.
+    """
+    units: List[str] = []
+    max_chars = chunk_tokens * CHARS_PER_TOKEN
+    for paragraph in _PARAGRAPH_SPLIT.split(text):
+        paragraph = " ".join(paragraph.split())
+        for sentence in _SENTENCE_END.split(paragraph):
+            # Text without sentence ends is cut at the chunk size
+            while len(sentence) > max_chars:
+                cut = sentence.rfind(" ", 0, max_chars)
+                cut = cut if cut > max_chars // 2 else max_chars
+                units.append(sentence[:cut])
+                sentence = sentence[cut:].lstrip()
+            if sentence:
+                units.append(sentence)
+
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for unit in units:
+        tokens = estimate_tokens(unit)
+        if current and size + tokens > chunk_tokens:
+            chunks.append(" ".join(current))
+            overlap = current[-1]
+            if estimate_tokens(overlap) <= overlap_tokens and len(current) > 1:
+                current, size = [overlap], estimate_tokens(overlap)
+            else:
+                current, size = [], 0
+        current.append(unit)
+        size += tokens
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+@dataclass
+class Chunk:
+    document: str
+    index: int
+    text: str
+    vector: SparseVector
+
+
+@dataclass
+class Document:
+    name: str
+    text: str
+    chunks: int
+    tokens: int
+    # Shown before the reference, e.g. the instruction of a large message
+    head: str = ""
+
+
+class RetrievalMemory:
+    """
+    In-process index of document chunks, shared by the agents of one
+    conversation. Thread-safe; chunks are only added, never changed.
+    """
+
+    def __init__(self, chunk_tokens: int = 200, overlap_tokens: int = 40):
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.documents: Dict[str, Document] = {}
+        self.chunks: List[Chunk] = []
+        # Inverted index: feature -> [(chunk id, normalized weight)]
+        self._postings: Dict[int, List[Tuple[int, float]]] = {}
+        self._by_hash: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def add_document(self, name: str, text: str, head: str = "") -> Document:
+        """Chunk and index ``text`` under ``name``; adding the same text again is a no-op"""
+        text = text.strip()
+        key = hashlib.sha1(text.encode()).hexdigest()
+        with self._lock:
+            if key in self._by_hash:
+                return self.documents[self._by_hash[key]]
+        pieces = chunk_text(text, self.chunk_tokens, self.overlap_tokens)
+        vectors = [_normalize(hashing_vector(tokenize(piece))) for piece in pieces]
+        with self._lock:
+            if key in self._by_hash:
+                return self.documents[self._by_hash[key]]
+            if name in self.documents:
+                name = f"{name}-{key[:8]}"
+            for index, (piece, vector) in enumerate(zip(pieces, vectors)):
+                chunk_id = len(self.chunks)
+                self.chunks.append(Chunk(name, index, piece, vector))
+                for feature, weight in vector.items():
+                    self._postings.setdefault(feature, []).append((chunk_id, weight))
+            document = Document(name, text, len(pieces), estimate_tokens(text), head)
+            self.documents[name] = document
+            self._by_hash[key] = name
+        logger.info(
+            f"Retrieval memory: indexed {name} ({document.tokens} tokens) "
+            f"in {document.chunks} chunks"
+        )
+        return document
+
+    def search(self, query: str, top_k: int = 4) -> List[Tuple[float, Chunk]]:
+        """The ``top_k`` chunks with the highest TF-IDF similarity to ``query``"""
+        query_vector = hashing_vector(tokenize(query))
+        with self._lock:
+            total = len(self.chunks)
+            scores: Dict[int, float] = {}
+            for feature, weight in query_vector.items():
+                postings = self._postings.get(feature)
+                if not postings:
+                    continue
+                # Terms found in every chunk, like the parties' names, weigh little
+                idf = math.log((total + 1) / (len(postings) + 0.5))
+                for chunk_id, chunk_weight in postings:
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + weight * idf * chunk_weight
+            best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+            return [(score, self.chunks[chunk_id]) for chunk_id, score in best if score > 0]
+
+    def opening(self, top_k: int = 4) -> List[Tuple[float, Chunk]]:
+        """The first ``top_k`` chunks of the latest document"""
+        with self._lock:
+            if not self.chunks:
+                return []
+            latest = self.chunks[-1].document
+            return [(0.0, c) for c in self.chunks if c.document == latest][:top_k]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "documents": {
+                    name: {"tokens": doc.tokens, "chunks": doc.chunks}
+                    for name, doc in self.documents.items()
+                },
+                "chunks": len(self.chunks),
+                "features": len(self._postings),
+            }
+
+
+def _normalize(vector: SparseVector) -> SparseVector:
+    norm = math.sqrt(sum(v * v for v in vector.values()))
+    return {index: v / norm for index, v in vector.items()} if norm else vector
+
+
+class RetrievalTransform:
+    """
+    ``MessageTransform`` that replaces the documents of ``memory`` in the
+    history with references and adds the ``top_k`` chunks relevant to the
+    agent's turn just before the message it answers. ``role`` (usually the
+    agent's system message) is part of every query, so each agent gets the
+    passages that matter for its own job.
+    """
+
+    def __init__(
+        self,
+        memory: RetrievalMemory,
+        top_k: int = 4,
+        min_tokens: int = 1000,
+        role: str = "",
+        query_messages: int = 2,
+        name: str = "",
+    ):
+        self.memory = memory
+        self.top_k = top_k
+        self.min_tokens = min_tokens
+        self.role = role
+        self.query_messages = max(1, query_messages)
+        self.name = name
+        self.rounds: List[Dict[str, int]] = []
+        self._rewritten: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def apply_transform(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not messages:
+            return messages
+        tokens_before = estimate_message_tokens(messages)
+        messages = [self._replace_documents(m) for m in messages]
+        if not self.memory.chunks:
+            return messages
+
+        query = " ".join(
+            [self.role] + [message_text(m) for m in messages[-self.query_messages:]]
+        )
+        results = []
+        if self.top_k:
+            # A turn that shares no terms with the documents gets their opening
+            results = self.memory.search(query, self.top_k) or self.memory.opening(self.top_k)
+        if results:
+            position = len(messages) - 1
+            # Never separate a tool result from the call that produced it
+            while position > 0 and messages[position].get("role") == "tool":
+                position -= 1
+            messages.insert(position, {"role": "user", "content": _excerpts(results)})
+
+        tokens_after = estimate_message_tokens(messages)
+        with self._lock:
+            self.rounds.append(
+                {
+                    "tokens_before": tokens_before,
+                    "tokens_after": tokens_after,
+                    "excerpts": len(results),
+                }
+            )
+        return messages
+
+    def get_logs(
+        self,
+        pre_transform_messages: List[Dict[str, Any]],
+        post_transform_messages: List[Dict[str, Any]],
+    ) -> Tuple[str, bool]:
+        before = estimate_message_tokens(pre_transform_messages)
+        after = estimate_message_tokens(post_transform_messages)
+        if after >= before:
+            return "No documents were replaced by excerpts.", False
+        return f"Replaced documents by excerpts: {before} -> {after} tokens.", True
+
+    def _replace_documents(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        if not isinstance(message.get("content"), str):
+            return message
+        text = message["content"]
+        if estimate_tokens(text) < min(self.min_tokens, self._smallest_document()):
+            return message
+        key = hashlib.sha1(text.encode()).hexdigest()
+        with self._lock:
+            rewritten = self._rewritten.get(key)
+        if rewritten is None:
+            rewritten = self._rewrite(text)
+            with self._lock:
+                self._rewritten[key] = rewritten
+        return message if rewritten == text else {**message, "content": rewritten}
+
+    def _smallest_document(self) -> int:
+        tokens = [doc.tokens for doc in list(self.memory.documents.values())]
+        return min(tokens) if tokens else self.min_tokens
+
+    def _rewrite(self, text: str) -> str:
+        rewritten = text
+        for document in list(self.memory.documents.values()):
+            if document.text in rewritten:
+                rewritten = rewritten.replace(document.text, _reference(document))
+        if rewritten != text or estimate_tokens(text) < self.min_tokens:
+            return rewritten
+
+        # A large message nobody registered: index it and keep its opening
+        name = f"message-{hashlib.sha1(text.encode()).hexdigest()[:8]}"
+        head = _head(text, self.memory.chunk_tokens // 2)
+        return _reference(self.memory.add_document(name, text, head))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rounds = list(self.rounds)
+        return {
+            "rounds": len(rounds),
+            "tokens_before": sum(r["tokens_before"] for r in rounds),
+            "tokens_after": sum(r["tokens_after"] for r in rounds),
+            "tokens_saved": sum(r["tokens_before"] - r["tokens_after"] for r in rounds),
+            "tokens_after_by_round": [r["tokens_after"] for r in rounds],
+        }
+
+
+def _reference(document: Document) -> str:
+    head = f"{document.head}\n" if document.head else ""
+    return head + (
+        f"[Document {document.name}: {document.tokens} tokens in {document.chunks} "
+        f"chunks, held in retrieval memory; the relevant excerpts are quoted "
+        f"before the latest message]"
+    )
+
+
+def _head(text: str, max_tokens: int) -> str:
+    lines: List[str] = []
+    used = 0
+    for line in text.strip().splitlines():
+        used += estimate_tokens(line) + 1
+        if lines and used > max_tokens:
+            break
+        lines.append(line[: max_tokens * CHARS_PER_TOKEN])
+    return "\n".join(lines)
+
+
+def _excerpts(results: List[Tuple[float, Chunk]]) -> str:
+    # In document order, which reads better than by score
+    chunks = sorted((chunk for _, chunk in results), key=lambda c: (c.document, c.index))
+    lines = [EXCERPTS_HEADER]
+    for chunk in chunks:
+        lines.append(f"[{chunk.document} #{chunk.index + 1}] {chunk.text}")
+    return "\n".join(lines)
+
+
+_transforms = weakref.WeakKeyDictionary()
+
+
+def add_retrieval_memory(
+    agents: Sequence[Any], memory: Optional[RetrievalMemory] = None, **kwargs
+) -> RetrievalMemory:
+    """
+    Give ``agents`` a shared ``RetrievalMemory`` (a new one by default) and
+    return it. Agents without an LLM are skipped. Call it before
+    ``add_transcript_compaction`` so the compactor sees the excerpts rather
+    than the documents. Defaults come from ``retrieval_settings``.
+    """
+    settings = {**retrieval_settings(), **kwargs}
+    if memory is None:
+        memory = RetrievalMemory(chunk_tokens=settings["chunk_tokens"])
+    for agent in agents:
+        if not getattr(agent, "llm_config", None) or agent in _transforms:
+            continue
+        transform = RetrievalTransform(
+            memory,
+            top_k=settings["top_k"],
+            min_tokens=settings["min_tokens"],
+            role=getattr(agent, "system_message", "") or "",
+            name=agent.name,
+        )
+        TransformMessages(transforms=[transform], verbose=False).add_to_agent(agent)
+        _transforms[agent] = transform
+    return memory
+
+
+def retrieval_memory(agents: Sequence[Any]) -> Optional[RetrievalMemory]:
+    """The ``RetrievalMemory`` that ``agents`` share, or ``None``"""
+    for agent in agents:
+        if agent in _transforms:
+            return _transforms[agent].memory
+    return None
+
+
+def retrieval_groupchat_kwargs(agents: Sequence[Any]) -> Dict[str, Any]:
+    """
+    ``GroupChat`` arguments that keep the documents of the agents' memory out
+    of the LLM speaker selection prompt too; empty without retrieval memory
+    """
+    memory = retrieval_memory(agents)
+    if memory is None:
+        return {}
+    # Picking the next speaker needs the references, not the excerpts
+    transform = RetrievalTransform(
+        memory, top_k=0, min_tokens=retrieval_settings()["min_tokens"], name="speaker_selection"
+    )
+    return {
+        "select_speaker_transform_messages": TransformMessages(
+            transforms=[transform], verbose=False
+        )
+    }
+
+
+def retrieval_stats(agents: Sequence[Any]) -> Dict[str, Dict[str, Any]]:
+    """Per-agent ``RetrievalTransform.stats()`` for agents with retrieval memory"""
+    return {
+        agent.name: _transforms[agent].stats() for agent in agents if agent in _transforms
+    }
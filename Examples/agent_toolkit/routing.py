@@ -0,0 +1,295 @@
+"""
+Load balancing across several deployments of the same model.
+
+``azure_deployments`` reads a list of Azure OpenAI deployments (e.g. one per
+region) from ``AZURE_OPENAI_DEPLOYMENTS``. An agent whose config_list holds
+several of them gets a ``DeploymentRouter`` as its only model client; it
+picks a deployment for every call instead of always using the first one:
+
+- lowest score wins: observed p50 latency, scaled up by the error rate, the
+  calls already in flight and a lack of remaining quota (``RateLimiter``)
+- a deployment that keeps failing is ejected for a cooldown that doubles
+  with every ejection, then gets one more chance
+- a ``429``, timeout, ``5xx`` or connection error fails over to the next
+  best deployment
+
+Health is tracked per deployment for the whole process, so all agents and
+conversations learn from each other's calls.
+"""
+
+import os
+import json
+import time
+import threading
+import logging
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from autogen.oai.client import PlaceHolderClient
+
+try:
+    from openai import APIConnectionError
+except ImportError:
+    APIConnectionError = None
+
+logger = logging.getLogger(__name__)
+
+# Calls per deployment used for the latency percentile and error rate
+HEALTH_WINDOW = 50
+
+# Consecutive failures after which a deployment is ejected
+EJECT_AFTER_FAILURES = 3
+
+# First ejection cooldown; doubles with each ejection up to the maximum
+EJECT_SECONDS = 30.0
+MAX_EJECT_SECONDS = 300.0
+
+# Floor for the quota factor, so an exhausted deployment is still ranked
+MIN_HEADROOM = 0.05
+
+
+def deployment_name(config: Dict[str, Any], model_client: Any = None) -> str:
+    """Endpoint and model of a config entry, which identify its quota"""
+    # autogen keeps the endpoint in the SDK client, not in its config_list
+    endpoint = getattr(getattr(model_client, "_oai_client", None), "base_url", None)
+    endpoint = endpoint or config.get("base_url") or config.get("azure_endpoint")
+    return f"{str(endpoint or 'local').rstrip('/')}/{config.get('model', '')}"
+
+
+def azure_deployments() -> List[Dict[str, Any]]:
+    """
+    config_list entries from ``AZURE_OPENAI_DEPLOYMENTS``, either inline JSON
+    or the path of a JSON file, holding a list like::
+
+        [{"endpoint": "https://eastus.openai.azure.com/", "api_key": "..."},
+         {"endpoint": "https://westeurope.openai.azure.com/", "model": "gpt-4o"}]
+
+    Missing fields default to the ``AZURE_OPENAI_*`` variables. Returns an
+    empty list when the variable is not set.
+    """
+    value = os.getenv("AZURE_OPENAI_DEPLOYMENTS", "").strip()
+    if not value:
+        return []
+    if not value.startswith("["):
+        with open(value, encoding="utf-8") as f:
+            value = f.read()
+
+    configs = []
+    for entry in json.loads(value):
+        config = {
+            "model": entry.get("model") or os.getenv("AZURE_OPENAI_MODEL"),
+            "api_key": entry.get("api_key") or os.getenv("AZURE_OPENAI_API_KEY"),
+            "base_url": entry.get("endpoint")
+            or entry.get("base_url")
+            or os.getenv("AZURE_OPENAI_ENDPOINT"),
+            "api_version": entry.get("api_version")
+            or os.getenv("AZURE_OPENAI_API_VERSION"),
+            "api_type": "azure",
+        }
+        missing = [key for key, v in config.items() if not v]
+        if missing:
+            raise ValueError(
+                f"Deployment {entry} in AZURE_OPENAI_DEPLOYMENTS is missing {', '.join(missing)}"
+            )
+        configs.append(config)
+    return configs
+
+
+class DeploymentHealth:
+    """Recent latency, errors and ejection state of one deployment"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies = deque(maxlen=HEALTH_WINDOW)
+        self.outcomes = deque(maxlen=HEALTH_WINDOW)
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+
+    def p50(self) -> Optional[float]:
+        if not self.latencies:
+            return None
+        return sorted(self.latencies)[len(self.latencies) // 2]
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def ejected(self, now: float) -> bool:
+        return now < self.ejected_until
+
+    def score(self, headroom: float) -> float:
+        # Unmeasured deployments rank as fast, so each one is tried early
+        latency = (self.p50() or 0.0) + 0.001
+        return (
+            latency
+            * (1 + self.in_flight)
+            * (1 + 4 * self.error_rate())
+            / max(headroom, MIN_HEADROOM)
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        p50 = self.p50()
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_rate": round(self.error_rate(), 4),
+            "p50_seconds": round(p50, 6) if p50 is not None else None,
+            "in_flight": self.in_flight,
+            "ejected": self.ejected(time.monotonic()),
+            "ejections": self.ejections,
+        }
+
+
+_health: Dict[str, DeploymentHealth] = {}
+_health_lock = threading.Lock()
+
+
+def _deployment_health(name: str) -> DeploymentHealth:
+    with _health_lock:
+        health = _health.get(name)
+        if health is None:
+            health = _health[name] = DeploymentHealth(name)
+        return health
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Errors the OpenAI SDK would retry: timeouts, conflicts, 5xx, connection"""
+    if APIConnectionError is not None and isinstance(error, APIConnectionError):
+        return True
+    status = getattr(error, "status_code", None)
+    return status is not None and (status in (408, 409) or status >= 500)
+
+
+class DeploymentRouter:
+    """
+    autogen ``ModelClient`` that sends each call to one of ``clients``, the
+    model clients of the config entries ``configs``
+    """
+
+    def __init__(self, clients: List[Any], configs: List[Dict[str, Any]]):
+        self.clients = list(clients)
+        self.configs = list(configs)
+        self.health = [
+            _deployment_health(deployment_name(config, client))
+            for client, config in zip(self.clients, self.configs)
+        ]
+
+    def create(self, params: Dict[str, Any]) -> Any:
+        tried: List[int] = []
+        while True:
+            index = self._choose(tried)
+            tried.append(index)
+            last = len(tried) == len(self.clients)
+            try:
+                return self._call(index, params, last)
+            except Exception as e:
+                if last or not (is_rate_limit_error(e) or is_transient_error(e)):
+                    raise
+                logger.warning(
+                    f"Deployment {self.health[index].name} failed ({type(e).__name__}), "
+                    f"failing over"
+                )
+
+    def _choose(self, tried: List[int]) -> int:
+        now = time.monotonic()
+        candidates = [i for i in range(len(self.clients)) if i not in tried]
+        with _health_lock:
+            healthy = [i for i in candidates if not self.health[i].ejected(now)]
+            if not healthy:
+                # Everything left is ejected: try the one that recovers first
+                return min(candidates, key=lambda i: self.health[i].ejected_until)
+            scores = {i: self.health[i].score(self._headroom(i)) for i in healthy}
+            return min(healthy, key=lambda i: scores[i])
+
+    def _headroom(self, index: int) -> float:
+        limiter = getattr(self.clients[index], "limiter", None)
+        return limiter.headroom() if limiter is not None else 1.0
+
+    def _call(self, index: int, params: Dict[str, Any], last: bool) -> Any:
+        client, config, health = self.clients[index], self.configs[index], self.health[index]
+        model = config.get("model", params.get("model"))
+        if str(config.get("api_type", "")).startswith("azure") and model:
+            # Same as autogen: Azure deployment names have no dots
+            model = model.replace(".", "")
+        params = {**params, "model": model}
+
+        with _health_lock:
+            health.in_flight += 1
+        started = time.monotonic()
+        try:
+            if hasattr(client, "limiter"):
+                # Fail over right away instead of waiting out a 429 here
+                response = client.create(params, max_retries=None if last else 0)
+            else:
+                response = client.create(params)
+        except Exception as e:
+            self._record(health, time.monotonic() - started, error=e)
+            raise
+        self._record(health, time.monotonic() - started)
+        return response
+
+    def _record(
+        self, health: DeploymentHealth, elapsed: float, error: Optional[Exception] = None
+    ):
+        with _health_lock:
+            health.in_flight -= 1
+            health.requests += 1
+            health.outcomes.append(error is None)
+            if error is None:
+                health.latencies.append(elapsed)
+                health.failures = 0
+                return
+            health.errors += 1
+            # Running out of quota is not a health problem; the limiter
+            # already steers traffic away until it recovers
+            if is_rate_limit_error(error):
+                return
+            health.failures += 1
+            if health.failures >= EJECT_AFTER_FAILURES:
+                cooldown = min(MAX_EJECT_SECONDS, EJECT_SECONDS * 2**health.ejections)
+                health.ejected_until = time.monotonic() + cooldown
+                health.ejections += 1
+                health.failures = 0
+                logger.warning(
+                    f"Deployment {health.name} ejected for {cooldown:.0f}s "
+                    f"after {EJECT_AFTER_FAILURES} failures"
+                )
+
+    # The deployments share one client type, so any of them can read a response
+    def message_retrieval(self, response: Any) -> List[Any]:
+        return self.clients[0].message_retrieval(response)
+
+    def cost(self, response: Any) -> float:
+        return self.clients[0].cost(response)
+
+    def get_usage(self, response: Any) -> Dict[str, Any]:
+        return self.clients[0].get_usage(response)
+
+
+def route_deployments(client: Any):
+    """
+    Replace the model clients of an autogen ``OpenAIWrapper`` with one
+    ``DeploymentRouter`` when its config_list has several deployments
+    """
+    if len(client._clients) < 2:
+        return
+    if any(isinstance(c, PlaceHolderClient) for c in client._clients):
+        return
+    router = DeploymentRouter(client._clients, client._config_list)
+    client._clients = [router]
+    client._config_list = client._config_list[:1]
+
+
+def routing_stats() -> Dict[str, Dict[str, Any]]:
+    """``DeploymentHealth.stats()`` per deployment that has been routed to"""
+    with _health_lock:
+        return {name: health.stats() for name, health in _health.items()}
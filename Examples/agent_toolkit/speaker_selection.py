@@ -0,0 +1,190 @@
+"""
+Cheap speaker selection for ``GroupChat``.
+
+``SpeakerSelector`` is passed as ``speaker_selection_method`` and picks the
+next speaker without a model call whenever it can:
+
+1. ``graph``: the declared transition graph leaves a single candidate
+2. ``mention``: the last message names exactly one candidate
+3. ``classifier``: keyword routing and a local bag-of-words classifier over
+   the agents' system messages agree on a candidate with enough confidence
+4. ``llm``: otherwise it returns ``"auto"`` and GroupChat asks the model
+
+Stats on which path decided are kept per selector and logged by ``log_stats``.
+"""
+
+import re
+import time
+import threading
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+from .tokens import message_text
+from .text_vectors import SparseVector, add_vectors, cosine, hashing_vector, tokenize
+from .tracing import current_span
+
+logger = logging.getLogger(__name__)
+
+SELECTION_PATHS = ("graph", "mention", "classifier", "llm")
+
+# Keyword matches count this many times more than system message words
+KEYWORD_WEIGHT = 3.0
+
+
+def pipeline_transitions(names: Sequence[str]) -> Dict[str, List[str]]:
+    """Transition graph where each agent hands over to the next, wrapping around"""
+    return {name: [names[(i + 1) % len(names)]] for i, name in enumerate(names)}
+
+
+class SpeakerSelector:
+    """
+    Callable ``speaker_selection_method`` that avoids the LLM selection call.
+
+    - ``transitions``: agent name -> names allowed to speak next. Agents not
+      in the graph may be followed by anyone.
+    - ``keywords``: agent name -> words that route a message to that agent
+    - ``min_similarity``: minimum classifier score of the best candidate
+    - ``min_margin``: minimum relative lead of the best candidate over the
+      runner-up, ``(best - second) / best``
+    - ``fallback``: returned when no cheap path is confident, ``"auto"``
+      (LLM selection) or ``"round_robin"``
+    """
+
+    def __init__(
+        self,
+        transitions: Optional[Dict[str, Sequence[str]]] = None,
+        keywords: Optional[Dict[str, Sequence[str]]] = None,
+        min_similarity: float = 0.05,
+        min_margin: float = 0.25,
+        fallback: str = "auto",
+    ):
+        self.transitions = {k: list(v) for k, v in (transitions or {}).items()}
+        self.keywords = {k: list(v) for k, v in (keywords or {}).items()}
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.fallback = fallback
+        self._profiles: Dict[str, SparseVector] = {}
+        self._counts = Counter()
+        self._seconds = 0.0
+        self._lock = threading.Lock()
+
+    def groupchat_kwargs(self, agents: Sequence[Any]) -> Dict[str, Any]:
+        """
+        ``GroupChat`` arguments that install this selector. The transition
+        graph is passed on too, so the LLM fallback is restricted to it.
+        """
+        kwargs: Dict[str, Any] = {"speaker_selection_method": self}
+        if self.transitions:
+            by_name = {agent.name: agent for agent in agents}
+            kwargs["allowed_or_disallowed_speaker_transitions"] = {
+                agent: [by_name[n] for n in self.transitions.get(agent.name, by_name)]
+                for agent in agents
+            }
+            kwargs["speaker_transitions_type"] = "allowed"
+        return kwargs
+
+    def __call__(self, last_speaker: Any, groupchat: Any) -> Union[Any, str]:
+        started = time.perf_counter()
+        path, speaker = self.select(last_speaker, groupchat)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._counts[path] += 1
+            self._seconds += elapsed
+        current_span().set(selection_path=path)
+        logger.debug(
+            f"Speaker selection after {last_speaker.name}: "
+            f"{getattr(speaker, 'name', speaker)} ({path})"
+        )
+        return speaker
+
+    def select(self, last_speaker: Any, groupchat: Any):
+        """Returns ``(path, agent or fallback method)``"""
+        candidates = self._candidates(last_speaker, groupchat.agents)
+        if len(candidates) == 1:
+            return "graph", candidates[0]
+        if not candidates:
+            return "llm", self.fallback
+
+        text = message_text(groupchat.messages[-1]) if groupchat.messages else ""
+
+        mentioned = [
+            agent
+            for agent in candidates
+            if re.search(rf"\b{re.escape(agent.name)}\b", text)
+        ]
+        if len(mentioned) == 1:
+            return "mention", mentioned[0]
+
+        agent = self._classify(text, candidates)
+        if agent is not None:
+            return "classifier", agent
+
+        return "llm", self.fallback
+
+    def _candidates(self, last_speaker: Any, agents: List[Any]) -> List[Any]:
+        allowed = self.transitions.get(last_speaker.name)
+        if allowed is not None:
+            return [a for a in agents if a.name in allowed]
+        return [a for a in agents if a is not last_speaker]
+
+    def _classify(self, text: str, candidates: List[Any]) -> Optional[Any]:
+        message = hashing_vector(tokenize(text))
+        if not message:
+            return None
+
+        scores = sorted(
+            ((cosine(message, self._profile(agent)), agent) for agent in candidates),
+            key=lambda item: item[0],
+            reverse=True,
+        )
+        best_score, best = scores[0]
+        second_score = scores[1][0]
+        if best_score < self.min_similarity:
+            return None
+        if (best_score - second_score) / best_score < self.min_margin:
+            return None
+        return best
+
+    def _profile(self, agent: Any) -> SparseVector:
+        profile = self._profiles.get(agent.name)
+        if profile is None:
+            text = " ".join(
+                filter(
+                    None,
+                    [
+                        getattr(agent, "system_message", ""),
+                        getattr(agent, "description", ""),
+                    ],
+                )
+            )
+            profile = add_vectors(
+                hashing_vector(tokenize(text)),
+                hashing_vector(
+                    tokenize(" ".join(self.keywords.get(agent.name, []))),
+                    weight=KEYWORD_WEIGHT,
+                ),
+            )
+            self._profiles[agent.name] = profile
+        return profile
+
+    def stats(self) -> Dict[str, Any]:
+        """How many selections each path decided, and the time spent selecting"""
+        with self._lock:
+            total = sum(self._counts.values())
+            return {
+                "selections": total,
+                "paths": {path: self._counts[path] for path in SELECTION_PATHS},
+                "llm_share": round(self._counts["llm"] / total, 4) if total else None,
+                "seconds": round(self._seconds, 6),
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self._counts.clear()
+            self._seconds = 0.0
+
+    def log_stats(self):
+        stats = self.stats()
+        paths = ", ".join(f"{path}={count}" for path, count in stats["paths"].items())
+        logger.info(f"Speaker selection: {stats['selections']} rounds ({paths})")
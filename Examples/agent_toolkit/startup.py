@@ -0,0 +1,141 @@
+"""
+Warm-up at boot for servers and scripts that build an agent team.
+
+Importing autogen and the OpenAI stack takes over a second, and building
+the team's agents and LLM clients takes more. A web server that does both
+at import time starts late, and one that does them on the first request
+makes that request slow. ``WarmUp`` runs the loading on a background
+thread as soon as the process starts, while the server already accepts
+connections; the first conversation waits for it only if it is not done:
+
+    warm_up = WarmUp(load_team).start()
+    ...
+    team = warm_up.result()
+
+The background thread is opt-in (``WARM_UP=on``). Without it, the first
+``result()`` call loads in the calling thread. A failed load, e.g. on a
+transient network or config error, is retried by the next ``result()`` or
+``start()`` once ``retry_after`` seconds have passed, doubling up to
+``max_retry_after`` while it keeps failing.
+"""
+
+import os
+import time
+import asyncio
+import threading
+import logging
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up_enabled() -> bool:
+    """True when ``WARM_UP`` is on"""
+    value = os.getenv("WARM_UP", "off").lower()
+    return value in ("1", "on", "true", "yes")
+
+
+class WarmUp:
+    """
+    Runs ``load`` once, in the background after ``start()``, and keeps its
+    result. A failure is kept until the retry backoff has passed.
+    """
+
+    def __init__(
+        self,
+        load: Callable[[], Any],
+        name: str = "warm-up",
+        retry_after: float = 5.0,
+        max_retry_after: float = 300.0,
+    ):
+        self.name = name
+        self.retry_after = retry_after
+        self.max_retry_after = max_retry_after
+        self._load = load
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._result: Any = None
+        self._error: Optional[BaseException] = None
+        self._seconds: Optional[float] = None
+        self._failures = 0
+        self._retry_at = 0.0
+
+    def _reset_if_retry_due(self):
+        # Called with the lock held; the waiters of the failed load were released
+        if not self._done.is_set() or self._error is None:
+            return
+        if time.monotonic() < self._retry_at:
+            return
+        logger.info(f"Retrying {self.name} after {self._failures} failed attempt(s)")
+        self._thread = None
+        self._error = None
+        self._done = threading.Event()
+
+    def start(self) -> "WarmUp":
+        """Start loading on a daemon thread when ``WARM_UP`` is on"""
+        if not warm_up_enabled():
+            return self
+        with self._lock:
+            self._reset_if_retry_due()
+            if self._thread is None and not self._done.is_set():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+        return self
+
+    def _run(self):
+        started = time.perf_counter()
+        try:
+            self._result = self._load()
+            self._failures = 0
+        except BaseException as e:
+            self._error = e
+            self._failures += 1
+            backoff = min(self.retry_after * 2 ** (self._failures - 1), self.max_retry_after)
+            self._retry_at = time.monotonic() + backoff
+            logger.error(f"{self.name} failed, retrying in {backoff:.1f} s: {e}", exc_info=True)
+        finally:
+            self._seconds = time.perf_counter() - started
+            self._done.set()
+        if self._error is None:
+            logger.info(f"{self.name} done in {self._seconds * 1000:.0f} ms")
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set() and self._error is None
+
+    def result(self, timeout: Optional[float] = None) -> Any:
+        """The value ``load`` returned, waiting for it or loading it here if need be"""
+        with self._lock:
+            self._reset_if_retry_due()
+            done = self._done
+            run_here = self._thread is None and not done.is_set()
+            if run_here:
+                # Not started in the background: later callers wait on this one
+                self._thread = threading.current_thread()
+        if run_here:
+            self._run()
+        elif not done.wait(timeout):
+            raise TimeoutError(f"{self.name} did not finish within {timeout} s")
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    async def a_result(self) -> Any:
+        """Like ``result``, without blocking the event loop"""
+        # A retry after a failure loads again, so only a ready result is
+        # returned on the event loop
+        if self.ready:
+            return self.result()
+        return await asyncio.to_thread(self.result)
+
+    def stats(self) -> Dict[str, Any]:
+        if not self._done.is_set():
+            status = "loading" if self._thread is not None else "not started"
+        else:
+            status = "failed" if self._error is not None else "ready"
+        return {
+            "status": status,
+            "ms": round(self._seconds * 1000, 1) if self._seconds is not None else None,
+            "error": str(self._error) if self._error is not None else None,
+        }
@@ -0,0 +1,92 @@
+"""
+Streamed completions and forwarding of their tokens to a callback.
+
+``enable_streaming`` makes the agents request streamed completions, and
+autogen then sends each content chunk to the current ``IOStream`` as a
+``StreamEvent``. ``forward_stream_deltas``
+installs an ``IOStream`` for the duration of each reply that hands those
+chunks to ``on_delta(sender_name, text)`` together with the name of the
+agent that is replying. Everything else still goes to the console.
+"""
+
+import functools
+from typing import Any, Callable, Sequence
+
+from autogen.events.client_events import StreamEvent
+from autogen.io import IOStream
+
+DeltaCallback = Callable[[str, str], None]
+
+
+class DeltaIOStream:
+    """``IOStream`` that passes ``StreamEvent`` chunks of ``sender`` to ``on_delta``"""
+
+    def __init__(self, sender: str, on_delta: DeltaCallback, base: Any):
+        self.sender = sender
+        self.on_delta = on_delta
+        self.base = base
+
+    def print(
+        self, *objects: Any, sep: str = " ", end: str = "\n", flush: bool = False
+    ):
+        self.base.print(*objects, sep=sep, end=end, flush=flush)
+
+    def send(self, message: Any):
+        if isinstance(message, StreamEvent):
+            self.on_delta(self.sender, message.content.content)
+            return
+        self.base.send(message)
+
+    def input(self, prompt: str = "", *, password: bool = False) -> str:
+        return self.base.input(prompt, password=password)
+
+
+def enable_streaming(agents: Sequence[Any]):
+    """Request streamed completions for every agent that has an LLM"""
+    for agent in agents:
+        client = getattr(agent, "client", None)
+        if client is None:
+            continue
+        # autogen 0.9 validates llm_config against a schema without "stream",
+        # but the client still honours it in its per-deployment configs.
+        # Copies, so templates and clones sharing the dicts keep their settings
+        client._config_list = [{**config, "stream": True} for config in client._config_list]
+
+
+def _delta_stream(agent: Any, on_delta: DeltaCallback) -> DeltaIOStream:
+    base = IOStream.get_default()
+    if isinstance(base, DeltaIOStream):
+        base = base.base
+    return DeltaIOStream(agent.name, on_delta, base)
+
+
+def _streamed(agent: Any, method, on_delta: DeltaCallback):
+    # The stream is reset when the reply ends, so pooled threads don't keep
+    # the callback of an earlier session; autogen carries the context
+    # variable into the executor threads it starts during the reply
+    @functools.wraps(method)
+    def streamed(*args, **kwargs):
+        with IOStream.set_default(_delta_stream(agent, on_delta)):
+            return method(*args, **kwargs)
+
+    return streamed
+
+
+def _streamed_async(agent: Any, method, on_delta: DeltaCallback):
+    @functools.wraps(method)
+    async def streamed(*args, **kwargs):
+        with IOStream.set_default(_delta_stream(agent, on_delta)):
+            return await method(*args, **kwargs)
+
+    return streamed
+
+
+def forward_stream_deltas(agents: Sequence[Any], on_delta: DeltaCallback):
+    """
+    Call ``on_delta(agent_name, text)`` for every streamed chunk of the
+    agents' replies. Use ``enable_streaming`` on the agents as well.
+    """
+    for agent in agents:
+        if getattr(agent, "llm_config", None):
+            agent.generate_reply = _streamed(agent, agent.generate_reply, on_delta)
+            agent.a_generate_reply = _streamed_async(agent, agent.a_generate_reply, on_delta)
@@ -0,0 +1,57 @@
+import re
+import math
+import zlib
+from collections import Counter
+from typing import Dict, Iterable
+
+# Sparse vectors map hashed feature index -> weight
+SparseVector = Dict[int, float]
+
+DEFAULT_DIM = 2**16
+
+_TOKEN_PATTERN = re.compile(r"[a-z][a-z0-9_]+")
+
+STOPWORDS = frozenset(
+    """a an and are as at be by for from has have in is it its of on or that the
+    this to was were will with you your we our they their can should would""".split()
+)
+
+
+def tokenize(text: str) -> list:
+    return [t for t in _TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def hash_feature(feature: str, dim: int = DEFAULT_DIM) -> int:
+    # crc32 is stable across processes, unlike the built-in hash()
+    return zlib.crc32(feature.encode("utf-8")) % dim
+
+
+def hashing_vector(
+    tokens: Iterable[str], dim: int = DEFAULT_DIM, weight: float = 1.0
+) -> SparseVector:
+    """Sublinear term-frequency vector of ``tokens`` using the hashing trick"""
+    vector: SparseVector = {}
+    for token, count in Counter(tokens).items():
+        index = hash_feature(token, dim)
+        vector[index] = vector.get(index, 0.0) + weight * (1.0 + math.log(count))
+    return vector
+
+
+def add_vectors(a: SparseVector, b: SparseVector) -> SparseVector:
+    result = dict(a)
+    for index, value in b.items():
+        result[index] = result.get(index, 0.0) + value
+    return result
+
+
+def cosine(a: SparseVector, b: SparseVector) -> float:
+    if not a or not b:
+        return 0.0
+    if len(a) > len(b):
+        a, b = b, a
+    dot = sum(value * b.get(index, 0.0) for index, value in a.items())
+    if not dot:
+        return 0.0
+    norm_a = math.sqrt(sum(v * v for v in a.values()))
+    norm_b = math.sqrt(sum(v * v for v in b.values()))
+    return dot / (norm_a * norm_b)
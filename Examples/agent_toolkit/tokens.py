@@ -0,0 +1,28 @@
+from typing import Any, Dict, List, Optional
+
+# Rough average for English text with GPT tokenizers
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Cheap token estimate that does not need a tokenizer"""
+    if not text:
+        return 0
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def message_text(message: Dict[str, Any]) -> str:
+    content = message.get("content")
+    if content is None:
+        return ""
+    if isinstance(content, list):
+        # Multimodal content: keep the text parts only
+        return "".join(
+            part.get("text", "") for part in content if isinstance(part, dict)
+        )
+    return str(content)
+
+
+def estimate_message_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Estimate prompt tokens of a chat message list, including per-message overhead"""
+    return sum(estimate_tokens(message_text(m)) + 4 for m in messages)
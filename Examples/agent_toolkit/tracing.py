@@ -0,0 +1,358 @@
+"""
+Structured tracing of conversations.
+
+With ``TRACING=on`` every span is written to ``TRACE_PATH`` when it ends,
+either as one JSON object per line (``TRACE_FORMAT=jsonl``, the default) or
+as Chrome trace events (``TRACE_FORMAT=chrome``, open the file in
+``chrome://tracing`` or https://ui.perfetto.dev). ``add_tracing`` records:
+
+- ``groupchat.round``: speaker selection plus the speaker's reply
+- ``groupchat.select_speaker``: with the ``SpeakerSelector`` path taken
+- ``agent.reply``: one agent generating its reply
+- ``llm.create``: an agent's LLM call, with ``cache_hit``
+- ``llm.request``: each request sent to the model (by ``RateLimitedClient``)
+  with queueing time and token counts, which are also summed up on every
+  enclosing span
+- ``code.execute`` and ``tool.call``: code blocks and functions run by an agent
+
+Spans nest through a context variable, so they follow the conversation into
+fan-out threads and asyncio tasks. When tracing is off, ``span`` returns a
+shared no-op object and ``add_tracing`` is not needed.
+"""
+
+import os
+import json
+import time
+import itertools
+import threading
+import contextvars
+import functools
+import logging
+from typing import Any, Dict, Optional, Sequence
+
+from autogen import GroupChatManager
+
+from .fan_out import manager_groupchats
+
+logger = logging.getLogger(__name__)
+
+_current: contextvars.ContextVar = contextvars.ContextVar("trace_span", default=None)
+_span_ids = itertools.count(1)
+
+
+def tracing_enabled() -> bool:
+    """True when ``TRACING`` is on"""
+    value = os.getenv("TRACING", "off").lower()
+    return value in ("1", "on", "true", "yes")
+
+
+class TraceExporter:
+    """Appends finished spans to a JSONL or Chrome trace file"""
+
+    def __init__(self, path: str, format: str = "jsonl"):
+        self.path = path
+        self.format = format
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+        if format == "chrome" and self._file.tell() == 0:
+            # Trace viewers accept the array without its closing bracket
+            self._file.write("[\n")
+        self._pid = os.getpid()
+
+    def export(self, span: "Span"):
+        if self.format == "chrome":
+            record = {
+                "name": span.name,
+                "cat": span.name.split(".")[0],
+                "ph": "X",
+                "ts": round(span.wall_start * 1e6),
+                "dur": round(span.duration * 1e6),
+                "pid": self._pid,
+                "tid": span.thread_id,
+                "args": {"trace_id": span.trace_id, **span.attributes},
+            }
+            line = json.dumps(record, default=str) + ",\n"
+        else:
+            record = {
+                "trace_id": span.trace_id,
+                "span_id": span.span_id,
+                "parent_id": span.parent.span_id if span.parent else None,
+                "name": span.name,
+                "start": span.wall_start,
+                "duration_ms": round(span.duration * 1000, 3),
+                "thread": span.thread_id,
+                "attributes": span.attributes,
+            }
+            line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+
+
+class Span:
+    """A timed operation; use as a context manager or call ``end``"""
+
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent",
+        "attributes",
+        "wall_start",
+        "duration",
+        "thread_id",
+        "_started",
+        "_exporter",
+        "_token",
+    )
+
+    def __init__(self, name: str, exporter: TraceExporter, attributes: Dict[str, Any]):
+        self.parent = _current.get()
+        self.span_id = next(_span_ids)
+        self.trace_id = self.parent.trace_id if self.parent else f"{self.span_id:x}-{os.getpid()}"
+        self.name = name
+        self.attributes = attributes
+        self.thread_id = threading.get_ident()
+        self.wall_start = time.time()
+        self.duration = 0.0
+        self._started = time.perf_counter()
+        self._exporter = exporter
+        self._token = None
+
+    def set(self, **attributes: Any):
+        self.attributes.update(attributes)
+
+    def add(self, **counters: float):
+        """Add to counters of this span and every enclosing span"""
+        span = self
+        while span is not None:
+            for key, amount in counters.items():
+                span.attributes[key] = span.attributes.get(key, 0) + amount
+            span = span.parent
+
+    def activate(self) -> "Span":
+        """Make this the parent of spans started afterwards in this context"""
+        self._token = _current.set(self)
+        return self
+
+    def end(self):
+        self.duration = time.perf_counter() - self._started
+        if self._token is not None:
+            _current.reset(self._token)
+            self._token = None
+        self._exporter.export(self)
+
+    def __enter__(self) -> "Span":
+        return self.activate()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        self.end()
+
+
+class _NoopSpan:
+    """Stands in for ``Span`` when tracing is off"""
+
+    __slots__ = ()
+
+    def set(self, **attributes: Any):
+        pass
+
+    def add(self, **counters: float):
+        pass
+
+    def activate(self) -> "_NoopSpan":
+        return self
+
+    def end(self):
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_UNSET = object()
+_exporter: Any = _UNSET
+_exporter_lock = threading.Lock()
+
+
+def get_trace_exporter() -> Optional[TraceExporter]:
+    """The exporter configured by ``TRACING``, ``TRACE_FORMAT`` and ``TRACE_PATH``"""
+    global _exporter
+    with _exporter_lock:
+        if _exporter is _UNSET:
+            _exporter = None
+            if tracing_enabled():
+                format = os.getenv("TRACE_FORMAT", "jsonl").lower()
+                extension = "json" if format == "chrome" else "jsonl"
+                path = os.getenv("TRACE_PATH") or os.path.join(
+                    ".cache", "traces", f"trace-{os.getpid()}.{extension}"
+                )
+                _exporter = TraceExporter(path, format)
+                logger.info(f"Writing {format} trace to {path}")
+        return _exporter
+
+
+def span(name: str, **attributes: Any) -> Any:
+    """Start a span named ``name``; a no-op when tracing is off"""
+    exporter = _exporter if _exporter is not _UNSET else get_trace_exporter()
+    if exporter is None:
+        return NOOP_SPAN
+    return Span(name, exporter, attributes)
+
+
+def current_span() -> Any:
+    """The innermost active span, or the no-op span"""
+    return _current.get() or NOOP_SPAN
+
+
+def _traced(method, name: str, attributes_of=None):
+    @functools.wraps(method)
+    def traced(*args, **kwargs):
+        with span(name, **(attributes_of(*args, **kwargs) if attributes_of else {})) as s:
+            result = method(*args, **kwargs)
+            s.set(**_result_attributes(name, result))
+            return result
+
+    return traced
+
+
+def _traced_async(method, name: str, attributes_of=None):
+    @functools.wraps(method)
+    async def traced(*args, **kwargs):
+        with span(name, **(attributes_of(*args, **kwargs) if attributes_of else {})) as s:
+            result = await method(*args, **kwargs)
+            s.set(**_result_attributes(name, result))
+            return result
+
+    return traced
+
+
+def _result_attributes(name: str, result: Any) -> Dict[str, Any]:
+    if name == "code.execute" and isinstance(result, tuple) and result:
+        return {"exit_code": result[0]}
+    if name == "llm.create" and getattr(result, "usage", None) is not None:
+        return {
+            "model": getattr(result, "model", None),
+            "prompt_tokens": result.usage.prompt_tokens,
+            "completion_tokens": result.usage.completion_tokens,
+        }
+    return {}
+
+
+def _trace_llm_create(create, agent_name: str):
+    @functools.wraps(create)
+    def traced(*args, **kwargs):
+        with span("llm.create", agent=agent_name) as s:
+            response = create(*args, **kwargs)
+            s.set(**_result_attributes("llm.create", response))
+            # Answered without a request to the model: cache or coalesced
+            s.set(cache_hit="llm_requests" not in s.attributes)
+            return response
+
+    return traced
+
+
+def _trace_groupchat(groupchat: Any):
+    if getattr(groupchat, "_traced", False):
+        return
+    groupchat._traced = True
+    rounds = {"open": None, "count": 0}
+
+    def start_round():
+        if rounds["open"] is not None:
+            rounds["open"].end()
+        rounds["count"] += 1
+        rounds["open"] = span("groupchat.round", round=rounds["count"]).activate()
+
+    def end_round(speaker: Any):
+        if rounds["open"] is not None:
+            rounds["open"].set(speaker=getattr(speaker, "name", speaker))
+            rounds["open"].end()
+            rounds["open"] = None
+
+    select_speaker = groupchat.select_speaker
+    a_select_speaker = groupchat.a_select_speaker
+    append = groupchat.append
+
+    @functools.wraps(select_speaker)
+    def traced_select_speaker(last_speaker, selector):
+        start_round()
+        with span("groupchat.select_speaker", last_speaker=last_speaker.name) as s:
+            speaker = select_speaker(last_speaker, selector)
+            s.set(speaker=speaker.name)
+            return speaker
+
+    @functools.wraps(a_select_speaker)
+    async def traced_a_select_speaker(last_speaker, selector):
+        start_round()
+        with span("groupchat.select_speaker", last_speaker=last_speaker.name) as s:
+            speaker = await a_select_speaker(last_speaker, selector)
+            s.set(speaker=speaker.name)
+            return speaker
+
+    @functools.wraps(append)
+    def traced_append(message, speaker):
+        append(message, speaker)
+        end_round(speaker)
+
+    groupchat.select_speaker = traced_select_speaker
+    groupchat.a_select_speaker = traced_a_select_speaker
+    groupchat.append = traced_append
+
+
+def add_tracing(agents: Sequence[Any]):
+    """
+    Record spans for the replies, LLM calls and code execution of
+    ``agents``, and for the rounds of any ``GroupChatManager`` among them.
+    Apply it to the agents of each conversation, not to shared templates.
+    """
+    for agent in agents:
+        if getattr(agent, "_traced", False):
+            continue
+        agent._traced = True
+        _trace_agent(agent)
+        if isinstance(agent, GroupChatManager):
+            for groupchat in manager_groupchats(agent):
+                _trace_groupchat(groupchat)
+
+
+def _trace_agent(agent: Any):
+    name = agent.name
+    work_dir = None
+    if isinstance(agent._code_execution_config, dict):
+        work_dir = agent._code_execution_config.get("work_dir")
+
+    def reply_attributes(*args, **kwargs):
+        return {"agent": name}
+
+    def code_attributes(code_blocks, **kwargs):
+        return {
+            "agent": name,
+            "work_dir": work_dir,
+            "blocks": len(code_blocks),
+            "languages": sorted({lang for lang, _ in code_blocks}),
+        }
+
+    def tool_attributes(func_call, *args, **kwargs):
+        return {"agent": name, "function": func_call.get("name")}
+
+    agent.generate_reply = _traced(agent.generate_reply, "agent.reply", reply_attributes)
+    agent.a_generate_reply = _traced_async(
+        agent.a_generate_reply, "agent.reply", reply_attributes
+    )
+    if getattr(agent, "client", None) is not None:
+        agent.client.create = _trace_llm_create(agent.client.create, name)
+    agent.execute_code_blocks = _traced(
+        agent.execute_code_blocks, "code.execute", code_attributes
+    )
+    agent.execute_function = _traced(agent.execute_function, "tool.call", tool_attributes)
+    agent.a_execute_function = _traced_async(
+        agent.a_execute_function, "tool.call", tool_attributes
+    )
@@ -1,8 +1,47 @@
 from autogen import UserProxyAgent, AssistantAgent, GroupChat, GroupChatManager
 from dotenv import load_dotenv
 import os
+import sys
+import time
+import functools
 import logging
-from typing import List, Dict, Any, Optional
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+# Add parent directory to path for the shared agent_toolkit package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent_toolkit import (
+    AgentFactory,
+    FanOutGroupChatManager,
+    SpeakerSelector,
+    add_loop_detection,
+    add_rate_limiting,
+    add_retrieval_memory,
+    add_tracing,
+    add_transcript_compaction,
+    adopt_llm,
+    azure_deployments,
+    code_execution_config,
+    compaction_stats,
+    enable_streaming,
+    fan_out_enabled,
+    get_response_cache,
+    loop_detection_enabled,
+    loop_detection_stats,
+    mock_config_list,
+    mock_groupchat_kwargs,
+    rate_limit_stats,
+    register_mock_client,
+    retrieval_groupchat_kwargs,
+    retrieval_memory_enabled,
+    retrieval_stats,
+    routing_stats,
+    span,
+    tracing_enabled,
+    transcript_compaction_enabled,
+    use_mock_backend,
+)
 
 load_dotenv()
 
@@ -12,6 +51,15 @@ logger = logging.getLogger(__name__)
 
 
 def load_config() -> List[Dict[str, Any]]:
+    # LLM_BACKEND=mock runs the agents against the offline mock model
+    if use_mock_backend():
+        return mock_config_list()
+
+    # Several deployments (e.g. one per region) are load balanced per call
+    deployments = azure_deployments()
+    if deployments:
+        return deployments
+
     required_vars = [
         "AZURE_OPENAI_MODEL",
         "AZURE_OPENAI_API_KEY",
@@ -35,7 +83,90 @@ def load_config() -> List[Dict[str, Any]]:
     ]
 
 
-def create_agents(config_list: List[Dict[str, Any]]) -> List[Any]:
+@dataclass
+class ObservableGroupChat(GroupChat):
+    """
+    GroupChat that calls ``on_new_message(sender=..., message=...)`` whenever
+    a message is appended to the chat
+    """
+
+    on_new_message: Optional[Callable[..., None]] = None
+
+    def append(self, message: Dict[str, Any], speaker):
+        super().append(message, speaker)
+        if self.on_new_message is not None:
+            self.on_new_message(sender=speaker, message=message)
+
+
+# Who may speak after whom; the Client only hears back from the planner
+ARCHITECTURE_TRANSITIONS = {
+    "Client": ["SolutionArchitect"],
+    "SolutionArchitect": ["TechnicalArchitect", "ImplementationPlanner"],
+    "TechnicalArchitect": ["SolutionArchitect", "ImplementationPlanner"],
+    "ImplementationPlanner": ["Client", "SolutionArchitect", "TechnicalArchitect"],
+}
+
+# Single words only: profiles are bags of words, so a phrase such as "sign
+# off" or "high-level" would match every message containing "off" or "high"
+ARCHITECTURE_KEYWORDS = {
+    "Client": ["approve", "approved", "feedback", "terminate"],
+    "SolutionArchitect": [
+        "requirements",
+        "components",
+        "boundaries",
+        "workflow",
+        "design",
+    ],
+    "TechnicalArchitect": [
+        "stack",
+        "security",
+        "hipaa",
+        "compliance",
+        "encryption",
+        "privacy",
+        "identity",
+    ],
+    "ImplementationPlanner": [
+        "cost",
+        "budget",
+        "estimate",
+        "effort",
+        "timeline",
+        "milestones",
+        "phases",
+        "risks",
+    ],
+}
+
+
+# Both specialists only need the SolutionArchitect's design, so with
+# GROUPCHAT_FAN_OUT=on they answer it concurrently
+ARCHITECTURE_FAN_OUT = {
+    "SolutionArchitect": ["TechnicalArchitect", "ImplementationPlanner"],
+}
+
+
+def create_speaker_selector() -> SpeakerSelector:
+    """Selects the next speaker locally and only asks the LLM when unsure"""
+    return SpeakerSelector(
+        transitions=ARCHITECTURE_TRANSITIONS, keywords=ARCHITECTURE_KEYWORDS
+    )
+
+
+def create_agents(
+    config_list: List[Dict[str, Any]],
+    compact_history: Optional[bool] = None,
+    stream: bool = True,
+    retrieval: Optional[bool] = None,
+) -> List[Any]:
+    """
+    Create the Client and the three architects. With ``compact_history``
+    (default: the ``TRANSCRIPT_COMPACTION`` setting) each architect sees a
+    compacted transcript instead of the full history. With ``retrieval``
+    (default: the ``RETRIEVAL_MEMORY`` setting) a long requirements document
+    is replaced by the excerpts relevant to each turn. With ``stream`` the
+    architects request streamed completions.
+    """
     client_user = UserProxyAgent(
         name="Client",
         human_input_mode="TERMINATE",
@@ -43,10 +174,7 @@ def create_agents(config_list: List[Dict[str, Any]]) -> List[Any]:
         is_termination_msg=lambda msg: msg.get("content", "")
         .strip()
         .endswith("TERMINATE"),
-        code_execution_config={
-            "work_dir": "output",
-            "use_docker": False,
-        },
+        code_execution_config=code_execution_config("output"),
         system_message="You are the client. Provide requirements. Reply TERMINATE when done to end the conversation.",
     )
 
@@ -84,21 +212,143 @@ def create_agents(config_list: List[Dict[str, Any]]) -> List[Any]:
         ),
     ]
 
+    # No-op unless the config selects the offline mock model
+    register_mock_client(agents)
+    # The agents share one deployment and its quota
+    add_rate_limiting(agents)
+
+    if stream:
+        enable_streaming(agents)
+
+    # Before compaction, so the compactor sees excerpts instead of documents
+    if retrieval is None:
+        retrieval = retrieval_memory_enabled()
+    if retrieval:
+        add_retrieval_memory(agents)
+
+    if compact_history is None:
+        compact_history = transcript_compaction_enabled()
+    if compact_history:
+        add_transcript_compaction(agents)
+
     return [client_user] + agents
 
 
+def create_manager(
+    groupchat: GroupChat,
+    config_list: List[Dict[str, Any]],
+    fan_out: Optional[bool] = None,
+    template: Optional[GroupChatManager] = None,
+) -> GroupChatManager:
+    """
+    Group chat manager for the team. With ``fan_out`` (default: the
+    ``GROUPCHAT_FAN_OUT`` setting) the specialists in ``ARCHITECTURE_FAN_OUT``
+    reply in parallel. With ``template`` the manager reuses the template's
+    LLM clients instead of creating its own.
+    """
+    if fan_out is None:
+        fan_out = fan_out_enabled()
+    llm_config = False if template is not None else {"config_list": config_list}
+    if fan_out:
+        manager = FanOutGroupChatManager(
+            groupchat=groupchat,
+            fan_out=ARCHITECTURE_FAN_OUT,
+            llm_config=llm_config,
+        )
+    else:
+        manager = GroupChatManager(groupchat=groupchat, llm_config=llm_config)
+    if template is not None:
+        adopt_llm(manager, template)
+    else:
+        register_mock_client([manager])
+    # Also rate limits the speaker selection of this manager's group chat
+    add_rate_limiting([manager])
+    return manager
+
+
+@functools.lru_cache(maxsize=1)
+def team_config() -> List[Dict[str, Any]]:
+    """``load_config()`` of the process-wide team, read once"""
+    return load_config()
+
+
+def _build_team_templates() -> List[Any]:
+    config = team_config()
+    agents = create_agents(config, compact_history=False, retrieval=False)
+    # Never runs a chat; it only holds the LLM clients the managers reuse
+    manager = create_manager(GroupChat(agents=[], messages=[]), config, fan_out=False)
+    return agents + [manager]
+
+
+# The team and its LLM clients are built once per process and cloned for
+# every conversation, so sessions share HTTP connections and setup work
+team_factory = AgentFactory(_build_team_templates)
+
+
+def create_session(
+    on_new_message: Optional[Callable[..., None]] = None, max_round: int = 15
+) -> Tuple[List[Any], GroupChatManager, SpeakerSelector]:
+    """
+    Agents, group chat manager and speaker selector for one conversation,
+    cloned from ``team_factory``. ``on_new_message`` is passed to the
+    ``ObservableGroupChat``.
+    """
+    # The first session builds the templates; that is reported as build_ms
+    team_factory.templates()
+    started = time.perf_counter()
+    config = team_config()
+    agents = team_factory.agents(
+        ["Client", "SolutionArchitect", "TechnicalArchitect", "ImplementationPlanner"]
+    )
+    # Retrieval memory and compaction keep per-conversation state, so each
+    # session gets its own
+    if retrieval_memory_enabled():
+        add_retrieval_memory(agents)
+    if transcript_compaction_enabled():
+        add_transcript_compaction(agents)
+
+    speaker_selector = create_speaker_selector()
+    groupchat = ObservableGroupChat(
+        agents=agents,
+        messages=[],
+        max_round=max_round,
+        **speaker_selector.groupchat_kwargs(agents),
+        **retrieval_groupchat_kwargs(agents),
+        on_new_message=on_new_message,
+        **mock_groupchat_kwargs(config),
+    )
+    manager = create_manager(
+        groupchat, config, template=team_factory.template("chat_manager")
+    )
+    # Ends conversations that go round in circles (LOOP_POLICY)
+    if loop_detection_enabled():
+        add_loop_detection(manager)
+    if tracing_enabled():
+        add_tracing(agents + [manager])
+    team_factory.record_setup(time.perf_counter() - started)
+    return agents, manager, speaker_selector
+
+
 def main(custom_task: Optional[str] = None):
     try:
         config = load_config()
         agents = create_agents(config)
 
+        speaker_selector = create_speaker_selector()
         groupchat = GroupChat(
-            agents=agents, messages=[], max_round=10, speaker_selection_method="auto"
+            agents=agents,
+            messages=[],
+            max_round=10,
+            **speaker_selector.groupchat_kwargs(agents),
+            **retrieval_groupchat_kwargs(agents),
+            **mock_groupchat_kwargs(config),
         )
 
-        manager = GroupChatManager(
-            groupchat=groupchat, llm_config={"config_list": config}
-        )
+        manager = create_manager(groupchat, config)
+        if loop_detection_enabled():
+            add_loop_detection(manager)
+        if tracing_enabled():
+            add_tracing(agents + [manager])
 
         logger.info("Starting architecture design session...")
 
@@ -114,10 +364,38 @@ def main(custom_task: Optional[str] = None):
         6. The system need to design based on Azure Cloud Platform
         """
         )
-        agents[0].initiate_chat(
-            manager,
-            message=task,
-        )
+        cache = get_response_cache()
+        with span("conversation", team="architecture_design"):
+            agents[0].initiate_chat(
+                manager,
+                message=task,
+                cache=cache,
+            )
+
+        speaker_selector.log_stats()
+        for name, stats in compaction_stats(agents).items():
+            logger.info(
+                f"{name} transcript compaction: {stats['tokens_saved']} tokens saved "
+                f"over {stats['rounds']} rounds {stats['tokens_saved_by_round']}"
+            )
+        for name, stats in retrieval_stats(agents).items():
+            logger.info(
+                f"{name} retrieval memory: {stats['tokens_saved']} tokens saved over "
+                f"{stats['rounds']} rounds, history {stats['tokens_after_by_round']}"
+            )
+        loops = loop_detection_stats(manager)
+        if loops is not None:
+            logger.info(
+                f"Loop detection: {len(loops['detections'])} loops, "
+                f"{loops['rounds_saved']} rounds and ~{loops['tokens_saved_estimate']} "
+                f"tokens saved"
+            )
+        if cache is not None:
+            logger.info(f"LLM response cache: {cache.stats()}")
+        for deployment, stats in rate_limit_stats().items():
+            logger.info(f"Rate limiter {deployment}: {stats}")
+        for deployment, stats in routing_stats().items():
+            logger.info(f"Deployment {deployment}: {stats}")
 
     except Exception as e:
         logger.error(f"Error: {e}")
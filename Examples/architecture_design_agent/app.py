@@ -2,20 +2,25 @@ import os
 import sys
 import json
 import time
+import functools
 from flask import Flask, render_template, request, jsonify, Response
 from flask_cors import CORS
-import threading
 import logging
-from queue import Queue
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from ai_agents import (
-    load_config,
-    create_agents,
+# Only the light modules here; the warm-up imports the agents and autogen
+from agent_toolkit import WarmUp
+from sessions import (
+    ConversationCancelled,
+    SessionRegistry,
+    merge_deltas,
+    message_callback,
+    messages_payload,
+    parse_message_id,
 )
-from autogen import GroupChat, GroupChatManager
+from scheduler import ConversationScheduler, SchedulerFull
 
 app = Flask(__name__)
 CORS(app)
@@ -24,156 +29,107 @@ CORS(app)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Global message store
-messages_queue = Queue()
-all_messages = []
-is_conversation_active = False
+# Idle time after which the SSE stream sends a keep-alive comment
+KEEPALIVE_SECONDS = 15
 
+# Token deltas are batched into at most one SSE event per interval
+DELTA_FLUSH_SECONDS = 0.05
 
-def message_callback(sender=None, message=None, **kwargs):
+
+def load_team():
     """
-    Callback function to capture messages from the agent conversation
+    Import the agents, and with them autogen and the OpenAI stack, and build
+    the team's templates. Runs once per process, on the warm-up thread.
     """
-    global all_messages
-    try:
-        logger.info(
-            f"Message callback triggered with sender: {sender}, kwargs: {kwargs.keys()}"
-        )
-
-        # Get sender name
-        if sender and hasattr(sender, "name"):
-            sender_name = sender.name
-        elif sender:
-            sender_name = str(sender)
-        else:
-            sender_name = "Unknown"
-
-        # Get message content
-        if message:
-            if isinstance(message, dict):
-                content = message.get("content", "")
-            else:
-                content = str(message)
-        else:
-            content = "No content"
+    import ai_agents
 
-        logger.info(f"Processing message from {sender_name}: {content[:100]}...")
+    ai_agents.team_factory.templates()
+    return ai_agents
 
-        # Create message object
-        msg = {"sender": sender_name, "content": content}
 
-        # Add message to global store
-        messages_queue.put(msg)
-        all_messages.append(msg)
+# Started at import, so the server accepts requests while the team is built
+# and the first conversation usually finds it ready (WARM_UP=on). With the
+# debug reloader, only the child process that serves requests starts it
+warm_up = WarmUp(load_team, name="Team warm-up")
+if os.environ.get("WERKZEUG_RUN_MAIN") == "true" or not app.debug:
+    warm_up.start()
 
-        logger.info(
-            f"Message collected and stored, current message count: {len(all_messages)}"
-        )
-    except Exception as e:
-        logger.error(f"Error collecting message: {e}", exc_info=True)
+# Conversation sessions keyed by session id
+sessions = SessionRegistry(
+    max_sessions=int(os.getenv("MAX_SESSIONS", "100")),
+    ttl_seconds=float(os.getenv("SESSION_TTL_SECONDS", "3600")),
+)
 
 
-def run_conversation(task):
-    """Run the agent conversation with the given task"""
-    global all_messages, is_conversation_active
-    all_messages = []  # Reset messages
-    is_conversation_active = True
+def run_conversation(session):
+    """Run the agent conversation for the given session"""
+    task = session.task
+    resume = session.resume
 
     # Add initial system message
-    all_messages.append({"sender": "System", "content": "Conversation started"})
+    session.add_message("System", "Conversation resumed" if resume else "Conversation started")
     logger.info("Added initial system message")
 
-    # Manually add the initial message from the user/client
-    user_message = {"sender": "Client", "content": task}
-    all_messages.append(user_message)
-    logger.info("Added user task message to message store")
-
     try:
-        # Load configuration and create agents
-        logger.info("Loading config and creating agents...")
-        config = load_config()
-        agents = create_agents(config)
-        logger.info(f"Created {len(agents)} agents")
-
-        # Custom message monitor to capture conversation
-        def monitor_messages(groupchat):
-            logger.info("Message monitor initialized")
-            last_msg_count = len(groupchat.messages)
-
-            # Check for messages every second
-            while is_conversation_active:
-                current_count = len(groupchat.messages)
-                if current_count > last_msg_count:
-                    # New messages have been added
-                    new_messages = groupchat.messages[last_msg_count:current_count]
-                    logger.info(f"Found {len(new_messages)} new messages in groupchat")
-
-                    for msg in new_messages:
-                        try:
-                            if (
-                                isinstance(msg, dict)
-                                and "name" in msg
-                                and "content" in msg
-                            ):
-                                # Format message from groupchat
-                                msg_obj = {
-                                    "sender": msg["name"],
-                                    "content": msg["content"],
-                                }
-                                all_messages.append(msg_obj)
-                                logger.info(f"Added message from {msg['name']}")
-                            else:
-                                logger.warning(
-                                    f"Unexpected message format: {type(msg)}"
-                                )
-                        except Exception as e:
-                            logger.error(
-                                f"Error processing message: {e}", exc_info=True
-                            )
-
-                    last_msg_count = current_count
-
-                time.sleep(1)
-
-            logger.info("Message monitor stopped")
-
-        # Create group chat with the callback
-        logger.info("Creating GroupChat...")
-        groupchat = GroupChat(
-            agents=agents, messages=[], max_round=15, speaker_selection_method="auto"
+        # Waits only for conversations that arrive during the warm-up
+        team = warm_up.result()
+        from agent_toolkit import (
+            add_checkpointing,
+            forward_stream_deltas,
+            get_response_cache,
+            span,
         )
 
-        # Set on_new_message callback
-        groupchat.on_new_message = message_callback
-        logger.info("Message callback registered to GroupChat")
-
-        # Create manager
-        manager = GroupChatManager(
-            groupchat=groupchat, llm_config={"config_list": config}
+        # Clone the agents and group chat manager for this session. The
+        # callback pushes every appended message (including the client's
+        # task) to the session, which wakes up the SSE subscribers
+        agents, manager, speaker_selector = team.create_session(
+            on_new_message=functools.partial(message_callback, session)
         )
-
-        # Start the message monitor in a separate thread
-        monitor_thread = threading.Thread(target=monitor_messages, args=(groupchat,))
-        monitor_thread.daemon = True
-        monitor_thread.start()
-        logger.info("Started message monitor thread")
-
-        # Start conversation
+        # Streamed tokens are shown in the UI while each reply is generated
+        forward_stream_deltas(agents, session.add_delta)
+        session.stop_on_cancel(agents)
+        # With CHECKPOINTS=on every round is saved, so a failed conversation can be resumed
+        checkpointer = add_checkpointing(manager, session.session_id)
+        resumed = checkpointer.restore() if resume and checkpointer else None
+        logger.info(f"Session setup: {team.team_factory.stats()}")
+
+        # Start conversation, or continue it from the last checkpoint
         logger.info("Starting architecture design session...")
-        agents[0].initiate_chat(manager, message=task)
+        with span("conversation", session_id=session.session_id, resumed=bool(resumed)):
+            if resumed:
+                speaker, message = resumed
+                speaker.initiate_chat(
+                    manager, message=message, clear_history=False, cache=get_response_cache()
+                )
+            else:
+                agents[0].initiate_chat(manager, message=task, cache=get_response_cache())
+        if checkpointer is not None:
+            checkpointer.finish()
 
-        # Wait for message monitor to catch up
-        time.sleep(2)
+        logger.info(
+            f"Conversation {session.session_id} completed, collected {session.message_count()} messages"
+        )
+        speaker_selector.log_stats()
+        session.finish()
 
-        logger.info(f"Conversation completed, collected {len(all_messages)} messages")
-        is_conversation_active = False
-        return all_messages
+    except ConversationCancelled:
+        logger.info(f"Conversation {session.session_id} cancelled")
+        session.add_message("System", "Conversation cancelled")
+        session.finish()
 
     except Exception as e:
         logger.error(f"Error in conversation: {e}", exc_info=True)
-        all_messages.append({"sender": "System", "content": f"Error: {str(e)}"})
-        is_conversation_active = False
-        return all_messages
+        session.add_message("System", f"Error: {str(e)}")
+        session.finish()
+
+
+# Fixed pool of conversation workers with a bounded admission queue
+scheduler = ConversationScheduler(
+    run_conversation,
+    max_workers=int(os.getenv("MAX_CONCURRENT_CONVERSATIONS", "4")),
+    max_queue=int(os.getenv("MAX_QUEUED_CONVERSATIONS", "20")),
+)
 
 
 @app.route("/")
@@ -181,6 +137,19 @@ def index():
     return render_template("index.html")
 
 
+@app.route("/ready")
+def ready():
+    """
+    Readiness probe for load balancers and autoscalers: 503 while the team
+    is still being built, 200 once conversations start without waiting
+    """
+    # Builds the team again if it failed and its retry backoff has passed
+    warm_up.start()
+    stats = warm_up.stats()
+    status_code = 503 if stats["status"] in ("loading", "failed") else 200
+    return jsonify({"warm_up": stats}), status_code
+
+
 @app.route("/start_conversation", methods=["POST"])
 def start_conversation():
     try:
@@ -190,66 +159,199 @@ def start_conversation():
         if not task:
             return jsonify({"error": "Task is required"}), 400
 
-        # Run conversation in a separate thread
-        conversation_thread = threading.Thread(target=run_conversation, args=(task,))
-        conversation_thread.daemon = True
-        conversation_thread.start()
+        session = sessions.create(task)
+
+        # A worker thread runs the conversation once a slot is free
+        try:
+            position = scheduler.submit(session, priority=int(data.get("priority", 0)))
+        except SchedulerFull as e:
+            sessions.discard(session.session_id)
+            return _too_many_requests(e.retry_after)
 
         # Return immediately with initial status
-        return jsonify({"status": "started", "message": "Conversation started"})
+        return jsonify(
+            {
+                "status": "queued" if position else "started",
+                "message": "Conversation queued" if position else "Conversation started",
+                "session_id": session.session_id,
+                "queue_position": position,
+            }
+        )
 
     except Exception as e:
         logger.error(f"Error starting conversation: {e}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
 
+def _too_many_requests(retry_after: int):
+    response = jsonify(
+        {
+            "error": "Too many conversations, please retry later",
+            "retry_after": retry_after,
+        }
+    )
+    response.status_code = 429
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+@app.route("/session_status")
+def session_status():
+    """Status of a session and, while it waits, its position in the queue"""
+    session = sessions.get(request.args.get("session_id"))
+    if session is None:
+        return jsonify({"error": "Unknown session"}), 404
+
+    return jsonify(
+        {
+            "session_id": session.session_id,
+            "status": session.status,
+            "is_active": session.is_active,
+            "queue_position": scheduler.position(session.session_id),
+            "scheduler": scheduler.stats(),
+        }
+    )
+
+
+@app.route("/cancel_conversation", methods=["POST"])
+def cancel_conversation():
+    """Cancel a queued or running session"""
+    data = request.json or {}
+    session = sessions.get(data.get("session_id"))
+    if session is None:
+        return jsonify({"error": "Unknown session"}), 404
+
+    cancelled = scheduler.cancel(session)
+    return jsonify({"cancelled": cancelled, "status": session.status})
+
+
+@app.route("/resume_conversation", methods=["POST"])
+def resume_conversation():
+    """
+    Resume a failed or cancelled session from its last checkpoint, so only
+    the remaining rounds run. Also works for sessions of an earlier process.
+    """
+    data = request.json or {}
+    session_id = data.get("session_id")
+    from agent_toolkit import checkpoint_messages, get_checkpoint_store
+
+    store = get_checkpoint_store()
+    checkpoint = store.load(session_id) if store is not None and session_id else None
+    if checkpoint is None:
+        return jsonify({"error": "No checkpoint for this session"}), 404
+
+    session = sessions.get(session_id)
+    if session is None:
+        messages = checkpoint_messages(checkpoint)
+        session = sessions.restore(session_id, messages[0].get("content", ""), messages)
+    if not session.reopen():
+        return jsonify({"error": "Conversation is still running"}), 409
+
+    try:
+        position = scheduler.submit(session, priority=int(data.get("priority", 0)))
+    except SchedulerFull as e:
+        session.finish()
+        return _too_many_requests(e.retry_after)
+
+    return jsonify(
+        {
+            "status": "queued" if position else "started",
+            "message": f"Conversation resumed at round {checkpoint['round'] + 1}",
+            "session_id": session.session_id,
+            "queue_position": position,
+        }
+    )
+
+
 @app.route("/stream_messages")
 def stream_messages():
-    """Server-sent events endpoint for streaming messages"""
+    """
+    Server-sent events endpoint for streaming messages.
+
+    Each event carries the id of its last message, so a reconnecting
+    EventSource resumes after ``Last-Event-ID`` instead of replaying the
+    whole transcript. ``?after=<id>`` sets the cursor for new connections.
+    Tokens of replies still being generated arrive as ``delta`` events.
+    """
+    session = sessions.get(request.args.get("session_id"))
+    if session is None:
+        return jsonify({"error": "Unknown session"}), 404
+
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("after")
+    start_id = parse_message_id(last_event_id)
 
     def event_stream():
-        last_message_count = 0
+        last_message_id = start_id
+        # Deltas are not resumable; a new connection gets all pending ones
+        last_delta_seq = 0
 
         while True:
-            current_count = len(all_messages)
+            is_active = session.is_active
+            # Block until the conversation pushes a message or tokens, or finishes
+            new_messages, deltas = session.wait_for_updates(
+                last_message_id, last_delta_seq, timeout=KEEPALIVE_SECONDS
+            )
+
+            if deltas:
+                last_delta_seq = deltas[-1]["seq"]
+                data = json.dumps({"deltas": merge_deltas(deltas)})
+                yield f"event: delta\ndata: {data}\n\n"
+
             # Check if there are new messages
-            if current_count > last_message_count:
-                # Get only new messages
-                new_messages = all_messages[last_message_count:]
-                last_message_count = current_count
+            if new_messages:
+                last_message_id = new_messages.last_id
 
-                logger.info(
-                    f"Streaming {len(new_messages)} new messages, total: {current_count}"
+                logger.debug(
+                    f"Streaming {len(new_messages)} new messages, last id: {last_message_id}"
                 )
 
-                # Send new messages
-                data = json.dumps(
-                    {"messages": new_messages, "is_active": is_conversation_active}
-                )
-                yield f"data: {data}\n\n"
+                # Send new messages straight from the transcript's JSON
+                data = messages_payload(new_messages, is_active=is_active)
+                yield b"id: %d\ndata: %s\n\n" % (last_message_id, data)
 
             # Check if conversation is finished and all messages sent
-            elif (
-                not is_conversation_active
-                and last_message_count == current_count
-                and last_message_count > 0
-            ):
+            elif not is_active and last_message_id > 0:
                 # Send completion notice
                 logger.info("Conversation complete, sending completion notice")
                 yield f"data: {json.dumps({'complete': True})}\n\n"
                 break
 
-            time.sleep(0.5)  # Wait before checking again
+            elif session.is_active and not deltas:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+
+            if deltas:
+                # Let more tokens accumulate instead of sending one event each
+                time.sleep(DELTA_FLUSH_SECONDS)
 
     return Response(event_stream(), mimetype="text/event-stream")
 
 
 @app.route("/get_messages")
 def get_messages():
-    """Get all messages for initial load or polling"""
-    logger.info(f"Responding to /get_messages with {len(all_messages)} messages")
-    return jsonify({"messages": all_messages, "is_active": is_conversation_active})
+    """
+    Get the messages of a session for initial load or polling.
+
+    ``?after=<id>`` returns only the messages after that id.
+    """
+    session = sessions.get(request.args.get("session_id"))
+    if session is None:
+        return jsonify({"error": "Unknown session"}), 404
+
+    after = parse_message_id(request.args.get("after"))
+    is_active = session.is_active
+    messages = session.get_messages(after)
+    logger.debug(f"Responding to /get_messages with {len(messages)} messages")
+    return Response(
+        messages_payload(
+            messages,
+            is_active=is_active,
+            last_id=messages.last_id if messages else after,
+        ),
+        mimetype="application/json",
+    )
 
 
 if __name__ == "__main__":
-    app.run(debug=True, port=5000)
+    # The reloader would import this module, and warm up the team, twice
+    app.run(debug=True, port=5000, use_reloader=False)
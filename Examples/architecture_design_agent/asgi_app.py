@@ -0,0 +1,355 @@
+"""
+Asyncio-native serving mode for the architecture design web app.
+
+Serves the same routes as app.py, but every conversation runs as an asyncio
+task through autogen's ``a_initiate_chat`` and all SSE streams are multiplexed
+on a single event loop, so open streams do not each hold a thread.
+
+Run with:
+    python asgi_app.py
+or with any ASGI server:
+    hypercorn asgi_app:app --bind 0.0.0.0:5000
+"""
+
+import os
+import sys
+import json
+import asyncio
+import functools
+import logging
+from quart import Quart, render_template, request, jsonify, make_response
+from quart_cors import cors
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Only the light modules here; the warm-up imports the agents and autogen
+from agent_toolkit import WarmUp
+from sessions import (
+    ConversationCancelled,
+    SessionRegistry,
+    merge_deltas,
+    message_callback,
+    messages_payload,
+    parse_message_id,
+)
+from scheduler import AsyncConversationScheduler, SchedulerFull
+
+app = cors(Quart(__name__))
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Idle time after which the SSE stream sends a keep-alive comment
+KEEPALIVE_SECONDS = 15
+
+# Token deltas are batched into at most one SSE event per interval
+DELTA_FLUSH_SECONDS = 0.05
+
+
+def load_team():
+    """
+    Import the agents, and with them autogen and the OpenAI stack, and build
+    the team's templates. Runs once per process, on the warm-up thread.
+    """
+    import ai_agents
+
+    ai_agents.team_factory.templates()
+    return ai_agents
+
+
+# Started at import, so the server accepts requests while the team is built
+# and the first conversation usually finds it ready (WARM_UP=on)
+warm_up = WarmUp(load_team, name="Team warm-up").start()
+
+# Conversation sessions keyed by session id
+sessions = SessionRegistry(
+    max_sessions=int(os.getenv("MAX_SESSIONS", "100")),
+    ttl_seconds=float(os.getenv("SESSION_TTL_SECONDS", "3600")),
+)
+
+
+async def run_conversation(session):
+    """Run the agent conversation for the given session on the event loop"""
+    resume = session.resume
+    session.add_message("System", "Conversation resumed" if resume else "Conversation started")
+
+    try:
+        # Waits, off the event loop, only during the warm-up
+        team = await warm_up.a_result()
+        from agent_toolkit import (
+            add_checkpointing,
+            forward_stream_deltas,
+            get_response_cache,
+            span,
+        )
+
+        # Cloning the team and its hooks is blocking work, kept off the event loop
+        agents, manager, speaker_selector = await asyncio.to_thread(
+            team.create_session, on_new_message=functools.partial(message_callback, session)
+        )
+        # Streamed tokens are shown in the UI while each reply is generated
+        forward_stream_deltas(agents, session.add_delta)
+        session.stop_on_cancel(agents)
+        # With CHECKPOINTS=on every round is saved, so a failed conversation can be resumed
+        checkpointer = add_checkpointing(manager, session.session_id)
+        resumed = await asyncio.to_thread(checkpointer.restore) if resume and checkpointer else None
+        logger.info(f"Session setup: {team.team_factory.stats()}")
+
+        logger.info(f"Starting architecture design session {session.session_id}...")
+        with span("conversation", session_id=session.session_id, resumed=bool(resumed)):
+            if resumed:
+                speaker, message = resumed
+                await speaker.a_initiate_chat(
+                    manager, message=message, clear_history=False, cache=get_response_cache()
+                )
+            else:
+                await agents[0].a_initiate_chat(
+                    manager, message=session.task, cache=get_response_cache()
+                )
+        if checkpointer is not None:
+            checkpointer.finish()
+
+        logger.info(
+            f"Conversation {session.session_id} completed, collected {session.message_count()} messages"
+        )
+        speaker_selector.log_stats()
+
+    except ConversationCancelled:
+        logger.info(f"Conversation {session.session_id} cancelled")
+        session.add_message("System", "Conversation cancelled")
+
+    except asyncio.CancelledError:
+        session.add_message("System", "Conversation cancelled")
+        raise
+
+    except Exception as e:
+        logger.error(f"Error in conversation: {e}", exc_info=True)
+        session.add_message("System", f"Error: {str(e)}")
+
+    finally:
+        session.finish()
+
+
+# Fixed number of conversation workers with a bounded admission queue
+scheduler = AsyncConversationScheduler(
+    run_conversation,
+    max_workers=int(os.getenv("MAX_CONCURRENT_CONVERSATIONS", "4")),
+    max_queue=int(os.getenv("MAX_QUEUED_CONVERSATIONS", "20")),
+)
+
+
+@app.route("/")
+async def index():
+    return await render_template("index.html")
+
+
+@app.route("/ready")
+async def ready():
+    """Readiness probe: 503 while the team is still being built, then 200"""
+    # Builds the team again if it failed and its retry backoff has passed
+    warm_up.start()
+    stats = warm_up.stats()
+    status_code = 503 if stats["status"] in ("loading", "failed") else 200
+    return jsonify({"warm_up": stats}), status_code
+
+
+@app.route("/start_conversation", methods=["POST"])
+async def start_conversation():
+    try:
+        data = await request.get_json()
+        task = data.get("task", "")
+
+        if not task:
+            return jsonify({"error": "Task is required"}), 400
+
+        session = sessions.create(task)
+        try:
+            position = await scheduler.submit(
+                session, priority=int(data.get("priority", 0))
+            )
+        except SchedulerFull as e:
+            sessions.discard(session.session_id)
+            return _too_many_requests(e.retry_after)
+
+        return jsonify(
+            {
+                "status": "queued" if position else "started",
+                "message": "Conversation queued" if position else "Conversation started",
+                "session_id": session.session_id,
+                "queue_position": position,
+            }
+        )
+
+    except Exception as e:
+        logger.error(f"Error starting conversation: {e}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+
+def _too_many_requests(retry_after: int):
+    response = jsonify(
+        {
+            "error": "Too many conversations, please retry later",
+            "retry_after": retry_after,
+        }
+    )
+    response.status_code = 429
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+@app.route("/session_status")
+async def session_status():
+    """Status of a session and, while it waits, its position in the queue"""
+    session = sessions.get(request.args.get("session_id"))
+    if session is None:
+        return jsonify({"error": "Unknown session"}), 404
+
+    return jsonify(
+        {
+            "session_id": session.session_id,
+            "status": session.status,
+            "is_active": session.is_active,
+            "queue_position": scheduler.position(session.session_id),
+            "scheduler": scheduler.stats(),
+        }
+    )
+
+
+@app.route("/cancel_conversation", methods=["POST"])
+async def cancel_conversation():
+    """Cancel a queued or running session"""
+    data = await request.get_json() or {}
+    session = sessions.get(data.get("session_id"))
+    if session is None:
+        return jsonify({"error": "Unknown session"}), 404
+
+    cancelled = scheduler.cancel(session)
+    return jsonify({"cancelled": cancelled, "status": session.status})
+
+
+@app.route("/resume_conversation", methods=["POST"])
+async def resume_conversation():
+    """Resume a failed or cancelled session from its last checkpoint"""
+    data = await request.get_json() or {}
+    session_id = data.get("session_id")
+    from agent_toolkit import checkpoint_messages, get_checkpoint_store
+
+    store = get_checkpoint_store()
+    checkpoint = store.load(session_id) if store is not None and session_id else None
+    if checkpoint is None:
+        return jsonify({"error": "No checkpoint for this session"}), 404
+
+    session = sessions.get(session_id)
+    if session is None:
+        messages = checkpoint_messages(checkpoint)
+        session = sessions.restore(session_id, messages[0].get("content", ""), messages)
+    if not session.reopen():
+        return jsonify({"error": "Conversation is still running"}), 409
+
+    try:
+        position = await scheduler.submit(session, priority=int(data.get("priority", 0)))
+    except SchedulerFull as e:
+        session.finish()
+        return _too_many_requests(e.retry_after)
+
+    return jsonify(
+        {
+            "status": "queued" if position else "started",
+            "message": f"Conversation resumed at round {checkpoint['round'] + 1}",
+            "session_id": session.session_id,
+            "queue_position": position,
+        }
+    )
+
+
+@app.route("/stream_messages")
+async def stream_messages():
+    """
+    Server-sent events endpoint for streaming messages.
+
+    Each event carries the id of its last message, so a reconnecting
+    EventSource resumes after ``Last-Event-ID`` instead of replaying the
+    whole transcript. ``?after=<id>`` sets the cursor for new connections.
+    Tokens of replies still being generated arrive as ``delta`` events.
+    """
+    session = sessions.get(request.args.get("session_id"))
+    if session is None:
+        return jsonify({"error": "Unknown session"}), 404
+
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("after")
+    start_id = parse_message_id(last_event_id)
+
+    async def event_stream():
+        last_message_id = start_id
+        # Deltas are not resumable; a new connection gets all pending ones
+        last_delta_seq = 0
+
+        while True:
+            is_active = session.is_active
+            new_messages, deltas = await session.a_wait_for_updates(
+                last_message_id, last_delta_seq, timeout=KEEPALIVE_SECONDS
+            )
+
+            if deltas:
+                last_delta_seq = deltas[-1]["seq"]
+                data = json.dumps({"deltas": merge_deltas(deltas)})
+                yield f"event: delta\ndata: {data}\n\n".encode()
+
+            if new_messages:
+                last_message_id = new_messages.last_id
+                data = messages_payload(new_messages, is_active=is_active)
+                yield b"id: %d\ndata: %s\n\n" % (last_message_id, data)
+
+            elif not is_active and last_message_id > 0:
+                yield f"data: {json.dumps({'complete': True})}\n\n".encode()
+                break
+
+            elif session.is_active and not deltas:
+                yield b": keep-alive\n\n"
+
+            if deltas:
+                # Let more tokens accumulate instead of sending one event each
+                await asyncio.sleep(DELTA_FLUSH_SECONDS)
+
+    response = await make_response(
+        event_stream(),
+        {"Content-Type": "text/event-stream", "Cache-Control": "no-cache"},
+    )
+    # Streams live as long as the conversation
+    response.timeout = None
+    return response
+
+
+@app.route("/get_messages")
+async def get_messages():
+    """
+    Get the messages of a session for initial load or polling.
+
+    ``?after=<id>`` returns only the messages after that id.
+    """
+    session = sessions.get(request.args.get("session_id"))
+    if session is None:
+        return jsonify({"error": "Unknown session"}), 404
+
+    after = parse_message_id(request.args.get("after"))
+    is_active = session.is_active
+    messages = session.get_messages(after)
+    return await make_response(
+        messages_payload(
+            messages,
+            is_active=is_active,
+            last_id=messages.last_id if messages else after,
+        ),
+        {"Content-Type": "application/json"},
+    )
+
+
+if __name__ == "__main__":
+    import hypercorn.asyncio
+    from hypercorn.config import Config
+
+    config = Config()
+    config.bind = [f"0.0.0.0:{os.getenv('PORT', '5000')}"]
+    asyncio.run(hypercorn.asyncio.serve(app, config))
@@ -0,0 +1,143 @@
+"""
+Load test for the architecture design web app.
+
+Starts one or more conversations and opens many concurrent ``/stream_messages``
+connections against them, then reports how many streams the server held open
+at the same time and how quickly they were served. Conversations the server
+turns away with ``429`` are counted as rejected.
+
+Example:
+    python load_test.py --url http://localhost:5000 --streams 500 --sessions 5
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, Any, List, Optional
+
+import httpx
+
+
+class StreamStats:
+    def __init__(self):
+        self.open = 0
+        self.peak_open = 0
+        self.connected = 0
+        self.completed = 0
+        self.errors = 0
+        self.events = 0
+        self.connect_times = []
+
+    def summary(self, requested: int, elapsed: float) -> Dict[str, Any]:
+        connect_times = sorted(self.connect_times)
+
+        def percentile(p):
+            if not connect_times:
+                return None
+            index = min(len(connect_times) - 1, int(len(connect_times) * p))
+            return round(connect_times[index], 4)
+
+        return {
+            "requested_streams": requested,
+            "connected_streams": self.connected,
+            "peak_concurrent_streams": self.peak_open,
+            "completed_streams": self.completed,
+            "errors": self.errors,
+            "events_received": self.events,
+            "connect_p50_seconds": percentile(0.5),
+            "connect_p95_seconds": percentile(0.95),
+            "elapsed_seconds": round(elapsed, 2),
+        }
+
+
+async def start_session(client: httpx.AsyncClient, task: str) -> Optional[str]:
+    """Session id, or None when the server rejected the conversation"""
+    response = await client.post("/start_conversation", json={"task": task})
+    if response.status_code == 429:
+        return None
+    response.raise_for_status()
+    return response.json()["session_id"]
+
+
+async def hold_stream(
+    client: httpx.AsyncClient, session_id: str, stats: StreamStats, duration: float
+):
+    started = time.perf_counter()
+    try:
+        async with client.stream(
+            "GET", "/stream_messages", params={"session_id": session_id}
+        ) as response:
+            response.raise_for_status()
+            stats.connect_times.append(time.perf_counter() - started)
+            stats.connected += 1
+            stats.open += 1
+            stats.peak_open = max(stats.peak_open, stats.open)
+            try:
+                async for line in response.aiter_lines():
+                    if line.startswith("data: "):
+                        stats.events += 1
+                        if json.loads(line[6:]).get("complete"):
+                            stats.completed += 1
+                            break
+                    if time.perf_counter() - started > duration:
+                        break
+            finally:
+                stats.open -= 1
+    except Exception:
+        stats.errors += 1
+
+
+async def run(args) -> Dict[str, Any]:
+    limits = httpx.Limits(max_connections=args.streams + args.sessions)
+    timeout = httpx.Timeout(args.duration + 30)
+    async with httpx.AsyncClient(
+        base_url=args.url, limits=limits, timeout=timeout
+    ) as client:
+        started_ids: List[Optional[str]] = await asyncio.gather(
+            *(start_session(client, args.task) for _ in range(args.sessions))
+        )
+        session_ids = [sid for sid in started_ids if sid is not None]
+        rejected = len(started_ids) - len(session_ids)
+        if not session_ids:
+            return {"requested_sessions": args.sessions, "rejected_sessions": rejected}
+
+        stats = StreamStats()
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(
+                hold_stream(
+                    client, session_ids[i % len(session_ids)], stats, args.duration
+                )
+                for i in range(args.streams)
+            )
+        )
+        summary = stats.summary(args.streams, time.perf_counter() - started)
+        return {
+            "requested_sessions": args.sessions,
+            "rejected_sessions": rejected,
+            **summary,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--streams", type=int, default=200)
+    parser.add_argument("--sessions", type=int, default=1)
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=60,
+        help="Maximum seconds to hold each stream open",
+    )
+    parser.add_argument(
+        "--task", default="Design a URL shortener service on Azure Cloud Platform"
+    )
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""
+Admission control for conversations.
+
+At most ``max_workers`` conversations run at the same time and at most
+``max_queue`` wait in a priority queue (FIFO within a priority). When the
+queue is full, ``submit`` raises ``SchedulerFull`` with a ``retry_after``
+estimate, which the web apps turn into ``429 Too Many Requests``.
+
+``ConversationScheduler`` runs ``run_conversation(session)`` on a fixed pool
+of threads (Flask app); ``AsyncConversationScheduler`` runs the coroutine
+``run_conversation(session)`` on a fixed number of asyncio workers (ASGI app).
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+import time
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sessions import ConversationSession
+
+logger = logging.getLogger(__name__)
+
+# Retry-After used until a conversation has finished and its duration is known
+DEFAULT_RETRY_AFTER_SECONDS = 30
+
+
+class SchedulerFull(Exception):
+    """The admission queue is full"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Too many conversations, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class _AdmissionQueue:
+    """Bookkeeping shared by both schedulers; ``*_locked`` methods expect ``_lock`` held"""
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._lock = threading.Lock()
+        self._queue: List[tuple] = []
+        self._order = itertools.count()
+        self._running: Dict[str, ConversationSession] = {}
+        self._mean_duration: Optional[float] = None
+        self._rejected = 0
+        self._completed = 0
+
+    def _push_locked(self, session: ConversationSession, priority: int) -> int:
+        # Sessions that idle workers are about to pick up do not count as queued
+        free_workers = self.max_workers - len(self._running)
+        if len(self._queue) >= self.max_queue + free_workers:
+            self._rejected += 1
+            raise SchedulerFull(self._retry_after_locked())
+        # Higher priority first, then first come first served
+        heapq.heappush(self._queue, (-priority, next(self._order), session))
+        return self._wait_position_locked(session.session_id)
+
+    def _pop_locked(self) -> Optional[ConversationSession]:
+        if not self._queue:
+            return None
+        session = heapq.heappop(self._queue)[2]
+        self._running[session.session_id] = session
+        return session
+
+    def _done_locked(self, session: ConversationSession, duration: float):
+        self._running.pop(session.session_id, None)
+        self._completed += 1
+        # Moving average of conversation length, for Retry-After estimates
+        if self._mean_duration is None:
+            self._mean_duration = duration
+        else:
+            self._mean_duration = 0.8 * self._mean_duration + 0.2 * duration
+
+    def _position_locked(self, session_id: str) -> Optional[int]:
+        for position, entry in enumerate(sorted(self._queue), start=1):
+            if entry[2].session_id == session_id:
+                return position
+        return None
+
+    def _wait_position_locked(self, session_id: str) -> Optional[int]:
+        """Queue position behind the workers that are still free, 0 = starting"""
+        position = self._position_locked(session_id)
+        if position is None:
+            return 0 if session_id in self._running else None
+        free_workers = self.max_workers - len(self._running)
+        return max(0, position - free_workers)
+
+    def _cancel_locked(self, session: ConversationSession) -> Optional[bool]:
+        """
+        Cancel under the scheduler lock, so a worker cannot pick the session
+        up halfway. Returns True if it was queued, False if it is running and
+        None if it had already ended.
+        """
+        if not session.cancel():
+            return None
+        return self._remove_locked(session.session_id) is not None
+
+    def _remove_locked(self, session_id: str) -> Optional[ConversationSession]:
+        for index, entry in enumerate(self._queue):
+            if entry[2].session_id == session_id:
+                self._queue.pop(index)
+                heapq.heapify(self._queue)
+                return entry[2]
+        return None
+
+    def _retry_after_locked(self) -> int:
+        if self._mean_duration is None:
+            return DEFAULT_RETRY_AFTER_SECONDS
+        # Time until the queue has drained by one slot
+        waves = (len(self._queue) + 1) / self.max_workers
+        return max(1, math.ceil(self._mean_duration * waves))
+
+    def position(self, session_id: str) -> Optional[int]:
+        """
+        How many conversations must start before this queued one; 0 if it is
+        running or about to start, None if the scheduler does not know it
+        """
+        with self._lock:
+            return self._wait_position_locked(session_id)
+
+    def retry_after(self) -> int:
+        with self._lock:
+            return self._retry_after_locked()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "running": len(self._running),
+                "queued": len(self._queue),
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "mean_duration_seconds": round(self._mean_duration, 2)
+                if self._mean_duration is not None
+                else None,
+            }
+
+
+class ConversationScheduler(_AdmissionQueue):
+    """Runs conversations on a fixed pool of worker threads"""
+
+    def __init__(
+        self,
+        run_conversation: Callable[[ConversationSession], Any],
+        max_workers: int = 4,
+        max_queue: int = 20,
+    ):
+        super().__init__(max_workers, max_queue)
+        self._run_conversation = run_conversation
+        self._wakeup = threading.Condition(self._lock)
+        self._workers: List[threading.Thread] = []
+
+    def submit(self, session: ConversationSession, priority: int = 0) -> int:
+        """
+        Queue ``session`` and return its queue position (0 once a worker has
+        picked it up). Raises ``SchedulerFull`` when the queue is full.
+        """
+        with self._lock:
+            self._start_workers_locked()
+            position = self._push_locked(session, priority)
+            self._wakeup.notify()
+            return position
+
+    def cancel(self, session: ConversationSession) -> bool:
+        """
+        Cancel a queued or running session. A running conversation stops
+        before its next agent reply.
+        """
+        with self._lock:
+            queued = self._cancel_locked(session)
+        if queued is None:
+            return False
+        if queued:
+            # Never started, so nothing else will finish it
+            session.add_message("System", "Conversation cancelled")
+            session.finish()
+        logger.info(
+            f"Cancelled {'queued' if queued else 'running'} session {session.session_id}"
+        )
+        return True
+
+    def _start_workers_locked(self):
+        # Workers start with the first submission, so importing app.py is cheap
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(
+                target=self._work,
+                name=f"conversation-{len(self._workers)}",
+                daemon=True,
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def _work(self):
+        while True:
+            with self._lock:
+                session = self._pop_locked()
+                while session is None:
+                    self._wakeup.wait()
+                    session = self._pop_locked()
+            started = time.monotonic()
+            try:
+                session.start()
+                self._run_conversation(session)
+            except Exception as e:
+                logger.error(
+                    f"Conversation {session.session_id} failed: {e}", exc_info=True
+                )
+            finally:
+                with self._lock:
+                    self._done_locked(session, time.monotonic() - started)
+
+
+class AsyncConversationScheduler(_AdmissionQueue):
+    """Runs conversation coroutines on a fixed number of asyncio workers"""
+
+    def __init__(
+        self,
+        run_conversation: Callable[[ConversationSession], Awaitable[Any]],
+        max_workers: int = 4,
+        max_queue: int = 20,
+    ):
+        super().__init__(max_workers, max_queue)
+        self._run_conversation = run_conversation
+        self._wakeup: Optional[asyncio.Condition] = None
+        self._workers: List[asyncio.Task] = []
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    async def submit(self, session: ConversationSession, priority: int = 0) -> int:
+        """Asyncio version of ``ConversationScheduler.submit``"""
+        self._start_workers()
+        with self._lock:
+            position = self._push_locked(session, priority)
+        async with self._wakeup:
+            self._wakeup.notify()
+        return position
+
+    def cancel(self, session: ConversationSession) -> bool:
+        """Cancel a queued session, or the task of a running one"""
+        with self._lock:
+            queued = self._cancel_locked(session)
+        if queued is None:
+            return False
+        if queued:
+            session.add_message("System", "Conversation cancelled")
+            session.finish()
+        elif session.session_id in self._tasks:
+            self._tasks[session.session_id].cancel()
+        logger.info(
+            f"Cancelled {'queued' if queued else 'running'} session {session.session_id}"
+        )
+        return True
+
+    def _start_workers(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Condition()
+        while len(self._workers) < self.max_workers:
+            self._workers.append(asyncio.create_task(self._work()))
+
+    async def _work(self):
+        while True:
+            async with self._wakeup:
+                await self._wakeup.wait_for(self._has_queued)
+            with self._lock:
+                session = self._pop_locked()
+            if session is None:
+                continue
+
+            started = time.monotonic()
+            session.start()
+            task = asyncio.create_task(self._run_conversation(session))
+            self._tasks[session.session_id] = task
+            try:
+                await task
+            except asyncio.CancelledError:
+                # Keep the worker going if only this conversation was cancelled
+                if not (task.cancelled() and session.cancelled):
+                    raise
+            except Exception as e:
+                logger.error(
+                    f"Conversation {session.session_id} failed: {e}", exc_info=True
+                )
+            finally:
+                self._tasks.pop(session.session_id, None)
+                with self._lock:
+                    self._done_locked(session, time.monotonic() - started)
+
+    def _has_queued(self) -> bool:
+        with self._lock:
+            return bool(self._queue)
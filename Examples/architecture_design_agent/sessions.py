@@ -0,0 +1,368 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+import logging
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+
+from transcript import Transcript, TranscriptSlice, get_transcript_archive
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationCancelled(Exception):
+    """Raised inside a running conversation once its session is cancelled"""
+
+
+class ConversationSession:
+    """
+    Message log and status of a single design conversation.
+
+    Messages are kept in a ``Transcript`` and get an ``id`` that increases
+    monotonically from 1; reads return them as a ``TranscriptSlice``, a
+    ready-made JSON array. The transcript spills to disk when the session
+    finishes.
+
+    ``status`` moves from ``queued`` to ``running`` and ends as ``finished``
+    or ``cancelled``; queued sessions count as active. ``reopen`` makes an
+    ended session active again to resume it from its last checkpoint.
+
+    While an agent is still generating, its streamed token deltas are kept in
+    ``deltas`` with their own ``seq`` counter. They are dropped as soon as the
+    complete message from that sender is added.
+    """
+
+    def __init__(self, session_id: str, task: str):
+        self.session_id = session_id
+        self.task = task
+        self.transcript = Transcript(session_id, get_transcript_archive())
+        self.deltas: List[Dict[str, Any]] = []
+        self.delta_seq = 0
+        self.status = "queued"
+        self.is_active = True
+        self.created_at = time.time()
+        self.last_access = self.created_at
+        self.finished_at: Optional[float] = None
+        # Set by reopen: continue from the checkpoint instead of starting over
+        self.resume = False
+        # Subscribers block on this condition until a message is appended
+        # or the conversation finishes
+        self._lock = threading.Condition()
+        # asyncio subscribers, woken from whichever thread appends a message
+        self._async_waiters: List[tuple] = []
+
+    def _notify_locked(self):
+        self._lock.notify_all()
+        for loop, event in self._async_waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def add_message(self, sender: str, content: str) -> int:
+        """Append a message and return its id"""
+        with self._lock:
+            message_id = self.transcript.append(sender, content)
+            if self.deltas:
+                self.deltas = [d for d in self.deltas if d["sender"] != sender]
+            self._notify_locked()
+        return message_id
+
+    def add_delta(self, sender: str, delta: str):
+        """Record a streamed chunk of the reply ``sender`` is generating"""
+        if not delta:
+            return
+        with self._lock:
+            self.delta_seq += 1
+            self.deltas.append({"seq": self.delta_seq, "sender": sender, "delta": delta})
+            self._notify_locked()
+
+    def _has_updates_locked(self, after: int, delta_after: Optional[int]) -> bool:
+        return (
+            len(self.transcript) > after
+            or not self.is_active
+            or (
+                delta_after is not None
+                and bool(self.deltas)
+                and self.deltas[-1]["seq"] > delta_after
+            )
+        )
+
+    def _updates_locked(
+        self, after: int, delta_after: Optional[int]
+    ) -> Tuple[TranscriptSlice, List[Dict[str, Any]]]:
+        if delta_after is None:
+            return self.transcript.read(after), []
+        return (
+            self.transcript.read(after),
+            [d for d in self.deltas if d["seq"] > delta_after],
+        )
+
+    def wait_for_updates(
+        self,
+        after: int,
+        delta_after: Optional[int],
+        timeout: Optional[float] = None,
+    ) -> Tuple[TranscriptSlice, List[Dict[str, Any]]]:
+        """
+        Like ``wait_for_messages``, but also wakes up for token deltas with a
+        ``seq`` greater than ``delta_after``. Returns ``(messages, deltas)``.
+        """
+        with self._lock:
+            self._lock.wait_for(
+                lambda: self._has_updates_locked(after, delta_after), timeout
+            )
+            return self._updates_locked(after, delta_after)
+
+    async def a_wait_for_updates(
+        self,
+        after: int,
+        delta_after: Optional[int],
+        timeout: Optional[float] = None,
+    ) -> Tuple[TranscriptSlice, List[Dict[str, Any]]]:
+        """Asyncio version of ``wait_for_updates``"""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            if self._has_updates_locked(after, delta_after):
+                return self._updates_locked(after, delta_after)
+            self._async_waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                self._async_waiters.remove(waiter)
+        with self._lock:
+            return self._updates_locked(after, delta_after)
+
+    def wait_for_messages(
+        self, after: int, timeout: Optional[float] = None
+    ) -> TranscriptSlice:
+        """
+        Block until there are messages with an id greater than ``after``, the
+        conversation has finished or ``timeout`` expires, then return them
+        """
+        return self.wait_for_updates(after, None, timeout)[0]
+
+    async def a_wait_for_messages(
+        self, after: int, timeout: Optional[float] = None
+    ) -> TranscriptSlice:
+        """
+        Asyncio version of ``wait_for_messages`` that does not block the event loop
+        """
+        return (await self.a_wait_for_updates(after, None, timeout))[0]
+
+    def get_messages(self, after: int = 0) -> TranscriptSlice:
+        """Return the messages with an id greater than ``after``"""
+        with self._lock:
+            return self.transcript.read(after)
+
+    def message_count(self) -> int:
+        with self._lock:
+            return len(self.transcript)
+
+    def start(self):
+        with self._lock:
+            if self.status == "queued":
+                self.status = "running"
+
+    def finish(self):
+        with self._lock:
+            if self.status != "cancelled":
+                self.status = "finished"
+            self.is_active = False
+            self.finished_at = time.time()
+            self._notify_locked()
+            # Readers of a finished session are rare; free its memory
+            self.transcript.spill()
+
+    def reopen(self) -> bool:
+        """
+        Queue an ended session again to resume its conversation. Returns
+        False if it is still active.
+        """
+        with self._lock:
+            if self.is_active:
+                return False
+            self.status = "queued"
+            self.is_active = True
+            self.finished_at = None
+            self.resume = True
+            self._notify_locked()
+        return True
+
+    def cancel(self) -> bool:
+        """
+        Mark the session as cancelled. A running conversation stops before
+        the next agent reply. Returns False if it had already ended.
+        """
+        with self._lock:
+            if not self.is_active or self.status == "cancelled":
+                return False
+            self.status = "cancelled"
+        return True
+
+    @property
+    def cancelled(self) -> bool:
+        return self.status == "cancelled"
+
+    def raise_if_cancelled(self, *args, **kwargs):
+        """Agent hook that aborts the conversation once the session is cancelled"""
+        if self.cancelled:
+            raise ConversationCancelled(self.session_id)
+
+    def stop_on_cancel(self, agents: List[Any]):
+        """Make ``agents`` check for cancellation before every reply"""
+        for agent in agents:
+            agent.register_hook("update_agent_state", self.raise_if_cancelled)
+
+
+def merge_deltas(deltas: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """Join consecutive deltas from the same sender into one chunk"""
+    merged: List[Dict[str, str]] = []
+    for d in deltas:
+        if merged and merged[-1]["sender"] == d["sender"]:
+            merged[-1]["delta"] += d["delta"]
+        else:
+            merged.append({"sender": d["sender"], "delta": d["delta"]})
+    return merged
+
+
+def messages_payload(messages: TranscriptSlice, **fields: Any) -> bytes:
+    """
+    JSON object with ``fields`` and ``messages``, embedding the transcript's
+    JSON array as is instead of decoding and encoding it again
+    """
+    head = json.dumps(fields)[:-1] + (", " if fields else "")
+    return f'{head}"messages": '.encode() + messages.json + b"}"
+
+
+def parse_message_id(value: Optional[str]) -> int:
+    """
+    Parse a message id cursor from a query parameter or ``Last-Event-ID``
+    header, treating missing or malformed values as the start of the log
+    """
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+class SessionRegistry:
+    """
+    Thread-safe registry of conversation sessions keyed by session id.
+
+    Finished sessions are kept for ``ttl_seconds`` and at most ``max_sessions``
+    sessions are retained; the least recently used finished sessions are
+    evicted first. Active sessions are never evicted.
+    """
+
+    def __init__(self, max_sessions: int = 100, ttl_seconds: float = 3600):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions: "OrderedDict[str, ConversationSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, task: str, session_id: Optional[str] = None) -> ConversationSession:
+        session = ConversationSession(session_id or uuid.uuid4().hex, task)
+        with self._lock:
+            self._evict_locked()
+            self._sessions[session.session_id] = session
+        logger.info(f"Created session {session.session_id}")
+        return session
+
+    def get(self, session_id: Optional[str]) -> Optional[ConversationSession]:
+        if not session_id:
+            return None
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_access = time.time()
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def restore(
+        self, session_id: str, task: str, messages: List[Dict[str, Any]]
+    ) -> ConversationSession:
+        """
+        Recreate an ended session this process no longer has, e.g. after a
+        restart, from the messages of its checkpoint
+        """
+        session = self.create(task, session_id)
+        for message in messages:
+            session.add_message(message.get("name", "Unknown"), message.get("content") or "")
+        session.finish()
+        return session
+
+    def discard(self, session_id: str):
+        """Forget a session that was never started"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _drop_locked(self, session_id: str):
+        session = self._sessions.pop(session_id)
+        with session._lock:
+            session.transcript.discard()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def _evict_locked(self):
+        now = time.time()
+        evicted = [
+            sid
+            for sid, s in self._sessions.items()
+            if not s.is_active and now - (s.finished_at or now) > self.ttl_seconds
+        ]
+        for sid in evicted:
+            self._drop_locked(sid)
+
+        # Keep room for the session that is about to be added
+        overflow = len(self._sessions) - self.max_sessions + 1
+        if overflow > 0:
+            # OrderedDict iterates from least to most recently used
+            finished = [sid for sid, s in self._sessions.items() if not s.is_active]
+            for sid in finished[:overflow]:
+                self._drop_locked(sid)
+                evicted.append(sid)
+
+        if evicted:
+            logger.info(
+                f"Evicted {len(evicted)} finished sessions, {len(self._sessions)} remaining"
+            )
+
+
+def message_callback(session, sender=None, message=None, **kwargs):
+    """
+    Callback function to capture messages from the agent conversation
+    """
+    try:
+        # Get sender name
+        if sender and hasattr(sender, "name"):
+            sender_name = sender.name
+        elif sender:
+            sender_name = str(sender)
+        else:
+            sender_name = "Unknown"
+
+        # Get message content
+        if message:
+            if isinstance(message, dict):
+                content = message.get("content", "")
+            else:
+                content = str(message)
+        else:
+            content = "No content"
+
+        # Add message to the session store
+        message_id = session.add_message(sender_name, content)
+
+        # Runs for every message, so only format it when debugging
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f"Stored message {message_id} of session {session.session_id} "
+                f"from {sender_name}: {content[:100]}..."
+            )
+    except Exception as e:
+        logger.error(f"Error collecting message: {e}", exc_info=True)
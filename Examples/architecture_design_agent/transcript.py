@@ -0,0 +1,209 @@
+"""
+Compact, append-only message log of a conversation.
+
+Each message is JSON-encoded once, when it is appended, into one buffer per
+transcript; a record only keeps the interned sender name and the position
+of the message in that buffer. Messages are contiguous, so the JSON array of
+all messages after an id is a single slice of the buffer, which SSE and
+``/get_messages`` send as is instead of building and re-encoding dicts.
+
+Finished transcripts, and active ones whose buffer grows past
+``SESSION_MEMORY_KB``, move their messages to a SQLite file in
+``SESSION_SPILL_DIR`` (``TranscriptArchive``) and keep only the ones
+added later in memory.
+"""
+
+import os
+import sys
+import json
+import atexit
+import sqlite3
+import threading
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPILL_DIR = ".cache"
+
+
+class MessageRecord:
+    """Sender and buffer position of one message"""
+
+    __slots__ = ("sender", "offset", "length")
+
+    def __init__(self, sender: str, offset: int, length: int):
+        self.sender = sender
+        self.offset = offset
+        self.length = length
+
+
+class TranscriptSlice:
+    """Messages ``first_id`` to ``last_id`` of a transcript as a JSON array"""
+
+    __slots__ = ("first_id", "last_id", "json")
+
+    def __init__(self, first_id: int, last_id: int, json_array: bytes):
+        self.first_id = first_id
+        self.last_id = last_id
+        self.json = json_array
+
+    def __len__(self) -> int:
+        return self.last_id - self.first_id + 1
+
+    def __bool__(self) -> bool:
+        return self.last_id >= self.first_id
+
+    def messages(self) -> List[Dict[str, Any]]:
+        return json.loads(self.json)
+
+
+class TranscriptArchive:
+    """
+    SQLite log that transcripts spill their messages to. The file only
+    extends the memory of one process: each process uses its own file,
+    which is removed when the process exits.
+    """
+
+    def __init__(self, directory: str = DEFAULT_SPILL_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"transcripts-{os.getpid()}.sqlite")
+        if os.path.exists(self.path):
+            # Left behind by an earlier process with the same pid
+            os.remove(self.path)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            # Nothing to recover after a crash, so skip the fsyncs
+            self._conn.execute("PRAGMA synchronous=OFF")
+            self._conn.execute(
+                "CREATE TABLE messages ("
+                "session_id TEXT, id INTEGER, json BLOB, PRIMARY KEY (session_id, id))"
+            )
+        atexit.register(self.close)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def append(self, session_id: str, first_id: int, messages: List[bytes]):
+        rows = [(session_id, first_id + i, m) for i, m in enumerate(messages)]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT INTO messages VALUES (?, ?, ?)", rows)
+
+    def read(self, session_id: str, after: int, until: int) -> List[bytes]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT json FROM messages WHERE session_id = ? AND id > ? AND id <= ? "
+                "ORDER BY id",
+                (session_id, after, until),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def delete(self, session_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+
+
+_archive: Optional[TranscriptArchive] = None
+_archive_lock = threading.Lock()
+
+
+def get_transcript_archive() -> TranscriptArchive:
+    """Process-wide archive in ``SESSION_SPILL_DIR``"""
+    global _archive
+    with _archive_lock:
+        if _archive is None:
+            _archive = TranscriptArchive(
+                os.getenv("SESSION_SPILL_DIR", DEFAULT_SPILL_DIR)
+            )
+        return _archive
+
+
+class Transcript:
+    """
+    Append-only messages of one session with ids from 1. Not thread-safe;
+    ``ConversationSession`` calls it under its lock.
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        archive: Optional[TranscriptArchive] = None,
+        max_memory_bytes: Optional[int] = None,
+    ):
+        self.session_id = session_id
+        self.archive = archive
+        if max_memory_bytes is None:
+            max_memory_bytes = int(os.getenv("SESSION_MEMORY_KB", "256")) * 1024
+        self.max_memory_bytes = max_memory_bytes
+        # Messages as '{...},{...},' so that any run of them is one slice
+        self._buffer = bytearray()
+        self._records: List[MessageRecord] = []
+        # Messages 1 to _spilled are in the archive, the rest in memory
+        self._spilled = 0
+
+    def __len__(self) -> int:
+        return self._spilled + len(self._records)
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self._buffer)
+
+    def append(self, sender: str, content: str) -> int:
+        """Add a message and return its id"""
+        sender = sys.intern(sender)
+        message_id = len(self) + 1
+        encoded = json.dumps(
+            {"id": message_id, "sender": sender, "content": content},
+            ensure_ascii=False,
+        ).encode()
+        self._records.append(MessageRecord(sender, len(self._buffer), len(encoded)))
+        self._buffer += encoded
+        self._buffer += b","
+        if self.archive is not None and len(self._buffer) > self.max_memory_bytes:
+            self.spill()
+        return message_id
+
+    def read(self, after: int = 0) -> TranscriptSlice:
+        """Messages with an id greater than ``after``"""
+        after = max(0, after)
+        last_id = len(self)
+        if after >= last_id:
+            return TranscriptSlice(after + 1, after, b"[]")
+
+        parts = []
+        if after < self._spilled:
+            parts.extend(self.archive.read(self.session_id, after, self._spilled))
+        if self._records:
+            start = self._records[max(0, after - self._spilled)].offset
+            # One copy of the whole run, without the trailing comma
+            with memoryview(self._buffer) as view:
+                parts.append(view[start:-1].tobytes())
+        return TranscriptSlice(after + 1, last_id, b"[" + b",".join(parts) + b"]")
+
+    def spill(self):
+        """Move the messages in memory to the archive"""
+        if self.archive is None or not self._records:
+            return
+        with memoryview(self._buffer) as view:
+            messages = [
+                view[r.offset : r.offset + r.length].tobytes() for r in self._records
+            ]
+        self.archive.append(self.session_id, self._spilled + 1, messages)
+        self._spilled += len(self._records)
+        self._records = []
+        self._buffer = bytearray()
+        logger.debug(
+            f"Spilled {len(messages)} messages of session {self.session_id}, "
+            f"{self._spilled} archived"
+        )
+
+    def discard(self):
+        """Forget the messages, including archived ones"""
+        if self.archive is not None and self._spilled:
+            self.archive.delete(self.session_id)
+        self._records = []
+        self._buffer = bytearray()
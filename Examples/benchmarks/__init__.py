@@ -0,0 +1,3 @@
+"""
+Benchmarks for the example agent teams, run against the offline mock model.
+"""
@@ -0,0 +1,4 @@
+from .orchestration import main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+"""
+Orchestration benchmark for the example agent teams.
+
+Runs each topology against the offline mock model and measures time per
+round, time spent in speaker selection versus agent replies, memory and
+transcript growth. Results are printed as JSON.
+
+Usage (from the Examples directory):
+    python -m benchmarks --topologies architecture_team,tutorial_lab
+    python -m benchmarks --topologies synthetic --agents 3,6,12 --max-rounds 5,10,20
+    python -m benchmarks --speaker-selection auto,local --ttft 0.3
+    python -m benchmarks --topologies legal_contract --contract-tokens 1000,10000,50000 --retrieval
+    python -m benchmarks --topologies "" --startup
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import statistics
+import tracemalloc
+import contextlib
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import autogen
+from autogen import GroupChat, GroupChatManager
+
+from agent_toolkit import (
+    FanOutGroupChatManager,
+    MockModelClient,
+    add_loop_detection,
+    add_retrieval_memory,
+    add_transcript_compaction,
+    compaction_stats,
+    loop_detection_stats,
+    mock_config_list,
+    mock_groupchat_kwargs,
+    register_mock_client,
+    retrieval_groupchat_kwargs,
+    retrieval_stats,
+)
+from agent_toolkit.tokens import CHARS_PER_TOKEN, estimate_tokens, message_text
+
+from .startup import run_startup
+from .topologies import TOPOLOGIES, fan_out, speaker_selector
+
+
+@dataclass
+class InstrumentedGroupChat(GroupChat):
+    """
+    GroupChat that timestamps every appended message and times speaker selection.
+
+    ``metrics`` is a shared dict because GroupChatManager runs the chat on a
+    shallow copy of this object.
+    """
+
+    metrics: Dict[str, Any] = field(default_factory=dict)
+
+    def __post_init__(self):
+        super().__post_init__()
+        self.metrics.update(
+            appends=[], selection_seconds=[], pending_selection=0.0, history_chars=0
+        )
+
+    def select_speaker(self, last_speaker, selector):
+        started = time.perf_counter()
+        try:
+            return super().select_speaker(last_speaker, selector)
+        finally:
+            self.metrics["pending_selection"] += time.perf_counter() - started
+
+    def append(self, message, speaker):
+        super().append(message, speaker)
+        self.metrics["history_chars"] += len(message_text(message))
+        self.metrics["appends"].append(
+            (time.perf_counter(), self.metrics["history_chars"])
+        )
+        self.metrics["selection_seconds"].append(self.metrics["pending_selection"])
+        self.metrics["pending_selection"] = 0.0
+
+
+def _summary(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"mean": None, "p50": None, "p95": None, "max": None}
+    ordered = sorted(values)
+    return {
+        "mean": round(statistics.fmean(ordered), 6),
+        "p50": round(ordered[len(ordered) // 2], 6),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 6),
+        "max": round(ordered[-1], 6),
+    }
+
+
+def _agent_history_tokens(agents) -> int:
+    """Tokens held across every agent's private copy of the conversation"""
+    return sum(
+        estimate_tokens(message_text(m))
+        for agent in agents
+        for messages in agent.chat_messages.values()
+        for m in messages
+    )
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 2)
+
+
+def run_topology(
+    name: str,
+    max_round: Optional[int],
+    num_agents: Optional[int],
+    trace_memory: bool = True,
+    speaker_selection: str = "auto",
+    compaction: bool = False,
+    parallel: bool = False,
+    retrieval: bool = False,
+    contract_tokens: Optional[int] = None,
+    loop_detection: bool = False,
+) -> Dict[str, Any]:
+    config_list = mock_config_list()
+    if contract_tokens:
+        agents, default_max_round, task = TOPOLOGIES[name](
+            config_list, num_agents, contract_tokens=contract_tokens
+        )
+    else:
+        agents, default_max_round, task = TOPOLOGIES[name](config_list, num_agents)
+    max_round = max_round or default_max_round
+    if retrieval:
+        add_retrieval_memory(agents)
+
+    selector = speaker_selector(name, agents) if speaker_selection == "local" else None
+    selection_kwargs = (
+        selector.groupchat_kwargs(agents)
+        if selector
+        else {"speaker_selection_method": "auto"}
+    )
+
+    groupchat = InstrumentedGroupChat(
+        agents=agents,
+        messages=[],
+        max_round=max_round,
+        **selection_kwargs,
+        **retrieval_groupchat_kwargs(agents),
+        **mock_groupchat_kwargs(config_list),
+    )
+    if parallel:
+        manager = FanOutGroupChatManager(
+            groupchat=groupchat,
+            fan_out=fan_out(name, agents),
+            llm_config={"config_list": config_list},
+        )
+    else:
+        manager = GroupChatManager(
+            groupchat=groupchat, llm_config={"config_list": config_list}
+        )
+    register_mock_client(agents + [manager])
+    if loop_detection:
+        add_loop_detection(manager)
+    if compaction:
+        add_transcript_compaction(agents)
+
+    MockModelClient.reset_stats()
+    if trace_memory:
+        tracemalloc.start()
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        agents[0].initiate_chat(manager, message=task, silent=True)
+    wall = time.perf_counter() - started
+
+    traced_peak = None
+    if trace_memory:
+        traced_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    metrics = groupchat.metrics
+    appends = metrics["appends"]
+    round_seconds = [b[0] - a[0] for a, b in zip(appends, appends[1:])]
+    selection = metrics["selection_seconds"][1:]
+    reply = [max(0.0, r - s) for r, s in zip(round_seconds, selection)]
+
+    return {
+        "topology": name,
+        "speaker_selection": speaker_selection,
+        "compaction": compaction,
+        "retrieval": retrieval,
+        "contract_tokens": contract_tokens,
+        "loop_detection": loop_detection_stats(manager),
+        "fan_out": parallel,
+        "agents": len(agents),
+        "max_round": max_round,
+        "rounds": len(appends),
+        "wall_seconds": round(wall, 6),
+        "round_seconds": _summary(round_seconds),
+        "speaker_selection_seconds": round(sum(selection), 6),
+        "agent_reply_seconds": round(sum(reply), 6),
+        "speaker_selection_share": round(sum(selection) / sum(round_seconds), 4)
+        if round_seconds
+        else None,
+        "memory": {
+            "peak_rss_mb": _peak_rss_mb(),
+            "traced_peak_mb": round(traced_peak / 2**20, 3) if traced_peak else None,
+        },
+        "history": {
+            "groupchat_tokens_by_round": [
+                chars // CHARS_PER_TOKEN for _, chars in appends
+            ],
+            "agent_history_tokens": _agent_history_tokens(agents + [manager]),
+            "compaction": compaction_stats(agents) if compaction else None,
+            "retrieval": retrieval_stats(agents) if retrieval else None,
+        },
+        "selector": selector.stats() if selector else None,
+        "model": MockModelClient.stats(),
+    }
+
+
+def _int_list(value: str) -> List[Optional[int]]:
+    return [int(v) for v in value.split(",") if v] if value else [None]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Benchmark multi-agent orchestration against the offline mock model",
+    )
+    parser.add_argument(
+        "--topologies",
+        default="architecture_team,tutorial_lab,product_brainstorm,risk_intelligence,legal_contract",
+        help=f"Comma separated list from: {', '.join(TOPOLOGIES)}",
+    )
+    parser.add_argument(
+        "--max-rounds", default="", help="Comma separated max_round sweep"
+    )
+    parser.add_argument(
+        "--agents",
+        default="",
+        help="Comma separated agent-count sweep (synthetic topology only)",
+    )
+    parser.add_argument(
+        "--speaker-selection",
+        default="auto",
+        help="Comma separated sweep of: auto (LLM call per round), local (SpeakerSelector)",
+    )
+    parser.add_argument(
+        "--compaction",
+        action="store_true",
+        help="Compact the transcript each agent sees (TRANSCRIPT_* settings)",
+    )
+    parser.add_argument(
+        "--retrieval",
+        action="store_true",
+        help="Replace long documents by the excerpts relevant to each turn (RETRIEVAL_* settings)",
+    )
+    parser.add_argument(
+        "--loop-detection",
+        action="store_true",
+        help="End chats stuck in near-duplicate or no-progress loops (LOOP_* settings)",
+    )
+    parser.add_argument(
+        "--contract-tokens",
+        default="",
+        help="Comma separated contract size sweep in tokens (legal_contract topology only)",
+    )
+    parser.add_argument(
+        "--fan-out",
+        action="store_true",
+        help="Let independent specialists reply in parallel (FanOutGroupChatManager)",
+    )
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--ttft", type=float, default=0.0)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--reply-tokens", type=int, default=64)
+    parser.add_argument(
+        "--no-tracemalloc",
+        action="store_true",
+        help="Skip Python allocation tracing, which slows the runs down",
+    )
+    parser.add_argument(
+        "--startup",
+        action="store_true",
+        help="Also measure import and warm-up time of the apps (-X importtime)",
+    )
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    # Environment settings also reach the speaker selection agents that
+    # GroupChat creates internally
+    os.environ["MOCK_LLM_TTFT"] = str(args.ttft)
+    os.environ["MOCK_LLM_TOKENS_PER_SECOND"] = str(args.tokens_per_second)
+    os.environ["MOCK_LLM_REPLY_TOKENS"] = str(args.reply_tokens)
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("autogen").setLevel(logging.WARNING)
+
+    selection_methods = [m.strip() for m in args.speaker_selection.split(",") if m.strip()]
+    for method in selection_methods:
+        if method not in ("auto", "local"):
+            parser.error(f"Unknown speaker selection: {method}")
+
+    results = []
+    for name in [t.strip() for t in args.topologies.split(",") if t.strip()]:
+        if name not in TOPOLOGIES:
+            parser.error(f"Unknown topology: {name}")
+        agent_counts = _int_list(args.agents) if name == "synthetic" else [None]
+        contract_sizes = (
+            _int_list(args.contract_tokens) if name == "legal_contract" else [None]
+        )
+        for num_agents in agent_counts:
+            for contract_tokens in contract_sizes:
+                for max_round in _int_list(args.max_rounds):
+                    for selection in selection_methods:
+                        for _ in range(args.repeat):
+                            results.append(
+                                run_topology(
+                                    name,
+                                    max_round,
+                                    num_agents,
+                                    trace_memory=not args.no_tracemalloc,
+                                    speaker_selection=selection,
+                                    compaction=args.compaction,
+                                    parallel=args.fan_out,
+                                    retrieval=args.retrieval,
+                                    contract_tokens=contract_tokens,
+                                    loop_detection=args.loop_detection,
+                                )
+                            )
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "autogen": getattr(autogen, "__version__", None),
+            "mock": {
+                "ttft": args.ttft,
+                "tokens_per_second": args.tokens_per_second,
+                "reply_tokens": args.reply_tokens,
+            },
+        },
+        "results": results,
+    }
+    if args.startup:
+        report["startup"] = run_startup()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+    return report
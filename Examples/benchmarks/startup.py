@@ -0,0 +1,133 @@
+"""
+Startup benchmark: how long the example apps and the toolkit take to import.
+
+Each case runs in a fresh interpreter under ``python -X importtime``. The
+report gives the wall time of the process, the total import time, the
+number of modules imported and the packages that took longest, counting
+only the time spent in their own modules (the ``self`` column).
+
+Usage (from the Examples directory):
+    python -m benchmarks.startup
+    python -m benchmarks --topologies "" --startup
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+EXAMPLES_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ARCHITECTURE_DIR = os.path.join(EXAMPLES_DIR, "architecture_design_agent")
+
+# Statement run in the fresh interpreter, and whether the warm-up runs
+STARTUP_CASES: Dict[str, Dict[str, Any]] = {
+    "agent_toolkit": {"statement": "import agent_toolkit", "warm_up": False},
+    "ai_agents": {"statement": "import ai_agents", "warm_up": False},
+    "app": {"statement": "import app", "warm_up": False},
+    "asgi_app": {"statement": "import asgi_app", "warm_up": False},
+    # Import, then wait for the team the first conversation would use
+    "app_ready": {"statement": "import app; app.warm_up.result()", "warm_up": True},
+}
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """Rows of ``-X importtime`` output: module, depth, self and cumulative µs"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            rows.append(
+                {
+                    "module": name.strip(),
+                    # Nested imports are indented two spaces per level
+                    "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+                    "self_us": int(self_us),
+                    "cumulative_us": int(cumulative_us),
+                }
+            )
+        except ValueError:
+            continue
+    return rows
+
+
+def summarize(rows: List[Dict[str, Any]], top: int = 8) -> Dict[str, Any]:
+    by_package = defaultdict(int)
+    for row in rows:
+        by_package[row["module"].split(".")[0]] += row["self_us"]
+    slowest = sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "import_ms": round(sum(r["cumulative_us"] for r in rows if r["depth"] == 0) / 1000, 1),
+        "modules": len(rows),
+        "top_packages_ms": {name: round(us / 1000, 1) for name, us in slowest},
+    }
+
+
+def run_case(name: str, top: int = 8) -> Dict[str, Any]:
+    case = STARTUP_CASES[name]
+    env = dict(
+        os.environ,
+        LLM_BACKEND="mock",
+        # The apps as configured in .env.example
+        LLM_CACHE="on",
+        WARM_UP="on" if case["warm_up"] else "off",
+        PYTHONPATH=os.pathsep.join([EXAMPLES_DIR, ARCHITECTURE_DIR]),
+    )
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", case["statement"]],
+        cwd=ARCHITECTURE_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - started
+    if completed.returncode != 0:
+        return {"case": name, "error": completed.stderr.strip().splitlines()[-1:]}
+    return {
+        "case": name,
+        "wall_ms": round(wall * 1000, 1),
+        **summarize(parse_importtime(completed.stderr), top),
+    }
+
+
+def run_startup(cases: Optional[List[str]] = None, repeat: int = 1) -> List[Dict[str, Any]]:
+    """Startup results of ``cases`` (default: all), ``repeat`` runs each"""
+    results = []
+    for name in cases or list(STARTUP_CASES):
+        if name not in STARTUP_CASES:
+            raise ValueError(f"Unknown startup case: {name}")
+        for _ in range(repeat):
+            results.append(run_case(name))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.startup",
+        description="Measure import and warm-up time of the example apps",
+    )
+    parser.add_argument(
+        "--cases",
+        default=",".join(STARTUP_CASES),
+        help=f"Comma separated list from: {', '.join(STARTUP_CASES)}",
+    )
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    cases = [c.strip() for c in args.cases.split(",") if c.strip()]
+    for name in cases:
+        if name not in STARTUP_CASES:
+            parser.error(f"Unknown startup case: {name}")
+    results = run_startup(cases, args.repeat)
+    print(json.dumps({"startup": results}, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Agent team topologies used by the benchmarks.
+
+The architecture team is built with ``ai_agents.create_agents``. The tutorial
+lab and the Practices templates run their chat at import time, so their teams
+are mirrored here with the same agent names, temperatures and ``max_round``.
+"""
+
+import os
+import sys
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+from autogen import Agent, AssistantAgent, UserProxyAgent
+
+from agent_toolkit import SpeakerSelector
+from agent_toolkit.tokens import estimate_tokens
+
+EXAMPLES_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(EXAMPLES_DIR, "architecture_design_agent"))
+
+from ai_agents import (  # noqa: E402
+    ARCHITECTURE_FAN_OUT,
+    create_agents,
+    create_speaker_selector,
+)
+
+ARCHITECTURE_TASK = """
+We want to build a healthcare data platform that:
+1. Allows clinics to upload patient data securely
+2. Performs analytics on treatment effectiveness
+3. Provides insights and recommendations
+4. Must be HIPAA compliant
+5. Should scale to handle data from multiple clinics
+6. The system need to design based on Azure Cloud Platform
+"""
+
+TUTORIAL_TASK = """Generate a professional AutoGen tutorial notebook that can be used to help others learn AutoGen framework."""
+
+CONTRACT_TEXT = """
+This Agreement shall commence on the Effective Date and shall remain in effect for a period of 12 months, unless earlier terminated by either party with 30 days' notice.
+The vendor is responsible for data processing. No explicit SLA or data protection clause is defined.
+"""
+
+
+def _user_proxy(name: str) -> UserProxyAgent:
+    # Benchmarks never wait for a human or execute generated code
+    return UserProxyAgent(
+        name=name,
+        human_input_mode="NEVER",
+        max_consecutive_auto_reply=100,
+        code_execution_config=False,
+    )
+
+
+def _assistants(
+    specs: List[Tuple[str, float]], config_list: List[Dict[str, Any]]
+) -> List[AssistantAgent]:
+    return [
+        AssistantAgent(
+            name=name,
+            system_message=f"You are {name}.",
+            llm_config={
+                "config_list": config_list,
+                "temperature": temperature,
+                "max_tokens": 1024,
+                "seed": 123,
+            },
+        )
+        for name, temperature in specs
+    ]
+
+
+def architecture_team(config_list, num_agents=None):
+    agents = create_agents(config_list)
+    agents[0].human_input_mode = "NEVER"
+    return agents, 15, ARCHITECTURE_TASK
+
+
+def tutorial_lab(config_list, num_agents=None):
+    specs = [
+        ("TaskPlanner", 0.3),
+        ("ContentExpert", 0.4),
+        ("CodeDeveloper", 0),
+        ("NotebookBuilder", 0),
+        ("Evaluator", 0.4),
+    ]
+    return [_user_proxy("User")] + _assistants(specs, config_list), 15, TUTORIAL_TASK
+
+
+def product_brainstorm(config_list, num_agents=None):
+    specs = [("CreativeAgent", 0.1), ("FeasibilityExpert", 0.1), ("BusinessAnalyst", 0.1)]
+    return [_user_proxy("Founder")] + _assistants(specs, config_list), 8, "healthcare"
+
+
+def risk_intelligence(config_list, num_agents=None):
+    specs = [("ThreatModeler", 0.1), ("MitigationStrategist", 0.1), ("ImpactSimulator", 0.1)]
+    task = "Ransomware attack on a regional hospital network"
+    return [_user_proxy("CISO")] + _assistants(specs, config_list), 10, task
+
+
+CONTRACT_CLAUSES = [
+    "Term. This Agreement remains in effect for {n} months unless terminated with 30 days' notice.",
+    "Fees. The Customer pays the fees in Schedule {n} within 45 days of each invoice.",
+    "Liability. Each party's total liability under section {n} is limited to the fees paid in the prior month.",
+    "Data protection. The Vendor processes personal data for purpose {n} only on documented instructions.",
+    "Service levels. The Vendor targets {n} hours of response time for severity one incidents.",
+    "Intellectual property. Work product delivered under statement of work {n} belongs to the Customer.",
+    "Confidentiality. Confidential information disclosed under annex {n} is kept secret for five years.",
+    "Subcontracting. The Vendor may engage subcontractor {n} after written notice to the Customer.",
+]
+
+
+def synthetic_contract(tokens: int) -> str:
+    """Contract of about ``tokens`` tokens made of numbered variations of common clauses"""
+    clauses = []
+    while estimate_tokens("\n".join(clauses)) < tokens:
+        n = len(clauses) + 1
+        clause = CONTRACT_CLAUSES[len(clauses) % len(CONTRACT_CLAUSES)]
+        clauses.append(f"{n}. {clause.format(n=n)}")
+    return "\n".join(clauses)
+
+
+def legal_contract(config_list, num_agents=None, contract_tokens=None):
+    specs = [("ClauseExtractor", 0.1), ("RiskAssessor", 0.1), ("RevisionSuggester", 0.1)]
+    contract = synthetic_contract(contract_tokens) if contract_tokens else CONTRACT_TEXT
+    task = f"Please analyze the following contract:\n{contract}"
+    return [_user_proxy("LegalCounsel")] + _assistants(specs, config_list), 12, task
+
+
+def review_loop(config_list, num_agents=None):
+    """
+    A writer and a reviewer stuck repeating themselves, like the tutorial
+    lab's Evaluator saying CONTINUE with the same suggestions every round
+    """
+    user, writer, evaluator = [_user_proxy("User")] + _assistants(
+        [("Writer", 0.2), ("Evaluator", 0.4)], config_list
+    )
+    replies = {
+        writer: "Revised the plan: chapter {n} now has the tool calling demo and a memory example.",
+        evaluator: "Suggestions: 1. Add a real-world use case. 2. Add an API tool demo. "
+        "3. Cover task chaining. CONTINUE",
+    }
+    for agent, text in replies.items():
+
+        def canned_reply(recipient, messages=None, sender=None, config=None, text=text):
+            return True, text.format(n=len(messages or []))
+
+        agent.register_reply([Agent, None], canned_reply, position=0)
+    return [user, writer, evaluator], 20, TUTORIAL_TASK
+
+
+def synthetic(config_list, num_agents=4):
+    """A user proxy plus ``num_agents - 1`` generic specialists, for agent-count sweeps"""
+    specs = [(f"Specialist{i}", 0.2) for i in range(1, max(2, num_agents))]
+    return [_user_proxy("User")] + _assistants(specs, config_list), 10, ARCHITECTURE_TASK
+
+
+TOPOLOGIES: Dict[str, Callable[..., Tuple[List[Any], int, str]]] = {
+    "architecture_team": architecture_team,
+    "tutorial_lab": tutorial_lab,
+    "product_brainstorm": product_brainstorm,
+    "risk_intelligence": risk_intelligence,
+    "legal_contract": legal_contract,
+    "review_loop": review_loop,
+    "synthetic": synthetic,
+}
+
+
+# Transition graphs of the Practices templates
+PRACTICE_TRANSITIONS: Dict[str, Dict[str, List[str]]] = {
+    "product_brainstorm": {
+        "Founder": ["CreativeAgent"],
+        "CreativeAgent": ["FeasibilityExpert", "BusinessAnalyst"],
+        "FeasibilityExpert": ["BusinessAnalyst", "CreativeAgent"],
+        "BusinessAnalyst": ["Founder", "CreativeAgent"],
+    },
+    "risk_intelligence": {
+        "CISO": ["ThreatModeler"],
+        "ThreatModeler": ["MitigationStrategist", "ImpactSimulator"],
+        "MitigationStrategist": ["ImpactSimulator"],
+        "ImpactSimulator": ["CISO", "MitigationStrategist"],
+    },
+    "legal_contract": {
+        "LegalCounsel": ["ClauseExtractor"],
+        "ClauseExtractor": ["RiskAssessor"],
+        "RiskAssessor": ["RevisionSuggester", "ClauseExtractor"],
+        "RevisionSuggester": ["LegalCounsel", "RiskAssessor"],
+    },
+    "review_loop": {
+        "User": ["Writer"],
+        "Writer": ["Evaluator"],
+        "Evaluator": ["Writer"],
+    },
+}
+
+
+# Only specialists that work from the same message; legal_contract and
+# review_loop are pipelines where each step needs the previous one
+PRACTICE_FAN_OUT: Dict[str, Dict[str, List[str]]] = {
+    "product_brainstorm": {"CreativeAgent": ["FeasibilityExpert", "BusinessAnalyst"]},
+    "risk_intelligence": {"ThreatModeler": ["MitigationStrategist", "ImpactSimulator"]},
+}
+
+
+def speaker_selector(name: str, agents: Sequence[Any]) -> SpeakerSelector:
+    """The local speaker selector each topology uses in the examples"""
+    if name == "architecture_team":
+        return create_speaker_selector()
+    return SpeakerSelector(transitions=PRACTICE_TRANSITIONS.get(name))
+
+
+def fan_out(name: str, agents: Sequence[Any]) -> Dict[str, List[str]]:
+    """Fan-out rounds of each topology, as configured in the examples"""
+    if name == "architecture_team":
+        return ARCHITECTURE_FAN_OUT
+    if name == "tutorial_lab":
+        return {"TaskPlanner": ["ContentExpert", "CodeDeveloper"]}
+    if name == "synthetic":
+        # No transition graph, so every specialist may answer the user proxy
+        return {agents[0].name: [agent.name for agent in agents[1:]]}
+    return PRACTICE_FAN_OUT.get(name, {})
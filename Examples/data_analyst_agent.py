@@ -1,6 +1,15 @@
 import autogen
 import os
 from dotenv import load_dotenv
+from agent_toolkit import (
+    add_rate_limiting,
+    code_execution_config,
+    get_execution_cache,
+    get_response_cache,
+    mock_config_list,
+    register_mock_client,
+    use_mock_backend,
+)
 
 load_dotenv()
 
@@ -18,6 +27,10 @@ def main():
         }
     ]
 
+    # Set LLM_BACKEND=mock to run offline against a simulated model
+    if use_mock_backend():
+        config_list = mock_config_list()
+
     # Create an Assistant agent that will help with tasks
     # The agent uses model in the config_list
     data_analyst = autogen.AssistantAgent(
@@ -41,13 +54,17 @@ def main():
         is_termination_msg=lambda msg: msg.get("content", "")
         .rstrip()
         .endswith("TERMINATE"),
-        code_execution_config={
-            "work_dir": "coding",  # Directory where code will be executed
-            "use_docker": False,  # Don't use Docker for code execution
-        },
+        # Code runs with the local executor in "coding". With CODE_WORKERS=on it runs in a
+        # pooled, resource-limited worker process, in a scratch directory below "coding".
+        # The code fetches live stock prices: only set CODE_CACHE=on with a TTL of minutes
+        # (CODE_CACHE_TTL_HOURS=0.25), so a retry in this run is replayed but not older runs
+        code_execution_config=code_execution_config("coding"),
         system_message="Reply TERMINATE if the task has been solved at full satisfaction. Otherwise, reply CONTINUE, or the reason why the task is not solved yet.",
     )
 
+    register_mock_client([data_analyst])
+    add_rate_limiting([data_analyst])
+
     # Define the task
     task = """
     Plot a chart of Google and Apple stock price change for the last 30 days.
@@ -56,7 +73,13 @@ def main():
 
     # Initiate a chat between the Assistant Agent and User Proxy Agent
     # The assistant will help plot stock price charts for Google and Apple
-    client.initiate_chat(data_analyst, message=task)
+    # Responses are stored in the shared on-disk cache, so re-running the same task is free
+    client.initiate_chat(data_analyst, message=task, cache=get_response_cache())
+
+    # Code blocks the assistant sent again were answered from the execution cache
+    execution_cache = get_execution_cache()
+    if execution_cache is not None:
+        print(f"Code execution cache: {execution_cache.stats()}")
 
 
 if __name__ == "__main__":
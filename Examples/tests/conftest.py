@@ -0,0 +1,18 @@
+"""
+Shared setup of the unit tests: run from the repository root with
+``python -m pytest``. The tests use the offline mock model and keep every
+file they write in a temporary directory.
+"""
+
+import os
+import sys
+import tempfile
+
+EXAMPLES_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, EXAMPLES_DIR)
+sys.path.insert(0, os.path.join(EXAMPLES_DIR, "architecture_design_agent"))
+
+os.environ["LLM_BACKEND"] = "mock"
+# The transcript archive is a process-wide singleton, so set it up before
+# the first session is created
+os.environ["SESSION_SPILL_DIR"] = tempfile.mkdtemp(prefix="transcripts-")
@@ -0,0 +1,51 @@
+import json
+
+from agent_toolkit.batch import ResultWriter, completed_ids
+
+
+def write_lines(path, lines):
+    path.write_text("".join(lines), encoding="utf-8")
+
+
+def test_completed_ids_skips_line_cut_off_by_a_crash(tmp_path):
+    path = tmp_path / "results.jsonl"
+    write_lines(
+        path,
+        [
+            json.dumps({"id": "a", "status": "ok"}) + "\n",
+            json.dumps({"id": "b", "status": "error"}) + "\n",
+            '{"id": "c", "sta',
+        ],
+    )
+
+    assert completed_ids(str(path)) == {"a", "b"}
+    assert completed_ids(str(path), retry_failed=True) == {"a"}
+
+
+def test_completed_ids_of_missing_file(tmp_path):
+    assert completed_ids(str(tmp_path / "missing.jsonl")) == set()
+
+
+def test_result_writer_starts_after_a_cut_off_line(tmp_path):
+    path = tmp_path / "results.jsonl"
+    write_lines(path, [json.dumps({"id": "a", "status": "ok"}) + "\n", '{"id": "b", "st'])
+
+    writer = ResultWriter(str(path))
+    writer.write({"id": "c", "status": "ok"})
+    writer.close()
+
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert lines[1] == '{"id": "b", "st'
+    assert json.loads(lines[2]) == {"id": "c", "status": "ok"}
+    assert completed_ids(str(path)) == {"a", "c"}
+
+
+def test_result_writer_appends_to_complete_file(tmp_path):
+    path = tmp_path / "out" / "results.jsonl"
+
+    for record in ({"id": "a", "status": "ok"}, {"id": "b", "status": "ok"}):
+        writer = ResultWriter(str(path))
+        writer.write(record)
+        writer.close()
+
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 2
@@ -0,0 +1,80 @@
+import pytest
+from autogen import ConversableAgent, GroupChat, GroupChatManager
+
+from agent_toolkit.checkpoints import CheckpointStore, GroupChatCheckpointer
+
+SPEAKERS = ["User", "Architect", "Reviewer", "Architect"]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CheckpointStore(str(tmp_path / "checkpoints.sqlite"))
+
+
+def save_rounds(store, session_id, rounds, max_round=10):
+    for round_number in range(rounds):
+        speaker = SPEAKERS[round_number % len(SPEAKERS)]
+        store.append(
+            session_id,
+            round_number,
+            {"name": speaker, "role": "user", "content": f"message {round_number}"},
+            speaker,
+            max_round,
+        )
+
+
+def team(max_round=10):
+    agents = [
+        ConversableAgent(name, llm_config=False, human_input_mode="NEVER")
+        for name in ("User", "Architect", "Reviewer")
+    ]
+    groupchat = GroupChat(agents=agents, messages=[], max_round=max_round)
+    return GroupChatManager(groupchat=groupchat, llm_config=False)
+
+
+def test_load_returns_last_round_to_resume_with(store):
+    save_rounds(store, "s", 4)
+
+    state = store.load("s")
+
+    assert state["round"] == 3
+    assert state["max_round"] == 10
+    assert state["speaker"] == "Architect"
+    assert state["message"]["content"] == "message 3"
+    assert [m["content"] for m in state["messages"]] == ["message 0", "message 1", "message 2"]
+    assert state["speakers"] == SPEAKERS[:3]
+
+
+def test_round_zero_starts_a_new_conversation(store):
+    save_rounds(store, "s", 4)
+    save_rounds(store, "s", 1)
+
+    assert store.load("s")["round"] == 0
+
+
+def test_restore_runs_only_the_remaining_rounds(store):
+    save_rounds(store, "s", 4, max_round=10)
+    manager = team()
+
+    speaker, message = GroupChatCheckpointer(manager, "s", store).restore()
+
+    assert speaker.name == "Architect"
+    assert message["content"] == "message 3"
+    assert manager.groupchat.max_round == 10 - 3
+    assert len(manager.groupchat.messages) == 3
+    # The agents' histories hold the rounds before the resumed one
+    architect = manager.groupchat.agent_by_name("Architect")
+    assert len(architect.chat_messages[manager]) == 3
+
+
+def test_restore_leaves_at_least_one_round(store):
+    save_rounds(store, "s", 4, max_round=3)
+    manager = team(max_round=3)
+
+    GroupChatCheckpointer(manager, "s", store).restore()
+
+    assert manager.groupchat.max_round == 1
+
+
+def test_restore_without_checkpoint(store):
+    assert GroupChatCheckpointer(team(), "missing", store).restore() is None
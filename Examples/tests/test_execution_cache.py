@@ -0,0 +1,35 @@
+from agent_toolkit.execution_cache import code_key, normalize_code
+
+CODE = """import pandas as pd
+df = pd.read_csv("data.csv")
+print(df.describe())"""
+
+
+def test_comments_blank_lines_and_whitespace_do_not_change_key():
+    reformatted = (
+        "# Load the data\r\n"
+        "import pandas as pd   \r\n"
+        "\r\n"
+        'df = pd.read_csv("data.csv")\r\n'
+        "    # summary\r\n"
+        "print(df.describe())\r\n"
+    )
+
+    assert normalize_code(reformatted) == CODE
+    assert code_key("python", reformatted) == code_key("python", CODE)
+
+
+def test_filename_comment_changes_key():
+    saved_as = code_key("python", "# filename: stats.py\n" + CODE)
+
+    assert saved_as != code_key("python", CODE)
+    assert saved_as != code_key("python", "# filename: other.py\n" + CODE)
+
+
+def test_code_and_language_change_key():
+    assert code_key("python", CODE) != code_key("python", CODE.replace("describe", "head"))
+    assert code_key("python", "ls") != code_key("sh", "ls")
+
+
+def test_indentation_changes_key():
+    assert code_key("python", "if x:\n    y()") != code_key("python", "if x:\ny()")
@@ -0,0 +1,72 @@
+from agent_toolkit.loop_detection import LoopDetector, hamming, shingles, simhash
+
+REVIEW = (
+    "The notebook still misses the exercise on error handling and the "
+    "explanation of retries. Please add both sections and reply CONTINUE."
+)
+DRAFT = (
+    "Here is the revised notebook with a new section about agents, tools and "
+    "group chats, including runnable examples for each concept."
+)
+
+
+def message(name, content):
+    return {"name": name, "content": content}
+
+
+def test_numbers_do_not_change_shingles():
+    assert shingles("Revision 3 of the plan") == shingles("revision 4 of the plan")
+
+
+def test_simhash_of_near_duplicates_is_close():
+    near = simhash(shingles(REVIEW + " Thanks."))
+
+    assert hamming(simhash(shingles(REVIEW)), near) <= 8
+    assert hamming(simhash(shingles(REVIEW)), simhash(shingles(DRAFT))) > 8
+
+
+def test_stops_on_repeated_messages():
+    detector = LoopDetector(patience=2)
+
+    assert detector.observe(message("Evaluator", REVIEW)) is None
+    assert detector.observe(message("Developer", DRAFT)) is None
+    assert detector.observe(message("Evaluator", REVIEW)) is None
+    assert detector.observe(message("Developer", DRAFT)) == "repetition"
+    assert detector.stopped["speakers"] == ["Developer", "Evaluator"]
+
+
+def test_new_message_resets_stale_count():
+    detector = LoopDetector(patience=2)
+    detector.observe(message("Evaluator", REVIEW))
+    detector.observe(message("Evaluator", REVIEW))
+
+    assert detector.observe(message("Developer", DRAFT)) is None
+    assert detector.observe(message("Evaluator", REVIEW)) is None
+    assert detector.detections == []
+
+
+def test_rephrased_message_makes_no_progress():
+    # Only compared with the message before, which it does not resemble
+    detector = LoopDetector(window=1, max_distance=0, patience=1)
+    detector.observe(message("Evaluator", REVIEW))
+    detector.observe(message("Developer", DRAFT))
+
+    assert detector.observe(message("Evaluator", REVIEW)) == "no progress"
+
+
+def test_same_message_object_is_counted_once():
+    detector = LoopDetector(patience=2)
+    review = message("Evaluator", REVIEW)
+    detector.observe(review)
+    detector.observe(review)
+
+    assert detector.messages == 1
+
+
+def test_log_policy_only_records_loops():
+    detector = LoopDetector(policy="log", patience=1)
+    detector.observe(message("Evaluator", REVIEW))
+
+    assert detector.observe(message("Evaluator", REVIEW)) is None
+    assert detector.stopped is None
+    assert detector.detections[0]["reason"] == "repetition"
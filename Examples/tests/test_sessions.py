@@ -0,0 +1,58 @@
+import time
+
+from sessions import SessionRegistry
+
+
+def finished(registry, task):
+    session = registry.create(task)
+    session.finish()
+    return session
+
+
+def test_evicts_least_recently_used_finished_session():
+    registry = SessionRegistry(max_sessions=2)
+    first = finished(registry, "first")
+    second = finished(registry, "second")
+    # Reading a session makes it the most recently used one
+    assert registry.get(first.session_id) is first
+
+    third = registry.create("third")
+
+    assert registry.get(second.session_id) is None
+    assert registry.get(first.session_id) is first
+    assert registry.get(third.session_id) is third
+    assert len(registry) == 2
+
+
+def test_never_evicts_active_sessions():
+    registry = SessionRegistry(max_sessions=1)
+    first = registry.create("first")
+    second = registry.create("second")
+
+    assert registry.get(first.session_id) is first
+    assert registry.get(second.session_id) is second
+
+
+def test_evicts_finished_sessions_after_ttl():
+    registry = SessionRegistry(max_sessions=10, ttl_seconds=60)
+    expired = finished(registry, "expired")
+    expired.finished_at = time.time() - 120
+    recent = finished(registry, "recent")
+
+    registry.create("new")
+
+    assert registry.get(expired.session_id) is None
+    assert registry.get(recent.session_id) is recent
+
+
+def test_restore_keeps_messages_of_checkpoint():
+    registry = SessionRegistry()
+    session = registry.restore(
+        "restored",
+        "task",
+        [{"name": "User", "content": "task"}, {"name": "Architect", "content": None}],
+    )
+
+    assert registry.get("restored") is session
+    assert not session.is_active
+    assert session.message_count() == 2
@@ -1,11 +1,32 @@
 from random import seed
 from autogen import AssistantAgent, UserProxyAgent, GroupChat, GroupChatManager
 from dotenv import load_dotenv
+from agent_toolkit import (
+    FanOutGroupChatManager,
+    NotebookAssembler,
+    add_checkpointing,
+    add_loop_detection,
+    add_rate_limiting,
+    add_transcript_compaction,
+    azure_deployments,
+    code_execution_config,
+    fan_out_enabled,
+    get_response_cache,
+    loop_detection_enabled,
+    mock_config_list,
+    mock_groupchat_kwargs,
+    register_mock_client,
+    register_notebook_tools,
+    transcript_compaction_enabled,
+    use_mock_backend,
+)
 import os
+import hashlib
 
 load_dotenv()
 
-config_list = [
+# AZURE_OPENAI_DEPLOYMENTS spreads the agents' calls over several regions
+config_list = azure_deployments() or [
     {
         "model": os.getenv("AZURE_OPENAI_MODEL"),
         "api_key": os.getenv("AZURE_OPENAI_API_KEY"),
@@ -15,15 +36,16 @@ config_list = [
     }
 ]
 
+# Set LLM_BACKEND=mock to run the team offline against a simulated model
+if use_mock_backend():
+    config_list = mock_config_list()
+
 # User Proxy (Trigger)
 user = UserProxyAgent(
     name="User",
     human_input_mode="TERMINATE",
     max_consecutive_auto_reply=10,
-    code_execution_config={
-        "work_dir": "notebook",
-        "use_docker": False,
-    },
+    code_execution_config=code_execution_config("notebook"),
     system_message="Reply TERMINATE only if the entire tutorial has been successfully generated and saved.",
 )
 
@@ -33,7 +55,7 @@ task_planner = AssistantAgent(
     system_message="""
 You are a senior curriculum architect. Your role is to break down the tutorial request into a logical sequence of chapters.
 Each chapter should have a title and clear objective. Start from conceptual basics and move to applied and advanced examples.
-Format the output as a list of chapters with goals.
+Format the output as a list of chapters with goals, one line per chapter as "Chapter <n>: <title>".
 """,
     llm_config={"config_list": config_list, "temperature": 0.3},
 )
@@ -45,6 +67,7 @@ content_expert = AssistantAgent(
 You are an expert AI educator and documentation writer. Your role is to generate educational content for each chapter.
 For each chapter, generate well-structured markdown content with NO CODE.
 Use headings, bullets, explanations, and inline formulas if needed.
+Start each chapter with a "## Chapter <n>: <title>" heading, numbered as in the plan.
 """,
     llm_config={"config_list": config_list, "temperature": 0.4},
 )
@@ -56,17 +79,25 @@ code_developer = AssistantAgent(
 You are a senior Python developer specialized in LLM agents and AI Agents framework.
 For each chapter, generate full runnable Python code cells that match the content expert's explanation.
 Use uv pip install in setup cells. Add comments in code. Only return Python code (no markdown)
+Start the code of each chapter with a "# Chapter <n>" comment, numbered as in the plan, and separate cells with "# %%".
 """,
     llm_config={"config_list": config_list, "temperature": 0},
 )
 
+# The chapters of the planner, content expert and code developer go straight
+# into the notebook as they are written, one chapter at a time
+NOTEBOOK_PATH = os.path.join("notebook", "autogen_tutorial.ipynb")
+assembler = NotebookAssembler(NOTEBOOK_PATH, title="AutoGen Tutorial")
+
 # Agent 4: Notebook Builder
 notebook_builder = AssistantAgent(
     name="NotebookBuilder",
-    system_message="""
-You are a notebook builder agent. Your job is to receive markdown and code sections from other agents,
-and compile them into a well-structured Jupyter notebook.
-Make sure the structure matches the logical flow and save it as autogen_tutorial.ipynb using nbformat.
+    system_message=f"""
+You are a notebook builder agent. The markdown and code of each chapter are added to {NOTEBOOK_PATH}
+automatically as the other agents write them; do not write notebook code yourself.
+Check the structure with notebook_outline and fix it with the notebook tools: rename, move or remove
+chapters, and place pending messages that had no chapter number into the right chapter.
+Make sure the structure matches the logical flow. Keep your replies to these tool calls.
 """,
     llm_config={"config_list": config_list, "temperature": 0},
 )
@@ -96,15 +127,61 @@ groupchat = GroupChat(
     ],
     messages=[],
     max_round=15,
+    **mock_groupchat_kwargs(config_list),
 )
 
-manager = GroupChatManager(
-    groupchat=groupchat, llm_config={"config_list": config_list, "seed": 42}
-)
+# GROUPCHAT_FAN_OUT=on lets the content and code for the plan be written in parallel
+if fan_out_enabled():
+    manager = FanOutGroupChatManager(
+        groupchat=groupchat,
+        fan_out={"TaskPlanner": ["ContentExpert", "CodeDeveloper"]},
+        llm_config={"config_list": config_list, "seed": 42},
+    )
+else:
+    manager = GroupChatManager(
+        groupchat=groupchat, llm_config={"config_list": config_list, "seed": 42}
+    )
+# The builder's structural edits are tool calls that the User executes.
+# Registering tools rebuilds the builder's LLM client, so do it first
+register_notebook_tools(assembler, caller=notebook_builder, executor=user)
+register_mock_client(groupchat.agents + [manager])
+# Agents on the same deployment share its rate limit as well
+add_rate_limiting(groupchat.agents + [manager])
+
+assembler.attach(manager)
+
+# LOOP_DETECTION=on ends the chat when agents go round in circles, e.g. the
+# Evaluator asking for the same changes and saying CONTINUE every round.
+# Attached before a checkpoint is restored, like the assembler
+loop_detector = add_loop_detection(manager) if loop_detection_enabled() else None
+
+# TRANSCRIPT_COMPACTION=on keeps recent turns verbatim and summarizes older ones
+if transcript_compaction_enabled():
+    add_transcript_compaction(groupchat.agents)
 
 # Entry task
 task = """Generate a professional AutoGen tutorial notebook that can be used to help others learn AutoGen framework.
-The notebook should include AutoGen framework introduction, key concepts, technical explanation, realistic examples, tools and memory usage, and advanced agent orchestration.Use proper markdown headers, comments, uv pip install, and save as autogen_tutorial.ipynb."""
+The notebook should include AutoGen framework introduction, key concepts, technical explanation, realistic examples, tools and memory usage, and advanced agent orchestration.Use proper markdown headers, comments, uv pip install. The chapters are saved to autogen_tutorial.ipynb as they are written."""
+
+# With CHECKPOINTS=on every round is checkpointed per task; if an earlier run
+# of this task failed midway, running the script again resumes it (and logs
+# the round it resumes at) and only runs the rounds left
+checkpointer = add_checkpointing(
+    manager, f"tutorial_lab-{hashlib.sha256(task.encode()).hexdigest()[:12]}"
+)
+resumed = checkpointer.restore() if checkpointer else None
+if resumed:
+    assembler.load()
 
-# Start interaction
-user.initiate_chat(manager, message=task)
+# Start interaction, reusing cached completions from earlier runs
+if resumed:
+    speaker, message = resumed
+    speaker.initiate_chat(
+        manager, message=message, clear_history=False, cache=get_response_cache()
+    )
+else:
+    user.initiate_chat(manager, message=task, cache=get_response_cache())
+if checkpointer:
+    checkpointer.finish()
+if loop_detector:
+    print(f"Loop detection: {loop_detector.stats()}")
@@ -1,5 +1,18 @@
+import os
+import sys
 from autogen import AssistantAgent, UserProxyAgent, GroupChat, GroupChatManager
 
+# Shared helpers from Examples/agent_toolkit
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Examples")
+)
+from agent_toolkit import (
+    FanOutGroupChatManager,
+    SpeakerSelector,
+    add_rate_limiting,
+    fan_out_enabled,
+)
+
 # 👇 TODO: Setup the LLM config as needed
 llm_config = {
     "config_list": [{...}],
@@ -22,13 +35,40 @@ impact_agent = AssistantAgent(
 # 👇 TODO: Customize the user proxy agent
 user = UserProxyAgent(name="CISO")
 
+agents = [user, threat_agent, mitigation_agent, impact_agent]
+
+# 👇 TODO: Adjust who may speak after whom. The selector picks the next speaker
+# locally (graph, name mentions, keywords) and only asks the LLM when unsure
+speaker_selector = SpeakerSelector(
+    transitions={
+        "CISO": ["ThreatModeler"],
+        "ThreatModeler": ["MitigationStrategist", "ImpactSimulator"],
+        "MitigationStrategist": ["ImpactSimulator"],
+        "ImpactSimulator": ["CISO", "MitigationStrategist"],
+    },
+)
+
 groupchat = GroupChat(
-    agents=[user, threat_agent, mitigation_agent, impact_agent],
+    agents=agents,
     messages=[],
     max_round=10,
+    **speaker_selector.groupchat_kwargs(agents),
 )
 
-manager = GroupChatManager(groupchat=groupchat)
+# 👇 TODO: Choose which specialists can answer the threat model in parallel.
+# Both only need the ThreatModeler's table, so with GROUPCHAT_FAN_OUT=on they
+# answer it at the same time. Fan-out targets must also be allowed transitions above
+if fan_out_enabled():
+    manager = FanOutGroupChatManager(
+        groupchat=groupchat,
+        fan_out={"ThreatModeler": ["MitigationStrategist", "ImpactSimulator"]},
+    )
+else:
+    manager = GroupChatManager(groupchat=groupchat)
+
+# All agents share one deployment, so with LLM_RATE_LIMIT=on they share its
+# rate limit as well
+add_rate_limiting(agents + [manager])
 
 # 👇 TODO: Change the input based on different threat types
 user.initiate_chat(
@@ -1,5 +1,18 @@
+import os
+import sys
 from autogen import AssistantAgent, UserProxyAgent, GroupChat, GroupChatManager
 
+# Shared helpers from Examples/agent_toolkit
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Examples")
+)
+from agent_toolkit import (
+    SpeakerSelector,
+    add_rate_limiting,
+    add_retrieval_memory,
+    retrieval_groupchat_kwargs,
+)
+
 # 👇 TODO: Setup the LLM config as needed
 llm_config = {
     "config_list": [{...}],
@@ -22,20 +35,47 @@ rewrite_agent = AssistantAgent(
 # 👇 TODO: Customize the user proxy agent
 user = UserProxyAgent(name="LegalCounsel")
 
+agents = [user, extractor_agent, risk_agent, rewrite_agent]
+
+# Long contracts stay out of every round: each agent gets a reference to the
+# contract and the clauses relevant to its turn (RETRIEVAL_TOP_K, default 4)
+memory = add_retrieval_memory(agents)
+
+# 👇 TODO: Adjust who may speak after whom. The selector picks the next speaker
+# locally (graph, name mentions, keywords) and only asks the LLM when unsure
+speaker_selector = SpeakerSelector(
+    transitions={
+        "LegalCounsel": ["ClauseExtractor"],
+        "ClauseExtractor": ["RiskAssessor"],
+        "RiskAssessor": ["RevisionSuggester", "ClauseExtractor"],
+        "RevisionSuggester": ["LegalCounsel", "RiskAssessor"],
+    },
+)
+
 groupchat = GroupChat(
-    agents=[user, extractor_agent, risk_agent, rewrite_agent],
+    agents=agents,
     messages=[],
     max_round=12,
+    **speaker_selector.groupchat_kwargs(agents),
+    **retrieval_groupchat_kwargs(agents),
 )
 
+# Each step works on the previous one (clauses, then their risks, then the
+# revisions), so this team has no fan-out rounds
 manager = GroupChatManager(groupchat=groupchat)
 
+# All agents share one deployment, so with LLM_RATE_LIMIT=on they share its
+# rate limit as well
+add_rate_limiting(agents + [manager])
+
 # 👇 TODO: Paste a realistic contract excerpt here
 contract_text = """
 This Agreement shall commence on the Effective Date and shall remain in effect for a period of 12 months, unless earlier terminated by either party with 30 days’ notice.
 The vendor is responsible for data processing. No explicit SLA or data protection clause is defined.
 """
 
+memory.add_document("contract", contract_text)
+
 user.initiate_chat(
     manager=manager, message=f"Please analyze the following contract:\n{contract_text}"
 )
@@ -0,0 +1,93 @@
+"""
+Run a practice team over a JSONL file of inputs.
+
+Each practice folder has a ``team.json`` spec of its team and a sample
+``batch_inputs.jsonl``. Every input line is one conversation; its fields
+fill in the spec's message template (``{contract}``, ``{scenario}`` or
+``{domain}``). Results are appended to the output file as they finish, and
+running the same command again resumes after the last finished input.
+
+Usage (from the repository root):
+    python Practices/batch_runner.py 03-Legal_Contract_Analysis
+    python Practices/batch_runner.py 02-Risk_Intelligence_Unit --inputs threats.jsonl \\
+        --output results/threats.jsonl --concurrency 8
+    LLM_BACKEND=mock python Practices/batch_runner.py 01-AI_Product_Brainstorm
+"""
+
+import os
+import sys
+import json
+import argparse
+import logging
+
+from dotenv import load_dotenv
+
+PRACTICES_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Shared helpers from Examples/agent_toolkit
+sys.path.append(os.path.join(PRACTICES_DIR, "..", "Examples"))
+from agent_toolkit import (  # noqa: E402
+    TeamSpec,
+    azure_deployments,
+    mock_config_list,
+    rate_limit_stats,
+    run_batch,
+    use_mock_backend,
+)
+
+
+def load_config_list():
+    if use_mock_backend():
+        return mock_config_list()
+    return azure_deployments() or [
+        {
+            "model": os.getenv("AZURE_OPENAI_MODEL"),
+            "api_key": os.getenv("AZURE_OPENAI_API_KEY"),
+            "base_url": os.getenv("AZURE_OPENAI_ENDPOINT"),
+            "api_version": os.getenv("AZURE_OPENAI_API_VERSION"),
+            "api_type": "azure",
+        }
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run a practice team over a JSONL file of inputs"
+    )
+    parser.add_argument("practice", help="Practice folder, e.g. 03-Legal_Contract_Analysis")
+    parser.add_argument("--spec", help="Team spec (default: <practice>/team.json)")
+    parser.add_argument(
+        "--inputs", help="JSONL inputs (default: <practice>/batch_inputs.jsonl)"
+    )
+    parser.add_argument(
+        "--output", help="JSONL results, appended to (default: <practice>/batch_results.jsonl)"
+    )
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--limit", type=int, help="Run at most this many inputs")
+    parser.add_argument(
+        "--retry-failed", action="store_true", help="Run inputs whose earlier run failed again"
+    )
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    # One line per conversation is plenty for hundreds of them
+    logging.getLogger("autogen").setLevel(logging.WARNING)
+
+    practice_dir = os.path.join(PRACTICES_DIR, args.practice)
+    spec = TeamSpec.from_file(args.spec or os.path.join(practice_dir, "team.json"))
+    report = run_batch(
+        spec,
+        load_config_list(),
+        args.inputs or os.path.join(practice_dir, "batch_inputs.jsonl"),
+        args.output or os.path.join(practice_dir, "batch_results.jsonl"),
+        concurrency=args.concurrency,
+        retry_failed=args.retry_failed,
+        limit=args.limit,
+    )
+    report["rate_limits"] = rate_limit_stats()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()